@@ -0,0 +1,286 @@
+# API/app/admission.py
+"""
+Contrôle d'admission devant le pipeline PDF : qui calcule, et dans quel ordre.
+
+- client = adresse IP du pair ; derrière un reverse proxy listé dans
+  ADMISSION_TRUSTED_PROXIES, dernière adresse de X-Forwarded-For qui n'est pas
+  un de ces proxies. Rien de ce que choisit l'appelant (X-Client-Id, clé API
+  partagée par tous) : un en-tête renouvelé à chaque requête contournerait
+  quotas et plafonds
+- seau à jetons par client (ADMISSION_RATE req/s, ADMISSION_BURST) : 429 +
+  Retry-After au-delà, avant même la lecture de l'upload
+- deux priorités fixées par le serveur : "interactive" (/process, UI) et
+  "bulk" (/jobs, lots) ; au-delà de ADMISSION_INTERACTIVE_PER_CLIENT calculs
+  interactifs simultanés, un client (script qui boucle en parallèle sur
+  /process) passe en bulk pour les suivants ;
+  ADMISSION_SLOTS calculs à la fois, partagés par file équitable pondérée
+  (stride : interactive passe ADMISSION_INTERACTIVE_WEIGHT fois plus souvent),
+  tourniquet entre clients d'une même priorité
+- bulk utilise toute la capacité libre, sauf ADMISSION_RESERVED places gardées
+  pour l'interactif : son attente est bornée par la fin d'un calcul en cours
+- au plus ADMISSION_CLIENT_CONCURRENCY calculs par client, le reste attend
+- attente au-delà de ADMISSION_MAX_WAIT ou file pleine : 503 + Retry-After
+- appels internes (UI in-process) : interactive, sans quota ni plafond client
+
+La priorité et le client sont portés par un contextvar posé dans la route :
+les jobs (tâches asyncio créées par la requête) en héritent.
+"""
+import asyncio
+import contextvars
+import ipaddress
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, Optional, Sequence
+
+from fastapi import HTTPException
+
+from . import metrics
+
+log = logging.getLogger("quitus-api")
+
+PRIORITIES = ("interactive", "bulk")
+
+
+@dataclass(frozen=True)
+class Caller:
+    client: Optional[str]           # None = appel interne (UI in-process)
+    priority: str = "interactive"
+
+
+INTERNAL = Caller(None)
+_caller: contextvars.ContextVar[Caller] = contextvars.ContextVar("quitus_caller", default=INTERNAL)
+
+
+def current() -> Caller:
+    return _caller.get()
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.stamp = now
+
+    def take(self, now: float) -> float:
+        """Consomme un jeton -> 0, sinon secondes avant le prochain jeton."""
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def full(self, now: float) -> bool:
+        return self.tokens + (now - self.stamp) * self.rate >= self.burst
+
+
+class Admission:
+    def __init__(self, slots: int, weights: Dict[str, float], reserved: int = 1, client_concurrency: int = 0,
+                 rate: float = 0.0, burst: float = 20.0, max_queue: int = 200, max_wait: float = 30.0,
+                 retry_after: int = 2, enabled: bool = True, interactive_per_client: int = 0,
+                 trusted_proxies: Sequence[str] = ()):
+        self.slots = max(1, slots)
+        self.weights = {p: max(weights.get(p, 1.0), 1e-3) for p in PRIORITIES}
+        self.reserved = min(max(0, reserved), self.slots - 1)
+        self.client_concurrency = client_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.enabled = enabled
+        self.interactive_per_client = interactive_per_client
+        self.trusted_proxies = [ipaddress.ip_network(p.strip(), strict=False) for p in trusted_proxies if p.strip()]
+        # appelé depuis la boucle asyncio uniquement : pas de verrou
+        self._running: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self._per_client: Dict[str, int] = {}
+        self._queues: Dict[str, "OrderedDict[Optional[str], Deque[asyncio.Future]]"] = {
+            p: OrderedDict() for p in PRIORITIES}
+        self._queued: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self._pass: Dict[str, float] = {p: 0.0 for p in PRIORITIES}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._interactive: Dict[str, int] = {}
+        self._warned_proxy = False   # calculs interactifs en cours ou en attente, par client
+
+    # ------------------------------ entrée ------------------------------
+    def client(self, peer: Optional[str], forwarded_for: Optional[str] = None) -> Optional[str]:
+        """Identité pour les quotas : IP du pair, ou celle que rapporte un proxy de confiance."""
+        if peer is None:
+            return None
+        if forwarded_for and self._trusted(peer):
+            # chaque proxy ajoute à droite l'adresse qu'il voit : on remonte tant que c'est un proxy à nous
+            for hop in reversed([h.strip() for h in forwarded_for.split(",")]):
+                if not self._trusted(hop):
+                    peer = hop
+                    break
+        elif forwarded_for and not self._warned_proxy:
+            # derrière un proxy non déclaré, tous les utilisateurs partagent son adresse (quotas globaux)
+            self._warned_proxy = True
+            log.warning("X-Forwarded-For received from %s, which is not in ADMISSION_TRUSTED_PROXIES (%s): "
+                        "admission quotas apply to the proxy address, not to each client",
+                        peer, ", ".join(map(str, self.trusted_proxies)) or "empty")
+        return f"ip:{peer}"
+
+    def _trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in net for net in self.trusted_proxies)
+
+    def enter(self, client: Optional[str], priority: str) -> Caller:
+        """Identifie l'appelant de la requête courante (quota vérifié ici : 429)."""
+        caller = Caller(client, priority if priority in PRIORITIES else "interactive")
+        if self.enabled and self.rate > 0 and client is not None:
+            now = time.monotonic()
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) > 10_000:
+                    self._buckets = {k: b for k, b in self._buckets.items() if not b.full(now)}
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst, now)
+            wait = bucket.take(now)
+            if wait > 0:
+                metrics.ADMISSION_REJECTED.inc(priority=caller.priority, reason="rate")
+                raise HTTPException(status_code=429, detail="Too many requests for this client",
+                                    headers={"Retry-After": str(math.ceil(wait))})
+        _caller.set(caller)
+        return caller
+
+    # ------------------------------ places ------------------------------
+    @asynccontextmanager
+    async def slot(self, caller: Optional[Caller] = None) -> AsyncIterator[None]:
+        """Une place de calcul pour l'appelant courant (ou `caller`)."""
+        caller = self._classify(caller or current())
+        counted = self.enabled and caller.priority == "interactive" and caller.client is not None
+        if counted:
+            self._interactive[caller.client] = self._interactive.get(caller.client, 0) + 1
+        try:
+            await self.acquire(caller)
+            try:
+                yield
+            finally:
+                self.release(caller)
+        finally:
+            if counted:
+                n = self._interactive[caller.client] - 1
+                if n > 0:
+                    self._interactive[caller.client] = n
+                else:
+                    del self._interactive[caller.client]
+
+    def _classify(self, caller: Caller) -> Caller:
+        """Interactif au-delà de interactive_per_client calculs du même client -> bulk."""
+        if (caller.priority == "interactive" and caller.client is not None and self.interactive_per_client
+                and self._interactive.get(caller.client, 0) >= self.interactive_per_client):
+            metrics.ADMISSION_DEMOTED.inc()
+            return Caller(caller.client, "bulk")
+        return caller
+
+    async def acquire(self, caller: Caller, patient: bool = False) -> None:
+        """Attend son tour ; patient = déjà admis (fichier d'un lot) : ni délai ni limite de file."""
+        if not self.enabled:
+            return
+        p = caller.priority
+        if not patient and sum(self._queued.values()) >= self.max_queue:
+            metrics.ADMISSION_REJECTED.inc(priority=p, reason="queue")
+            raise self._busy()
+        fut = asyncio.get_running_loop().create_future()
+        queue = self._queues[p]
+        if not queue:   # priorité qui se réveille : pas de crédit accumulé pendant son absence
+            active = [self._pass[q] for q in PRIORITIES if self._queues[q]]
+            self._pass[p] = max(self._pass[p], min(active, default=self._pass[p]))
+        queue.setdefault(caller.client, deque()).append(fut)
+        self._queued[p] += 1
+        t0 = time.perf_counter()
+        self._dispatch()
+        try:
+            await asyncio.wait_for(fut, None if patient or not self.max_wait else self.max_wait)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                self.release(caller)   # place accordée au moment de l'annulation
+            else:
+                fut.cancel()
+                self._discard(caller, fut)
+            if isinstance(e, asyncio.TimeoutError):
+                metrics.ADMISSION_REJECTED.inc(priority=p, reason="timeout")
+                raise self._busy()
+            raise
+        finally:
+            metrics.ADMISSION_WAIT.observe(time.perf_counter() - t0, priority=p)
+
+    def release(self, caller: Caller) -> None:
+        if not self.enabled:
+            return
+        self._running[caller.priority] -= 1
+        if caller.client is not None:
+            n = self._per_client.get(caller.client, 0) - 1
+            if n > 0:
+                self._per_client[caller.client] = n
+            else:
+                self._per_client.pop(caller.client, None)
+        self._dispatch()
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        return {"running": dict(self._running), "queued": dict(self._queued)}
+
+    # ---------------------------- ordonnancement --------------------------
+    def _busy(self) -> HTTPException:
+        return HTTPException(status_code=503, detail="Server busy, retry later",
+                             headers={"Retry-After": str(self.retry_after)})
+
+    def _eligible(self, priority: str, client: Optional[str]) -> bool:
+        if priority == "bulk" and sum(self._running.values()) >= self.slots - self.reserved:
+            return False
+        return (client is None or not self.client_concurrency
+                or self._per_client.get(client, 0) < self.client_concurrency)
+
+    def _dispatch(self) -> None:
+        while sum(self._running.values()) < self.slots:
+            for p in sorted((q for q in PRIORITIES if self._queues[q]), key=self._pass.__getitem__):
+                fut = self._next(p)
+                if fut is not None:
+                    break
+            else:
+                return
+            self._pass[p] += 1.0 / self.weights[p]
+            fut.set_result(None)
+
+    def _next(self, priority: str) -> Optional[asyncio.Future]:
+        """Premier client éligible de la priorité (tourniquet) -> sa plus ancienne attente."""
+        queue = self._queues[priority]
+        for client in list(queue):
+            waiters = queue[client]
+            while waiters and waiters[0].done():   # annulées (délai dépassé, client parti)
+                waiters.popleft()
+                self._queued[priority] -= 1
+            if not waiters:
+                del queue[client]
+                continue
+            if not self._eligible(priority, client):
+                continue
+            fut = waiters.popleft()
+            self._queued[priority] -= 1
+            queue.move_to_end(client)
+            if not waiters:
+                del queue[client]
+            self._running[priority] += 1
+            if client is not None:
+                self._per_client[client] = self._per_client.get(client, 0) + 1
+            return fut
+        return None
+
+    def _discard(self, caller: Caller, fut: asyncio.Future) -> None:
+        queue = self._queues[caller.priority]
+        waiters = queue.get(caller.client)
+        if waiters is not None and fut in waiters:
+            waiters.remove(fut)
+            self._queued[caller.priority] -= 1
+            if not waiters:
+                del queue[caller.client]
@@ -0,0 +1,171 @@
+# API/app/batch.py
+"""
+Traitement par lot : N PDF sources -> un ZIP de quitus, produit en streaming.
+
+- uploads relus depuis le spool de la requête (cf. uploads.spool_upload), jamais chargés en entier
+- archives : membres comptés et tailles déclarées vérifiées avant toute
+  décompression (BATCH_MAX_FILES, MAX_UPLOAD_MB par fichier) ; chaque membre
+  n'est lu qu'au moment de sa soumission au pool
+"""
+import json
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from functools import partial
+from pathlib import PurePosixPath
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from fastapi import HTTPException
+
+from .executor import PIPELINE, StageError
+from .export import StreamSink
+from .pipeline import build_quitus
+from .uploads import SourcePdf, too_large
+
+Loader = Callable[[], Union[bytes, SourcePdf]]   # source lue à la demande
+
+
+class BatchSources:
+    """PDF d'un lot (uploads directs et membres d'archives), dans l'ordre d'envoi."""
+
+    def __init__(self, max_file: int, max_files: int):
+        self.max_file = max_file
+        self.max_files = max_files
+        self.entries: List[Tuple[str, Loader]] = []
+        self._uploads: List[SourcePdf] = []
+        self._zips: List[Tuple[zipfile.ZipFile, BinaryIO]] = []
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, name: str, src: SourcePdf) -> None:
+        """Un upload = un PDF, ou une archive ZIP dont on prend les .pdf."""
+        self._uploads.append(src)
+        with src.open() as buf:
+            is_zip = bytes(buf[:2]) == b"PK"
+        zf = None
+        if is_zip:
+            fh = src.stream()
+            try:
+                zf = zipfile.ZipFile(fh)
+            except zipfile.BadZipFile:
+                fh.close()   # sera rejeté comme PDF invalide, avec son nom
+        if zf is None:
+            self._count(1)
+            self.entries.append((name, self._limited(name, src.size, lambda: src)))
+            return
+        self._zips.append((zf, fh))
+        members = [i for i in zf.infolist()
+                   if not i.is_dir() and i.filename.lower().endswith(".pdf")
+                   and not PurePosixPath(i.filename).name.startswith(".")]   # ex: __MACOSX/._x.pdf
+        self._count(len(members))
+        for info in members:
+            # zf.read s'arrête à file_size (BadZipFile si le membre ment) : taille bornée
+            self.entries.append((f"{name}/{info.filename}",
+                                 self._limited(info.filename, info.file_size, partial(zf.read, info))))
+
+    def _count(self, n: int) -> None:
+        if len(self.entries) + n > self.max_files:
+            raise HTTPException(status_code=400, detail=f"Too many files in batch (max {self.max_files})")
+
+    def _limited(self, name: str, size: int, load: Loader) -> Loader:
+        if size <= self.max_file:
+            return load
+
+        def refuse():
+            raise HTTPException(status_code=413, detail=f"{name}: {too_large(self.max_file).detail}")
+        return refuse
+
+    def close(self) -> None:
+        for zf, fh in self._zips:
+            zf.close()
+            fh.close()
+        for src in self._uploads:
+            src.cleanup()
+        self._zips, self._uploads = [], []
+
+
+def _unique(name: str, used: Dict[str, int]) -> str:
+    n = used.get(name, 0)
+    used[name] = n + 1
+    if n == 0:
+        return name
+    stem, dot, ext = name.rpartition(".")
+    return f"{stem}_{n + 1}.{ext}" if dot else f"{name}_{n + 1}"
+
+
+def stream_batch_zip(
+    dt: str,
+    sources: BatchSources,
+    persist: Callable[[List[Dict[str, str]]], None],
+    template_id: Optional[str] = None,
+    output: str = "form",
+    submit: Optional[Callable[..., "Future"]] = None,
+    window: int = 0,
+) -> Iterator[bytes]:
+    """
+    Soumet chaque source au pool du pipeline (threads ou process), écrit
+    chaque quitus dans le ZIP dès qu'il est prêt, puis persiste toutes les
+    lignes en une fois et termine par manifest.json. Un fichier en erreur
+    n'interrompt pas le lot. Les sources sont fermées à la fin (cf. close).
+
+    submit : soumission au pool (défaut PIPELINE.submit ; cf. admission) ;
+    window : fichiers en cours au plus (0 = tout le lot d'un coup).
+    """
+    submit = submit or PIPELINE.submit
+    sink = StreamSink()
+    manifest: List[Dict[str, str]] = []
+    rows: List[Dict[str, str]] = []
+    used: Dict[str, int] = {}
+    total = len(sources)
+    todo = iter(sources.entries)
+    futures: Dict["Future", str] = {}
+
+    def _fill() -> None:
+        for name, load in todo:
+            try:
+                futures[submit(build_quitus, dt, load(), template_id, output)] = name
+            except HTTPException as e:
+                manifest.append({"source": name, "status": "error", "error": str(e.detail)})
+            except (zipfile.BadZipFile, OSError) as e:
+                manifest.append({"source": name, "status": "error", "error": f"{type(e).__name__}: {e}"})
+            if window and len(futures) >= window:
+                return
+
+    try:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+            _fill()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    source = futures.pop(fut)
+                    try:
+                        values, filename, pdf_out = fut.result()
+                    except (HTTPException, StageError) as e:
+                        manifest.append({"source": source, "status": "error", "error": str(e.detail)})
+                        continue
+                    except Exception as e:
+                        manifest.append({"source": source, "status": "error", "error": f"{type(e).__name__}: {e}"})
+                        continue
+                    filename = _unique(filename, used)
+                    zf.writestr(filename, pdf_out)
+                    rows.append(values)
+                    manifest.append({"source": source, "status": "ok", "file": filename})
+                _fill()
+                yield sink.drain()
+
+            persisted = True
+            try:
+                persist(rows)
+            except Exception as e:
+                persisted = False
+                manifest.append({"source": "*", "status": "error", "error": f"Persistence failed: {e}"})
+            zf.writestr("manifest.json", json.dumps({
+                "total": total,
+                "ok": len(rows),
+                "errors": total - len(rows),
+                "persisted": persisted,
+                "files": manifest,
+            }, ensure_ascii=False, indent=2))
+        yield sink.drain()
+    finally:
+        sources.close()
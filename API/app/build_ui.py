@@ -1,10 +1,15 @@
 # API/app/build_ui.py
-import os, re, tempfile, requests, gradio as gr
+import os, asyncio, gradio as gr
 from urllib.parse import urlparse
 from pathlib import Path
 from dotenv import load_dotenv
 
-def build_demo(default_api_url: str = "/process"):
+from .ui_client import ApiClient
+
+def build_demo(default_api_url: str = "/process", generate=None, export=None):
+    """generate : coroutine (octets, doc_type) -> chemin du PDF ; export : () -> chemin du
+    classeur. Fournis quand l'API tourne dans le même process : appels directs. Sinon
+    (ou si API_URL pointe vers un autre service) HTTP via une session keep-alive partagée."""
     load_dotenv()
 
     # --- Thème / assets ---
@@ -65,6 +70,7 @@ def build_demo(default_api_url: str = "/process"):
     # --- Config API ---
     API_URL = os.getenv("API_URL", default_api_url)
     API_KEY = os.getenv("API_KEY", "")
+    client = ApiClient(API_KEY)
 
     # --- Helpers URL absolue ---
     def _service_base(request: gr.Request) -> str:
@@ -97,29 +103,23 @@ def build_demo(default_api_url: str = "/process"):
         if not payload:
             return None, "Fichier vide ou introuvable."
 
-        files = {"source_pdf": ("source.pdf", payload, "application/pdf")}
-        data  = {"doc_type": (doc_type or "licence").lower()}
-        headers = {"X-API-Key": API_KEY} if API_KEY else {}
+        dt = (doc_type or "licence").lower()
+        return client.download(
+            "POST", api, f"quitus_{dt}.pdf", expect_type="application/pdf", timeout=90,
+            files={"source_pdf": ("source.pdf", payload, "application/pdf")}, data={"doc_type": dt},
+        )
 
+    async def fill_quitus_local(source_pdf, doc_type):
+        payload = await asyncio.to_thread(_to_bytes, source_pdf)
+        if not payload:
+            return None, "Fichier vide ou introuvable."
         try:
-            r = requests.post(api, files=files, data=data, headers=headers, timeout=90)
+            out_path = await generate(payload, (doc_type or "licence").lower())
+        except asyncio.TimeoutError:
+            return None, "Erreur: délai dépassé, réessayez."
         except Exception as e:
-            return None, f"Erreur réseau: {e}"
-
-        ctype = (r.headers.get("content-type") or "").split(";")[0].strip().lower()
-        if r.status_code != 200 or ctype != "application/pdf":
-            return None, f"Erreur API: {r.status_code} - {r.text}"
-
-        filename = f"quitus_{data['doc_type']}.pdf"
-        cd = r.headers.get("content-disposition", "")
-        m = re.search(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', cd, re.IGNORECASE)
-        if m:
-            filename = m.group(1)
-
-        tmp_dir = tempfile.mkdtemp()
-        out_path = os.path.join(tmp_dir, filename)
-        with open(out_path, "wb") as f:
-            f.write(r.content)
+            status = getattr(e, "status_code", None)
+            return None, f"Erreur API: {status} - {getattr(e, 'detail', e)}" if status else f"Erreur: {e}"
         return out_path, "OK"
 
     def download_excel(request: gr.Request):
@@ -129,28 +129,14 @@ def build_demo(default_api_url: str = "/process"):
         else:
             base = _service_base(request)
 
-        url = base + "/download/excel"
-        headers = {"X-API-Key": API_KEY} if API_KEY else {}
+        return client.download("GET", base + "/download/excel", "students_data.xlsx", timeout=60)
 
+    def download_excel_local():
         try:
-            r = requests.get(url, headers=headers, timeout=60)
+            return export(), "OK"
         except Exception as e:
-            return None, f"Erreur réseau: {e}"
-
-        if r.status_code != 200:
-            return None, f"Erreur API: {r.status_code} - {r.text}"
-
-        filename = "students_data.xlsx"
-        cd = r.headers.get("content-disposition", "")
-        m = re.search(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', cd, re.IGNORECASE)
-        if m:
-            filename = m.group(1)
-
-        tmp_dir = tempfile.mkdtemp()
-        out_path = os.path.join(tmp_dir, filename)
-        with open(out_path, "wb") as f:
-            f.write(r.content)
-        return out_path, "OK"
+            status = getattr(e, "status_code", None)
+            return None, f"Erreur API: {status} - {getattr(e, 'detail', e)}" if status else f"Erreur: {e}"
 
     # -------------- UI (dans un seul Blocks) --------------
     with gr.Blocks(title="Quitus Filler", css=css) as demo:
@@ -183,7 +169,14 @@ def build_demo(default_api_url: str = "/process"):
             excel_dl = gr.File(label="students_data.xlsx", elem_classes="card")
 
         # Hooks (toujours à l'intérieur du Blocks)
-        btn_fill.click(fn=fill_quitus, inputs=[src, dtype], outputs=[out_pdf, status])
-        btn_excel.click(fn=download_excel, inputs=None, outputs=[excel_dl, status])
+        remote = API_URL.startswith("http://") or API_URL.startswith("https://")
+        if generate is not None and not remote:
+            btn_fill.click(fn=fill_quitus_local, inputs=[src, dtype], outputs=[out_pdf, status])
+        else:
+            btn_fill.click(fn=fill_quitus, inputs=[src, dtype], outputs=[out_pdf, status])
+        if export is not None and not remote:
+            btn_excel.click(fn=download_excel_local, inputs=None, outputs=[excel_dl, status])
+        else:
+            btn_excel.click(fn=download_excel, inputs=None, outputs=[excel_dl, status])
 
     return demo
\ No newline at end of file
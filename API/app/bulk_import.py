@@ -0,0 +1,416 @@
+# API/app/bulk_import.py
+"""
+Import en masse de PDF déjà soumis (historique) : extraction + journalisation
+des champs, sans génération de quitus.
+
+- source : dossier (parcouru récursivement, *.pdf) ou archive .zip
+- extraction (extract_source) dans un pool de process, fenêtre bornée de
+  tâches en vol : mémoire constante quel que soit le nombre de fichiers ; les
+  workers lisent eux-mêmes les fichiers (seuls les chemins transitent), au
+  plus MAX_UPLOAD_MB chacun (taille déclarée vérifiée avant décompression)
+- dédoublonnage par cin : déjà présents dans le store local ou déjà importés
+- écriture par lots de IMPORT_BATCH_ROWS lignes (persist_rows, cf. main.py)
+- reprise : checkpoint SQLite (data/imports/<id>.sqlite3) validé après chaque
+  lot écrit ; relancer le même import saute les fichiers déjà traités
+
+    cd API
+    python -m app.bulk_import /srv/archives/L3_2023 --doc-type licence
+    python -m app.bulk_import master_2022.zip --doc-type master --workers 8
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from . import metrics
+from .pipeline import extract_source
+from .settings import settings
+from .uploads import too_large
+
+log = logging.getLogger("quitus-api")
+
+# (nom relatif, fichier PDF ou archive, membre de l'archive)
+SourceRef = Tuple[str, str, Optional[str]]
+# (nom, statut, cin, erreur) ; statut : ok | duplicate | error
+Outcome = Tuple[str, str, str, Optional[str]]
+
+Persist = Callable[[str, List[Dict[str, str]]], None]
+ExistingCins = Callable[[str], Iterable[str]]
+
+
+# ------------------------------ sources ------------------------------
+def iter_sources(root: Path) -> Iterator[SourceRef]:
+    """PDF d'un dossier (ordre stable, sans tout lister d'avance) ou d'une archive."""
+    if root.is_file():
+        if not zipfile.is_zipfile(root):
+            raise ValueError(f"{root}: not a directory or a .zip archive")
+        with zipfile.ZipFile(root) as zf:
+            names = [i.filename for i in zf.infolist()
+                     if not i.is_dir() and i.filename.lower().endswith(".pdf")
+                     and not Path(i.filename).name.startswith(".")]
+        for name in names:
+            yield name, str(root), name
+        return
+    if not root.is_dir():
+        raise ValueError(f"{root}: not found")
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.lower().endswith(".pdf") and not name.startswith("."):
+                path = Path(dirpath) / name
+                yield path.relative_to(root).as_posix(), str(path), None
+
+
+# ------------------------- côté worker (process) -------------------------
+_ZIPS: Dict[str, zipfile.ZipFile] = {}   # archive ouverte une fois par worker
+
+
+def _read(ref: SourceRef) -> bytes:
+    _, path, member = ref
+    limit = settings.MAX_UPLOAD_MB * 1024 * 1024
+    if member is None:
+        with open(path, "rb") as fh:
+            if os.fstat(fh.fileno()).st_size > limit:
+                raise too_large(limit)
+            return fh.read()
+    zf = _ZIPS.get(path)
+    if zf is None:
+        zf = _ZIPS[path] = zipfile.ZipFile(path)
+    info = zf.getinfo(member)
+    if info.file_size > limit:   # taille déclarée : rien n'est décompressé
+        raise too_large(limit)
+    return zf.read(info)   # zipfile s'arrête à file_size, même si l'entête ment
+
+
+def extract_ref(ref: SourceRef) -> Tuple[str, Optional[Dict[str, str]], Optional[str]]:
+    """(nom, champs, erreur) ; les erreurs sont rendues en texte (picklable)."""
+    try:
+        return ref[0], extract_source(_read(ref)), None
+    except HTTPException as e:
+        return ref[0], None, str(e.detail)
+    except Exception as e:
+        return ref[0], None, f"{type(e).__name__}: {e}"
+
+
+# ------------------------------ checkpoint ------------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    name   TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    cin    TEXT,
+    error  TEXT
+);
+CREATE TABLE IF NOT EXISTS cins (cin TEXT PRIMARY KEY);
+"""
+
+
+class Checkpoint:
+    """Fichiers déjà traités + cin déjà vus ; un lot = une transaction."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def done(self, name: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM sources WHERE name = ?", (name,)).fetchone() is not None
+
+    def seen(self, cin: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM cins WHERE cin = ?", (cin,)).fetchone() is not None
+
+    def seed_cins(self, cins: Iterable[str]) -> None:
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR IGNORE INTO cins (cin) VALUES (?)", ((c,) for c in cins if c))
+            self._db.execute("COMMIT")
+
+    def commit(self, outcomes: List[Outcome]) -> None:
+        """À appeler une fois les lignes du lot écrites (reprise : au pire le dernier lot est rejoué)."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO sources (name, status, cin, error) VALUES (?, ?, ?, ?)",
+                                     outcomes)
+                self._db.executemany("INSERT OR IGNORE INTO cins (cin) VALUES (?)",
+                                     [(cin,) for _, status, cin, _ in outcomes if status == "ok" and cin])
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def counts(self) -> Dict[str, int]:
+        out = {"ok": 0, "duplicate": 0, "error": 0}
+        with self._lock:
+            for status, n in self._db.execute("SELECT status, COUNT(*) FROM sources GROUP BY status"):
+                out[status] = n
+        return out
+
+    def errors(self, limit: int = 50) -> List[Dict[str, str]]:
+        with self._lock:
+            cur = self._db.execute("SELECT name, error FROM sources WHERE status = 'error' ORDER BY name LIMIT ?",
+                                   (limit,))
+            return [{"source": n, "error": e} for n, e in cur]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+# ------------------------------ import ------------------------------
+@dataclass
+class ImportStats:
+    skipped: int = 0          # déjà traités lors d'un run précédent
+    ok: int = 0
+    duplicate: int = 0
+    error: int = 0
+    started_at: float = field(default_factory=time.time)
+
+    @property
+    def processed(self) -> int:
+        return self.ok + self.duplicate + self.error
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        return {"skipped": self.skipped, "ok": self.ok, "duplicate": self.duplicate, "error": self.error,
+                "files_per_s": round(self.processed / elapsed, 1)}
+
+
+def run_import(
+    root: Path,
+    doc_type: str,
+    persist: Persist,
+    checkpoint: Checkpoint,
+    workers: int = 0,
+    batch_rows: int = 500,
+    stop: Optional[threading.Event] = None,
+    on_batch: Optional[Callable[[ImportStats], None]] = None,
+) -> ImportStats:
+    """Importe tout `root` (bloquant). `stop` : arrêt propre après le lot en cours."""
+    workers = workers or (os.cpu_count() or 2)
+    window = workers * 4   # tâches en vol : borne la mémoire, garde les workers occupés
+    stats = ImportStats()
+    rows: List[Dict[str, str]] = []
+    outcomes: List[Outcome] = []
+    batch_cins: Set[str] = set()
+
+    def flush() -> None:
+        if rows:
+            persist(doc_type, rows)
+        checkpoint.commit(outcomes)
+        for _, status, _, _ in outcomes:
+            metrics.IMPORT_FILES.inc(status=status)
+        rows.clear(); outcomes.clear(); batch_cins.clear()
+        if on_batch is not None:
+            on_batch(stats)
+
+    def handle(fut: "Future[Tuple[str, Optional[Dict[str, str]], Optional[str]]]") -> None:
+        name, values, error = fut.result()
+        if values is None:
+            stats.error += 1
+            outcomes.append((name, "error", "", error))
+        else:
+            cin = (values.get("cin") or "").strip()
+            if cin and (cin in batch_cins or checkpoint.seen(cin)):
+                stats.duplicate += 1
+                outcomes.append((name, "duplicate", cin, None))
+            else:
+                if cin:
+                    batch_cins.add(cin)
+                stats.ok += 1
+                rows.append(values)
+                outcomes.append((name, "ok", cin, None))
+        if len(rows) >= batch_rows or len(outcomes) >= batch_rows * 4:
+            flush()
+
+    pending: Set[Future] = set()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            for ref in iter_sources(root):
+                if stop is not None and stop.is_set():
+                    break
+                if checkpoint.done(ref[0]):
+                    stats.skipped += 1
+                    continue
+                while len(pending) >= window:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        handle(fut)
+                pending.add(pool.submit(extract_ref, ref))
+            for fut in wait(pending).done:
+                handle(fut)
+            pending = set()
+        finally:
+            for fut in pending:
+                fut.cancel()
+    flush()
+    return stats
+
+
+# ------------------------------ gestion (API) ------------------------------
+@dataclass
+class ImportRun:
+    id: str
+    doc_type: str
+    source: str
+    status: str = "running"                # running | done | interrupted | error
+    stats: ImportStats = field(default_factory=ImportStats)
+    error: Optional[str] = None
+    finished_at: Optional[float] = None
+
+
+class ImportManager:
+    """Un import à la fois, en thread ; l'état durable est dans le checkpoint."""
+
+    def __init__(self, directory: Path, persist: Persist, existing_cins: Optional[ExistingCins] = None,
+                 workers: int = 0, batch_rows: int = 500):
+        self.directory = directory
+        self.persist = persist
+        self.existing_cins = existing_cins
+        self.workers = workers
+        self.batch_rows = batch_rows
+        self._runs: Dict[str, ImportRun] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def import_id(key: str, doc_type: str) -> str:
+        """Même source + même doc_type -> même id (donc reprise)."""
+        return hashlib.sha256(f"{doc_type}\0{key}".encode()).hexdigest()[:16]
+
+    def checkpoint_path(self, import_id: str) -> Path:
+        return self.directory / f"{import_id}.sqlite3"
+
+    def run(self, import_id: str, root: Path, doc_type: str, restart: bool = False,
+            on_batch: Optional[Callable[[ImportStats], None]] = None) -> ImportStats:
+        """Import bloquant (CLI, ou thread lancé par start)."""
+        path = self.checkpoint_path(import_id)
+        if restart:
+            for p in (path, path.with_name(path.name + "-wal"), path.with_name(path.name + "-shm")):
+                p.unlink(missing_ok=True)
+        cp = Checkpoint(path)
+        try:
+            if self.existing_cins is not None:
+                cp.seed_cins(self.existing_cins(doc_type))
+            return run_import(root, doc_type, self.persist, cp, workers=self.workers,
+                              batch_rows=self.batch_rows, stop=self._stop, on_batch=on_batch)
+        finally:
+            cp.close()
+
+    def busy(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, import_id: str, root: Path, doc_type: str, source: str,
+              remove_when_done: bool = False) -> ImportRun:
+        """Lance l'import en tâche de fond (409 si un import tourne déjà)."""
+        with self._lock:
+            if self.busy():
+                raise HTTPException(status_code=409, detail="Another import is running")
+            run = self._runs[import_id] = ImportRun(import_id, doc_type, source)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._execute, args=(run, root, remove_when_done),
+                                            name="bulk-import", daemon=True)
+            self._thread.start()
+        return run
+
+    def _execute(self, run: ImportRun, root: Path, remove_when_done: bool) -> None:
+        def _progress(stats: ImportStats) -> None:
+            run.stats = stats
+        try:
+            run.stats = self.run(run.id, root, run.doc_type, on_batch=_progress)
+            run.status = "interrupted" if self._stop.is_set() else "done"
+            if run.status == "done" and remove_when_done:
+                root.unlink(missing_ok=True)   # archive envoyée : gardée seulement pour la reprise
+        except Exception as e:
+            log.exception("Import %s échoué", run.id)
+            run.status, run.error = "error", f"{type(e).__name__}: {e}"
+        finally:
+            run.finished_at = time.time()
+        log.info("Import %s %s : %s", run.id, run.status, run.stats.to_dict())
+
+    def status(self, import_id: str) -> Dict[str, Any]:
+        if not re.fullmatch(r"[0-9a-f]{16}", import_id):
+            raise HTTPException(status_code=404, detail="Unknown import")
+        path = self.checkpoint_path(import_id)
+        run = self._runs.get(import_id)
+        if run is None and not path.exists():
+            raise HTTPException(status_code=404, detail="Unknown import")
+        cp = Checkpoint(path)
+        try:
+            out: Dict[str, Any] = {"id": import_id, "status": run.status if run else "interrupted",
+                                   "totals": cp.counts(), "errors": cp.errors()}
+        finally:
+            cp.close()
+        if run is not None:
+            out.update(doc_type=run.doc_type, source=run.source, run=run.stats.to_dict(),
+                       error=run.error, finished_at=run.finished_at)
+            if run.status != "running":
+                out["status"] = run.status
+        return out
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Arrêt : le lot en cours est écrit et validé, la suite reprendra au prochain lancement."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+# ------------------------------ CLI ------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("source", type=Path, help="dossier de PDF ou archive .zip")
+    ap.add_argument("--doc-type", choices=("licence", "master"), required=True)
+    ap.add_argument("--workers", type=int, default=None, help="process d'extraction (défaut : IMPORT_WORKERS)")
+    ap.add_argument("--batch-rows", type=int, default=None, help="lignes par écriture (défaut : IMPORT_BATCH_ROWS)")
+    ap.add_argument("--restart", action="store_true", help="ignore le checkpoint existant")
+    args = ap.parse_args(argv)
+
+    from .settings import settings
+    settings.UI_ENABLED = False   # pas besoin de gradio ici
+    from .main import IMPORTS, SHEETS_SINK
+
+    if args.workers is not None:
+        IMPORTS.workers = args.workers
+    if args.batch_rows is not None:
+        IMPORTS.batch_rows = args.batch_rows
+    root = args.source.resolve()
+    import_id = IMPORTS.import_id(str(root), args.doc_type)
+    print(f"import {import_id} ({IMPORTS.checkpoint_path(import_id)})", file=sys.stderr)
+
+    def _progress(stats: ImportStats) -> None:
+        print(f"  {stats.processed:>8} traités  ok={stats.ok} doublons={stats.duplicate} "
+              f"erreurs={stats.error} déjà faits={stats.skipped}  {stats.to_dict()['files_per_s']}/s",
+              file=sys.stderr)
+
+    try:
+        stats = IMPORTS.run(import_id, root, args.doc_type, restart=args.restart, on_batch=_progress)
+    except KeyboardInterrupt:
+        print("interrompu : relancer la même commande pour reprendre", file=sys.stderr)
+        return 130
+    finally:
+        if settings.EXCEL_MODE.lower() == "gsheets":
+            SHEETS_SINK.close()   # envoie le spool (le reste partira au prochain démarrage)
+    print(stats.to_dict())
+    return 1 if stats.error else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
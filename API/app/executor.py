@@ -0,0 +1,173 @@
+# API/app/executor.py
+"""
+Backend d'exécution du pipeline PDF, hors de la boucle asyncio.
+
+PIPELINE_BACKEND :
+- "thread"  : ThreadPoolExecutor (défaut, aucun coût de sérialisation)
+- "process" : ProcessPoolExecutor, workers chauds (modèle préchargé),
+              utilise tous les cœurs pour pypdf/reportlab
+- "inline"  : exécution directe (debug / tests)
+
+Admission bornée : au-delà de workers + PIPELINE_MAX_QUEUE tâches en cours,
+on répond 503 avec Retry-After au lieu d'empiler. parse et fill ont un timeout
+(504) : une tâche encore en file est annulée, un calcul déjà lancé n'est pas
+interrompu et reste compté jusqu'à sa fin réelle, la borne porte donc sur le
+travail effectif. persist n'a pas de timeout : l'écriture (SQLite ou spool
+local) aboutirait malgré le 504 et le retry du client la doublerait.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from .pipeline import warm_worker
+from .settings import settings
+
+
+class StageError(Exception):
+    """HTTPException n'est pas picklable : on la transporte sous cette forme."""
+
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _run_remote(fn: Callable, *args: Any) -> Any:
+    try:
+        return fn(*args)
+    except HTTPException as e:
+        raise StageError(e.status_code, e.detail)
+
+
+class PipelineExecutor:
+    def __init__(self, backend: str, workers: int, max_queue: int, retry_after: int,
+                 timeouts: Dict[str, float]):
+        self.backend = backend if backend in {"thread", "process", "inline"} else "thread"
+        self.workers = workers or (os.cpu_count() or 2)
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.timeouts = timeouts
+        self._pool: Optional[Executor] = None
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._inflight = 0
+
+    # ------------------------------ pools ------------------------------
+    @property
+    def pool(self) -> Executor:
+        """Pool CPU (créé à la demande ; thread pool en mode inline)."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    if self.backend == "process":
+                        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_worker)
+                    else:
+                        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pdf")
+        return self._pool
+
+    @property
+    def io_pool(self) -> ThreadPoolExecutor:
+        """Pool I/O (persistance Excel/Sheets) : toujours des threads."""
+        if self._io_pool is None:
+            with self._pool_lock:
+                if self._io_pool is None:
+                    self._io_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="io")
+        return self._io_pool
+
+    def warm(self) -> None:
+        """Démarre les workers process dès le startup (sinon à la 1re requête)."""
+        if self.backend == "process":
+            futs = [self.pool.submit(warm_worker) for _ in range(self.workers)]
+            for f in futs:
+                f.result()
+        else:
+            warm_worker()
+
+    def shutdown(self) -> None:
+        for p in (self._pool, self._io_pool):
+            if p is not None:
+                p.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._io_pool = None
+
+    def submit(self, fn: Callable, *args: Any):
+        """Soumission directe au pool CPU (lots) ; erreurs HTTP -> StageError."""
+        return self.pool.submit(_run_remote, fn, *args)
+
+    # ----------------------------- admission ----------------------------
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    def _admit(self) -> None:
+        # appelé depuis la boucle asyncio : pas de verrou nécessaire
+        if self._inflight >= self.capacity:
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, retry later",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self._inflight += 1
+
+    # ----------------------------- exécution ----------------------------
+    def _done(self, loop: asyncio.AbstractEventLoop) -> None:
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:   # boucle déjà fermée (arrêt)
+            pass
+
+    def _release(self) -> None:
+        self._inflight -= 1
+
+    async def _run(self, stage: str, pool: Optional[Executor], fn: Callable, *args: Any) -> Any:
+        self._admit()
+        if pool is None:
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+        loop = asyncio.get_running_loop()
+        try:
+            cfut = pool.submit(_run_remote, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # place rendue quand le calcul se termine vraiment, pas quand la requête abandonne
+        cfut.add_done_callback(lambda _: self._done(loop))
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(cfut)), timeout=self.timeouts.get(stage))
+        except asyncio.TimeoutError:
+            cfut.cancel()   # encore en file : n'occupera pas de worker
+            raise HTTPException(status_code=504, detail=f"Stage '{stage}' timed out")
+        except asyncio.CancelledError:
+            cfut.cancel()   # client parti
+            raise
+        except StageError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    async def run_cpu(self, stage: str, fn: Callable, *args: Any) -> Any:
+        """Étape CPU (parse, fill) sur le backend configuré."""
+        return await self._run(stage, None if self.backend == "inline" else self.pool, fn, *args)
+
+    async def run_io(self, stage: str, fn: Callable, *args: Any) -> Any:
+        """Étape I/O (persistance) : thread, même en mode process (état local)."""
+        return await self._run(stage, None if self.backend == "inline" else self.io_pool, fn, *args)
+
+
+PIPELINE = PipelineExecutor(
+    backend=settings.PIPELINE_BACKEND.lower(),
+    workers=settings.PIPELINE_WORKERS,
+    max_queue=settings.PIPELINE_MAX_QUEUE,
+    retry_after=settings.PIPELINE_RETRY_AFTER,
+    timeouts={
+        "parse": settings.STAGE_TIMEOUT_PARSE,
+        "fill": settings.STAGE_TIMEOUT_FILL,
+    },
+)
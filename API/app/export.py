@@ -0,0 +1,254 @@
+# API/app/export.py
+"""
+Export en streaming des données loguées : XLSX, CSV ou NDJSON.
+
+Les lignes sont lues par plages (ws.get("A1:Z2000"), ...) et écrites au fil
+de l'eau dans la réponse : mémoire bornée et premier octet immédiat, même
+avec des dizaines de milliers d'étudiants. Le XLSX est produit directement
+(ZIP en streaming + feuilles en inlineStr), sans classeur openpyxl en mémoire.
+
+Cache : chaque export terminé est conservé sur disque sous une clé
+(format, feuille, révision du Google Sheet) ; un téléchargement suivant à
+révision égale est servi tel quel.
+"""
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# (titre de feuille, itérateur de lignes ; la 1re ligne est l'entête)
+SheetRows = Tuple[str, Iterator[List[str]]]
+
+
+# ------------------------------ sources ------------------------------
+def iter_gsheet_rows(ws, chunk_rows: int = 2000) -> Iterator[List[str]]:
+    """
+    Lit une feuille Google par plages de chunk_rows lignes, jusqu'à la fin de
+    la grille (row_count). L'API omet les lignes vides en fin de plage : une
+    plage courte ne signifie pas la fin de la feuille ; les lignes vides
+    suivies de données sont rendues telles quelles ([]).
+    """
+    from gspread.utils import rowcol_to_a1
+    last_col = max(int(getattr(ws, "col_count", 26) or 26), 1)
+    last_row = int(getattr(ws, "row_count", 0) or 0)
+    start = 1
+    blank = 0   # lignes vides en attente (omises en fin de plage précédente)
+    while True:
+        end = start + chunk_rows - 1
+        a1_end = rowcol_to_a1(end, last_col)
+        block = ws.get(f"A{start}:{a1_end}")
+        if block:
+            for _ in range(blank):
+                yield []
+            blank = 0
+            for row in block:
+                yield [str(v) for v in row]
+        blank += chunk_rows - len(block)
+        # row_count peut être antérieur aux derniers ajouts : plage pleine -> on continue
+        if end >= last_row and len(block) < chunk_rows:
+            return
+        start = end + 1
+
+
+class StreamSink(io.RawIOBase):
+    """Flux non seekable : zipfile y écrit, on vide le tampon au fil de l'eau."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+        self.buffered = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        self.buffered += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        self.buffered = 0
+        return out
+
+
+# ------------------------------ XLSX ---------------------------------
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{sheets}</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_SHEET_HEAD = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    b'<sheetViews><sheetView workbookViewId="0">'
+    b'<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    b'</sheetView></sheetViews><sheetData>'
+)
+_SHEET_TAIL = b"</sheetData></worksheet>"
+
+
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xml_cell(v: str) -> str:
+    v = _XML_INVALID.sub("", escape(v))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{v}</t></is></c>'
+
+
+def stream_xlsx(sheets: Iterable[SheetRows], flush_bytes: int = 64 * 1024) -> Iterator[bytes]:
+    """Classeur XLSX minimal écrit en streaming (une part ZIP par feuille)."""
+    sink = StreamSink()
+    titles: List[str] = []
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for title, rows in sheets:
+            titles.append(title)
+            with zf.open(f"xl/worksheets/sheet{len(titles)}.xml", mode="w", force_zip64=True) as part:
+                part.write(_SHEET_HEAD)
+                for r, row in enumerate(rows, start=1):
+                    part.write(f'<row r="{r}">{"".join(_xml_cell(v) for v in row)}</row>'.encode("utf-8"))
+                    if sink.buffered >= flush_bytes:
+                        yield sink.drain()
+                part.write(_SHEET_TAIL)
+            yield sink.drain()
+
+        sheet_overrides = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, len(titles) + 1)
+        )
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES.format(sheets=sheet_overrides))
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + "".join(f'<sheet name="{escape(t, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>' for i, t in enumerate(titles, 1))
+            + "</sheets></workbook>"
+        ))
+        zf.writestr("xl/_rels/workbook.xml.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(
+                f'<Relationship Id="rId{i}" '
+                f'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                f'Target="worksheets/sheet{i}.xml"/>' for i in range(1, len(titles) + 1)
+            )
+            + "</Relationships>"
+        ))
+    yield sink.drain()
+
+
+# ---------------------------- CSV / NDJSON ----------------------------
+def stream_csv(sheets: Iterable[SheetRows], batch: int = 500) -> Iterator[bytes]:
+    """CSV d'une seule feuille (UTF-8 avec BOM, pour Excel)."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    yield b"\xef\xbb\xbf"
+    for _, rows in sheets:
+        for i, row in enumerate(rows, start=1):
+            w.writerow(row)
+            if i % batch == 0:
+                yield buf.getvalue().encode("utf-8"); buf.seek(0); buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def stream_ndjson(sheets: Iterable[SheetRows], batch: int = 500) -> Iterator[bytes]:
+    """Un objet JSON par ligne : {"sheet": ..., <colonne>: <valeur>, ...}."""
+    out: List[str] = []
+    for title, rows in sheets:
+        header: Optional[Sequence[str]] = None
+        for row in rows:
+            if header is None:
+                header = row
+                continue
+            rec = {"sheet": title}
+            rec.update({h: (row[i] if i < len(row) else "") for i, h in enumerate(header) if h})
+            out.append(json.dumps(rec, ensure_ascii=False))
+            if len(out) >= batch:
+                yield ("\n".join(out) + "\n").encode("utf-8"); out.clear()
+    if out:
+        yield ("\n".join(out) + "\n").encode("utf-8")
+
+
+WRITERS: dict = {"xlsx": stream_xlsx, "csv": stream_csv, "ndjson": stream_ndjson}
+
+
+# ------------------------------- cache --------------------------------
+def _slug(s: str) -> str:
+    return "".join(ch if ch.isalnum() else "-" for ch in s)
+
+
+def cache_path(cache_dir: Path, fmt: str, sheet: Optional[str], revision: Optional[str]) -> Optional[Path]:
+    """Fichier de cache pour (format, feuille, révision) ; None si révision inconnue."""
+    if not revision:
+        return None
+    return cache_dir / f"export_{_slug(sheet or 'all')}__{_slug(revision)}.{fmt}"
+
+
+def tee_to_cache(chunks: Iterator[bytes], path: Optional[Path]) -> Iterator[bytes]:
+    """Renvoie les octets au client et les écrit dans le cache ; publié seulement si complet."""
+    if path is None:
+        yield from chunks
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    prefix = path.name.split("__")[0]
+    # un fichier temporaire par appel : deux exports simultanés du même worker ne s'écrasent pas
+    fd, name = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".part")
+    tmp = Path(name)
+    complete = False
+    try:
+        with open(fd, "wb") as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+                yield chunk
+        complete = True
+    finally:
+        if complete:
+            try:
+                os.replace(tmp, path)
+            except FileNotFoundError:
+                return   # temporaire retiré entre-temps : un autre export a publié
+            for old in path.parent.glob(f"{prefix}__*{path.suffix}"):
+                if old != path:
+                    old.unlink(missing_ok=True)   # révisions précédentes
+        else:
+            tmp.unlink(missing_ok=True)
+
+
+def open_sheets(titles: Iterable[str], opener: Callable[[str], Optional[Iterator[List[str]]]]) -> List[SheetRows]:
+    """Résout les feuilles existantes ; opener renvoie None si la feuille est absente."""
+    out: List[SheetRows] = []
+    for t in titles:
+        rows = opener(t)
+        if rows is not None:
+            out.append((t, rows))
+    return out
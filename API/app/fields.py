@@ -0,0 +1,137 @@
+# API/app/fields.py
+"""
+Extraction rapide des champs AcroForm d'un PDF source.
+
+On ne suit que la chaîne /Root -> /AcroForm -> /Fields -> /Kids et on ne lit
+que /T, /FT, /Ff et /V (objets résolus à la demande), au lieu du
+reader.get_fields() généraliste de pypdf. Profondeur et nombre d'objets
+sont bornés ; une structure invalide lève FieldExtractionError au lieu de
+renvoyer silencieusement {}.
+
+Les clés (noms qualifiés « parent.enfant », 12.7.3.2) et le texte
+(FieldValue.text) sont identiques à extract_all_values(get_fields(reader)) :
+colonnes et valeurs loguées inchangées.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+from pypdf import PdfReader
+from pypdf.errors import PdfReadError, PdfStreamError
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+MAX_DEPTH = 32
+MAX_OBJECTS = 20_000
+
+# bits /Ff (PDF 32000-1, 12.7.4.2)
+_FF_RADIO = 1 << 15
+_FF_PUSHBUTTON = 1 << 16
+
+
+class FieldExtractionError(ValueError):
+    """Arbre de champs invalide ou hors limites."""
+
+
+@dataclass(frozen=True)
+class FieldValue:
+    name: str
+    kind: str                                   # text | checkbox | radio | pushbutton | choice | signature | unknown
+    value: Union[str, bool, List[str], None]    # valeur typée
+    text: str                                   # même rendu que as_text()
+
+
+def _typed(kind: str, raw: Any) -> Union[str, bool, List[str], None]:
+    if kind == "checkbox":
+        return raw is not None and str(raw) != "/Off"
+    if kind == "radio":
+        return None if raw is None or str(raw) == "/Off" else str(raw).lstrip("/")
+    if kind == "choice":
+        if isinstance(raw, ArrayObject):
+            return [str(v) for v in raw]
+        return None if raw is None else str(raw)
+    if kind == "signature":
+        return raw is not None
+    return None if raw is None else str(raw)
+
+
+def _kind(ft: Optional[str], ff: int) -> str:
+    if ft == "/Tx":
+        return "text"
+    if ft == "/Btn":
+        if ff & _FF_PUSHBUTTON:
+            return "pushbutton"
+        return "radio" if ff & _FF_RADIO else "checkbox"
+    if ft == "/Ch":
+        return "choice"
+    if ft == "/Sig":
+        return "signature"
+    return "unknown"
+
+
+def extract_fields(
+    reader: PdfReader, max_depth: int = MAX_DEPTH, max_objects: int = MAX_OBJECTS
+) -> Dict[str, FieldValue]:
+    """Champs du formulaire (ordre préfixe, comme get_fields). {} si pas d'AcroForm."""
+    try:
+        root = reader.trailer["/Root"].get_object()
+        acro = root.get("/AcroForm")
+        if acro is None:
+            return {}
+        acro = acro.get_object()
+        top = acro.get("/Fields")
+        if top is None:
+            return {}
+        top = top.get_object()
+        if not isinstance(top, ArrayObject):
+            raise FieldExtractionError("/AcroForm /Fields is not an array")
+
+        out: Dict[str, FieldValue] = {}
+        seen: set = set()
+        count = 0
+        # (réf, profondeur, nom qualifié du parent, /FT hérité, /Ff hérité)
+        stack: List[tuple] = [(ref, 0, "", None, 0) for ref in reversed(top)]
+        while stack:
+            ref, depth, qualified, ft, ff = stack.pop()
+            if depth > max_depth:
+                raise FieldExtractionError(f"field tree deeper than {max_depth}")
+            count += 1
+            if count > max_objects:
+                raise FieldExtractionError(f"more than {max_objects} field objects")
+            if isinstance(ref, IndirectObject):
+                key = (ref.idnum, ref.generation)
+                if key in seen:
+                    raise FieldExtractionError(f"cycle in field tree at object {ref.idnum}")
+                seen.add(key)
+            node = ref.get_object()
+            if not isinstance(node, DictionaryObject):
+                raise FieldExtractionError("field entry is not a dictionary")
+
+            # attributs héritables (12.7.3.1) ; /V : valeur propre, comme get_fields
+            ft = node.get("/FT", ft)
+            ff = int(node.get("/Ff", ff) or 0)
+            name = node.get("/T")
+            if name is not None:   # widget sans /T : garde le nom de son parent
+                qualified = f"{qualified}.{name}" if qualified else str(name)
+                raw = node.get("/V")
+                if isinstance(raw, IndirectObject):
+                    raw = raw.get_object()
+                kind = _kind(str(ft) if ft is not None else None, ff)
+                text = "" if raw is None else str(raw).strip()
+                out[qualified] = FieldValue(qualified, kind, _typed(kind, raw), text)
+
+            kids = node.get("/Kids")
+            if kids is not None:
+                kids = kids.get_object()
+                if not isinstance(kids, ArrayObject):
+                    raise FieldExtractionError("/Kids is not an array")
+                for kid in reversed(kids):
+                    stack.append((kid, depth + 1, qualified, ft, ff))
+        return out
+    except FieldExtractionError:
+        raise
+    except (PdfReadError, PdfStreamError, KeyError, TypeError, ValueError, AttributeError) as e:
+        raise FieldExtractionError(f"{type(e).__name__}: {e}") from e
+
+
+def extract_values(reader: PdfReader, **limits: int) -> Dict[str, str]:
+    """Équivalent rapide de extract_all_values(get_fields(reader))."""
+    return {name: f.text for name, f in extract_fields(reader, **limits).items()}
@@ -0,0 +1,114 @@
+# API/app/group_commit.py
+"""
+Regroupement des écritures concurrentes d'un process (group commit).
+
+Chaque requête dépose ses lignes et attend ; un thread d'écriture prend tout
+ce qui est arrivé pendant l'écriture précédente et l'enregistre en une seule
+transaction. Aucune attente ajoutée quand le trafic est faible (lot d'une
+ligne), une transaction par lot quand il monte : c'est le verrou d'écriture
+SQLite (partagé par tous les workers uvicorn) qui fixe le débit, plus le
+nombre de requêtes.
+
+- submit() ne rend la main qu'une fois la transaction validée (même garantie
+  qu'un append direct)
+- un lot en échec est rejoué entrée par entrée : seule la requête fautive
+  reçoit l'exception
+"""
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from . import metrics
+
+log = logging.getLogger("quitus-api")
+
+Batch = List[Tuple[str, List[Dict[str, str]]]]   # [(feuille, lignes), ...]
+
+
+@dataclass
+class _Pending:
+    sheet: str
+    rows: List[Dict[str, str]]
+    done: threading.Event = field(default_factory=threading.Event)
+    error: Optional[BaseException] = None
+
+
+class GroupCommitter:
+    def __init__(self, write: Callable[[Batch], None], max_rows: int = 1000, name: str = "persist"):
+        self._write = write
+        self.max_rows = max(1, max_rows)
+        self.name = name
+        self._queue: Deque[_Pending] = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+
+    def submit(self, sheet: str, rows: List[Dict[str, str]]) -> None:
+        """Bloque jusqu'à l'écriture (lève l'erreur de cette entrée le cas échéant)."""
+        if not rows:
+            return
+        p = _Pending(sheet, rows)
+        with self._cond:
+            if self._stop:   # arrêt en cours : écriture directe
+                self._write([(sheet, rows)])
+                return
+            self._queue.append(p)
+            self._start()
+            self._cond.notify()
+        p.done.wait()
+        if p.error is not None:
+            raise p.error
+
+    # ----------------------------- écriture ------------------------------
+    def _start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+            self._thread.start()
+
+    def _take(self) -> List[_Pending]:
+        """Tout ce qui attend, dans la limite de max_rows (au moins une entrée)."""
+        out, n = [], 0
+        while self._queue and (not out or n + len(self._queue[0].rows) <= self.max_rows):
+            p = self._queue.popleft()
+            out.append(p)
+            n += len(p.rows)
+        return out
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stop:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                group = self._take()
+            self._commit(group)
+
+    def _commit(self, group: List[_Pending]) -> None:
+        metrics.GROUP_COMMIT_ROWS.observe(sum(len(p.rows) for p in group), writer=self.name)
+        try:
+            self._write([(p.sheet, p.rows) for p in group])
+        except Exception as e:
+            if len(group) == 1:
+                group[0].error = e
+            else:   # on isole la ou les entrées fautives
+                log.warning("Écriture groupée (%s) échouée, reprise entrée par entrée", self.name)
+                for p in group:
+                    try:
+                        self._write([(p.sheet, p.rows)])
+                    except Exception as e2:
+                        p.error = e2
+        finally:
+            for p in group:
+                p.done.set()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Écrit ce qui reste puis arrête le thread."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
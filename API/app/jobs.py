@@ -0,0 +1,278 @@
+# API/app/jobs.py
+"""
+Jobs asynchrones : POST /jobs rend la main tout de suite, le quitus est
+produit en tâche de fond.
+
+- exécution sur la boucle asyncio, JOBS_WORKERS jobs à la fois (le calcul
+  lui-même passe par PIPELINE, cf. executor.py)
+- au-delà de JOBS_MAX_PENDING jobs en attente/en cours : 503 + Retry-After
+- résultat écrit dans data/jobs/<id>/<quitus>.pdf ; job et fichier supprimés
+  JOB_TTL secondes après la fin (balayage périodique + à chaque appel)
+- état partagé entre workers uvicorn (data/jobs/jobs.sqlite3) : le suivi
+  d'un job répond quel que soit le worker interrogé ; chaque worker exécute
+  les siens et signale qu'il est vivant (seen) ; un job dont le worker a
+  disparu (redémarrage) passe en erreur au lieu de rester "running"
+"""
+import asyncio
+import json
+import logging
+import os
+import secrets
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .uploads import SourcePdf
+
+log = logging.getLogger("quitus-api")
+
+# (doc_type, source, idempotency_key, modèle, sortie) -> (nom de fichier, octets PDF, statut cache)
+Runner = Callable[[str, SourcePdf, Optional[str], Optional[str], str], Awaitable[Tuple[str, bytes, str]]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    owner       TEXT NOT NULL,
+    seen        REAL NOT NULL,
+    finished_at REAL,
+    data        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+"""
+_DB = "jobs.sqlite3"
+_STORED = ("id", "doc_type", "template", "output", "status", "created_at", "finished_at",
+           "filename", "path", "cache", "error_status", "error")
+
+
+@dataclass
+class Job:
+    id: str
+    doc_type: str
+    template: Optional[str] = None
+    output: str = "form"                    # form | flat
+    status: str = "queued"                  # queued | running | done | error
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    filename: Optional[str] = None
+    path: Optional[Path] = None
+    cache: Optional[str] = None
+    error_status: Optional[int] = None
+    error: Optional[str] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "id": self.id, "status": self.status, "doc_type": self.doc_type, "template": self.template,
+            "output": self.output,
+            "created_at": self.created_at, "finished_at": self.finished_at,
+        }
+        if self.status == "done":
+            out.update(filename=self.filename, cache=self.cache, result_url=f"/jobs/{self.id}/result")
+        elif self.status == "error":
+            out["error"] = {"status_code": self.error_status, "detail": self.error}
+        return out
+
+    def dumps(self) -> str:
+        return json.dumps({k: str(v) if isinstance(v, Path) else v
+                           for k, v in ((k, getattr(self, k)) for k in _STORED)})
+
+    @classmethod
+    def loads(cls, data: str) -> "Job":
+        values = json.loads(data)
+        job = cls(**values)
+        if job.path is not None:
+            job.path = Path(job.path)
+        if job.finished_at is not None:
+            job.done.set()
+        return job
+
+
+class JobManager:
+    def __init__(self, run: Runner, result_dir: Path, workers: int = 4, max_pending: int = 100,
+                 ttl: float = 3600.0, retry_after: int = 2):
+        self._run = run
+        self.result_dir = result_dir
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, "asyncio.Task[None]"] = {}
+        self._slots: Optional[asyncio.Semaphore] = None   # créé sur la boucle du serveur
+        self._sweeper: Optional["asyncio.Task[None]"] = None
+        self.result_dir.mkdir(parents=True, exist_ok=True)
+        self.owner = f"{os.getpid()}-{secrets.token_hex(4)}"
+        self.interval = max(1.0, min(self.ttl, 60.0))   # balayage + signe de vie
+        self._local = threading.local()
+        self._con().executescript(_SCHEMA)
+
+    # ------------------------- état partagé ------------------------------
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.result_dir / _DB, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA busy_timeout=30000")
+            self._local.con = con
+        return con
+
+    def _save(self, job: Job) -> None:
+        self._con().execute(
+            "INSERT OR REPLACE INTO jobs (id, owner, seen, finished_at, data) VALUES (?, ?, ?, ?, ?)",
+            (job.id, self.owner, time.time(), job.finished_at, job.dumps()))
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        row = self._con().execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.loads(row[0]) if row else None
+
+    # ------------------------------ API --------------------------------
+    def pending(self) -> int:
+        return sum(j.status in ("queued", "running") for j in self._jobs.values())
+
+    def submit(self, doc_type: str, src: SourcePdf, idempotency_key: Optional[str] = None,
+               template: Optional[str] = None, output: str = "form") -> Job:
+        """Crée le job (la source lui appartient : nettoyée après exécution)."""
+        self.sweep()
+        if self.pending() >= self.max_pending:
+            src.cleanup()
+            raise HTTPException(status_code=503, detail="Too many pending jobs, retry later",
+                                headers={"Retry-After": str(self.retry_after)})
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        job = Job(id=secrets.token_urlsafe(16), doc_type=doc_type, template=template, output=output)   # id non devinable : données personnelles
+        try:
+            self._save(job)
+        except Exception:
+            src.cleanup()
+            raise
+        self._jobs[job.id] = job
+        self._tasks[job.id] = asyncio.get_running_loop().create_task(self._execute(job, src, idempotency_key))
+        return job
+
+    def get(self, job_id: str) -> Job:
+        self.sweep()
+        job = self._jobs.get(job_id) or self._load(job_id)   # job d'un autre worker
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired job")
+        return job
+
+    async def wait(self, job: Job, timeout: Optional[float] = None) -> Job:
+        await asyncio.wait_for(job.done.wait(), timeout)
+        return job
+
+    def counts(self) -> Dict[str, int]:
+        """Jobs de ce worker, par statut."""
+        out = {"queued": 0, "running": 0, "done": 0, "error": 0}
+        for j in self._jobs.values():
+            out[j.status] += 1
+        return out
+
+    # ---------------------------- exécution ------------------------------
+    async def _execute(self, job: Job, src: SourcePdf, idempotency_key: Optional[str]) -> None:
+        assert self._slots is not None
+        try:
+            async with self._slots:
+                job.status = "running"
+                self._save(job)
+                filename, pdf_out, job.cache = await self._run(
+                    job.doc_type, src, idempotency_key, job.template, job.output)
+                out_dir = self.result_dir / job.id
+                path = out_dir / filename
+                await asyncio.to_thread(_write, path, pdf_out)
+                job.filename, job.path, job.status = filename, path, "done"
+        except HTTPException as e:
+            job.status, job.error_status, job.error = "error", e.status_code, str(e.detail)
+        except asyncio.CancelledError:   # arrêt du worker : état final visible des autres
+            job.status, job.error_status, job.error = "error", 503, "Server shut down before the job finished"
+            raise
+        except Exception as e:
+            log.exception("Job %s échoué", job.id)
+            job.status, job.error_status, job.error = "error", 500, f"{type(e).__name__}: {e}"
+        finally:
+            src.cleanup()
+            job.finished_at = time.time()
+            try:
+                self._save(job)
+            except Exception:
+                log.exception("Job %s : état non enregistré", job.id)
+            job.done.set()
+            self._tasks.pop(job.id, None)
+
+    # ------------------------------ nettoyage -----------------------------
+    def sweep(self) -> int:
+        """Supprime les jobs (de tous les workers) terminés depuis plus de ttl secondes, et leur fichier."""
+        limit = time.time() - self.ttl
+        for j in [j for j in self._jobs.values() if j.finished_at is not None and j.finished_at < limit]:
+            del self._jobs[j.id]
+        con = self._con()
+        expired = [i for (i,) in con.execute("SELECT id FROM jobs WHERE finished_at < ?", (limit,))]
+        if expired:
+            con.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in expired])
+            for i in expired:
+                shutil.rmtree(self.result_dir / i, ignore_errors=True)
+        return len(expired)
+
+    def _heartbeat(self) -> None:
+        """Signe de vie pour nos jobs ; ceux d'un worker disparu passent en erreur."""
+        now = time.time()
+        con = self._con()
+        con.execute("UPDATE jobs SET seen = ? WHERE owner = ? AND finished_at IS NULL", (now, self.owner))
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            lost: List[Job] = [Job.loads(d) for (d,) in con.execute(
+                "SELECT data FROM jobs WHERE finished_at IS NULL AND owner != ? AND seen < ?",
+                (self.owner, now - 3 * self.interval))]
+            for job in lost:
+                job.status, job.error_status, job.error = "error", 500, "Worker restarted before the job finished"
+                job.finished_at = now
+                con.execute("UPDATE jobs SET finished_at = ?, data = ? WHERE id = ?",
+                            (now, job.dumps(), job.id))
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        if lost:
+            log.warning("%d job(s) abandonné(s) par un worker arrêté", len(lost))
+
+    def purge_orphans(self) -> None:
+        """Dossiers de résultat sans job (expirés pendant un arrêt) ; ceux des autres workers sont gardés."""
+        known = {i for (i,) in self._con().execute("SELECT id FROM jobs")}
+        for p in self.result_dir.iterdir():
+            if p.is_dir() and p.name not in known:
+                shutil.rmtree(p, ignore_errors=True)
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self._heartbeat()
+                self.sweep()
+            except Exception as e:   # base verrouillée, disque plein... : prochain tour
+                log.warning("Jobs : balayage échoué (%s)", e)
+
+    def start(self) -> None:
+        """Au démarrage (sur la boucle du serveur) : purge + balayage périodique."""
+        self._heartbeat()
+        self.purge_orphans()
+        if self._sweeper is None:
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_forever())
+
+    async def close(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        tasks = list(self._tasks.values())
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
@@ -0,0 +1,364 @@
+# API/app/local_store.py
+"""
+Persistance locale (EXCEL_MODE=local) : SQLite en mode WAL, append-only.
+
+- une ligne = un INSERT (coût constant, indépendant du nombre de lignes)
+- colonnes dynamiques par feuille ("Licence" / "Master") dans `columns`,
+  internées en mémoire (schema.Schema) : une ligne est stockée en liste JSON
+  dans l'ordre des colonnes, sans répéter les noms de champs (les anciennes
+  lignes en objet JSON restent lisibles)
+- écritures sûres en concurrence (BEGIN IMMEDIATE + busy_timeout), entre
+  threads comme entre workers ; append_batch = une transaction pour les
+  lignes de plusieurs requêtes (cf. group_commit)
+- students_data.xlsx n'est généré qu'à la demande (/download/excel), puis
+  réutilisé tant qu'aucune nouvelle ligne n'est arrivée
+- cin / nom / prénom recopiés en colonnes indexées à l'écriture : GET /students
+  répond par recherche d'index, sans relire les lignes (cf. find)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .schema import Schema, SchemaRegistry
+
+SHEETS = ("Licence", "Master")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS columns (
+    sheet TEXT NOT NULL,
+    name  TEXT NOT NULL,
+    pos   INTEGER NOT NULL,
+    PRIMARY KEY (sheet, name)
+);
+CREATE TABLE IF NOT EXISTS rows (
+    id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    sheet  TEXT NOT NULL,
+    data   TEXT NOT NULL,
+    cin    TEXT NOT NULL DEFAULT '',
+    nom    TEXT NOT NULL DEFAULT '',
+    prenom TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS rows_sheet ON rows (sheet, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# colonne indexée -> champ du PDF source
+INDEXED = {"cin": "cin", "nom": "student_nom", "prenom": "student_prenom"}
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS rows_cin ON rows (cin);
+CREATE INDEX IF NOT EXISTS rows_nom ON rows (nom);
+CREATE INDEX IF NOT EXISTS rows_prenom ON rows (prenom);
+"""
+
+
+def norm_name(value: Any) -> str:
+    """Clé de recherche : sans accents, casse ni espaces superflus ("Bén  SALAH" -> "ben salah")."""
+    s = unicodedata.normalize("NFKD", str(value or ""))
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return " ".join(s.casefold().split())
+
+
+def _keys(values: Dict[str, str]) -> Tuple[str, str, str]:
+    return (str(values.get(INDEXED["cin"]) or "").strip(),
+            norm_name(values.get(INDEXED["nom"])), norm_name(values.get(INDEXED["prenom"])))
+
+
+class LocalStore:
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._export_lock = threading.Lock()
+        self._con().executescript(_SCHEMA)
+        self.schemas = SchemaRegistry(self.header)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Colonnes indexées ajoutées aux bases existantes, remplies une fois depuis le JSON."""
+        con = self._con()
+
+        def missing() -> bool:
+            return "cin" not in {r[1] for r in con.execute("PRAGMA table_info(rows)")}
+        if missing():
+            with self._tx() as tx:
+                if missing():   # revérifié sous verrou : un autre worker a pu migrer entre-temps
+                    for col in INDEXED:
+                        tx.execute(f"ALTER TABLE rows ADD COLUMN {col} TEXT NOT NULL DEFAULT ''")
+                    cur = tx.execute("SELECT id, data FROM rows")
+                    tx.executemany("UPDATE rows SET cin = ?, nom = ?, prenom = ? WHERE id = ?",
+                                   [(*_keys(json.loads(data)), i) for i, data in cur.fetchall()])
+        con.executescript(_INDEXES)
+
+    # ---------------------------- connexions ----------------------------
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")   # WAL : sûr en cas de crash applicatif
+            con.execute("PRAGMA busy_timeout=30000")
+            self._local.con = con
+        return con
+
+    class _Tx:
+        def __init__(self, con: sqlite3.Connection):
+            self.con = con
+
+        def __enter__(self) -> sqlite3.Connection:
+            self.con.execute("BEGIN IMMEDIATE")   # verrou d'écriture dès le début
+            return self.con
+
+        def __exit__(self, exc_type, exc, tb) -> None:
+            self.con.execute("ROLLBACK" if exc_type else "COMMIT")
+
+    def _tx(self) -> "LocalStore._Tx":
+        return self._Tx(self._con())
+
+    def close(self) -> None:
+        """Ferme la connexion du thread courant."""
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+    # ------------------------------ écriture -----------------------------
+    def _sync_schema(self, con: sqlite3.Connection, sheet: str) -> Schema:
+        """Schéma en mémoire rattrapé sur `columns` (colonnes ajoutées par un autre process)."""
+        schema = self.schemas.get(sheet)
+        (n,) = con.execute("SELECT COUNT(*) FROM columns WHERE sheet = ?", (sheet,)).fetchone()
+        if n > schema.version:
+            cur = con.execute("SELECT name FROM columns WHERE sheet = ? AND pos >= ? ORDER BY pos",
+                              (sheet, schema.version))
+            schema.add(name for (name,) in cur)
+        elif n < schema.version:   # ne devrait pas arriver (cf. append_rows) : on repart de la base
+            self.schemas.reset(sheet)
+            schema = self.schemas.get(sheet)
+        return schema
+
+    def append_rows(self, sheet: str, rows: List[Dict[str, str]]) -> None:
+        """Ajoute des lignes (colonnes inconnues ajoutées à la volée)."""
+        self.append_batch([(sheet, rows)])
+
+    def append_batch(self, batch: List[Tuple[str, List[Dict[str, str]]]]) -> None:
+        """Plusieurs appels append_rows en une seule transaction (cf. group_commit)."""
+        batch = [(sheet, rows) for sheet, rows in batch if rows]
+        if not batch:
+            return
+        try:
+            with self._tx() as con:
+                for sheet, rows in batch:
+                    self._insert(con, sheet, rows)
+        except Exception:
+            self.schemas.reset()   # colonnes internées mais pas écrites
+            raise
+
+    def _insert(self, con: sqlite3.Connection, sheet: str, rows: List[Dict[str, str]]) -> None:
+        schema = self._sync_schema(con, sheet)
+        new_cols = schema.add_rows(rows)
+        if new_cols:
+            con.executemany("INSERT INTO columns (sheet, name, pos) VALUES (?, ?, ?)",
+                            [(sheet, k, schema.index[k]) for k in new_cols])
+        con.executemany(
+            "INSERT INTO rows (sheet, data, cin, nom, prenom) VALUES (?, ?, ?, ?, ?)",
+            [(sheet, json.dumps(schema.encode(values), ensure_ascii=False), *_keys(values))
+             for values in rows],
+        )
+
+    def replace_rows(self, sources: Iterable[Tuple[str, Iterable[Dict[str, str]]]], marker: str) -> int:
+        """
+        Remplace toutes les lignes (index miroir reconstruit) et pose `marker`,
+        en une transaction : tout ou rien. Les colonnes sont gardées (positions
+        stables pour les autres process). Renvoie le nombre de lignes écrites.
+        """
+        n = 0
+        try:
+            with self._tx() as con:
+                con.execute("DELETE FROM rows")
+                for sheet, rows in sources:
+                    chunk: List[Dict[str, str]] = []
+                    for values in rows:
+                        chunk.append(values)
+                        if len(chunk) >= 1000:
+                            self._insert(con, sheet, chunk); n += len(chunk); chunk = []
+                    self._insert(con, sheet, chunk); n += len(chunk)
+                con.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (marker, str(os.getpid())))
+        except Exception:
+            self.schemas.reset()
+            raise
+        return n
+
+    # ------------------------------ lecture ------------------------------
+    def header(self, sheet: str) -> List[str]:
+        cur = self._con().execute("SELECT name FROM columns WHERE sheet = ? ORDER BY pos", (sheet,))
+        return [n for (n,) in cur]
+
+    def _decode(self, data: str, header: List[str]) -> Dict[str, str]:
+        values = json.loads(data)
+        if isinstance(values, dict):   # ligne écrite avant l'internement des colonnes
+            return values
+        return {n: v for n, v in zip(header, values) if v is not None}
+
+    def iter_rows(self, sheet: str) -> Iterator[Dict[str, str]]:
+        header = self.header(sheet)
+        cur = self._con().execute("SELECT data FROM rows WHERE sheet = ? ORDER BY id", (sheet,))
+        for (data,) in cur:
+            yield self._decode(data, header)
+
+    def _iter_aligned(self, sheet: str, header: List[str]) -> Iterator[List[str]]:
+        """Lignes alignées sur `header` : les listes sont déjà dans l'ordre des colonnes."""
+        width = len(header)
+        cur = self._con().execute("SELECT data FROM rows WHERE sheet = ? ORDER BY id", (sheet,))
+        for (data,) in cur:
+            values = json.loads(data)
+            if isinstance(values, dict):
+                yield [values.get(col, "") for col in header]
+                continue
+            row = ["" if v is None else v for v in values[:width]]
+            if len(row) < width:
+                row += [""] * (width - len(row))
+            yield row
+
+    def iter_table(self, sheet: str) -> Optional[Iterator[List[str]]]:
+        """Entête puis lignes alignées (None si la feuille n'a jamais été écrite)."""
+        header = self.header(sheet)
+        if not header:
+            return None
+
+        def _gen() -> Iterator[List[str]]:
+            yield header
+            yield from self._iter_aligned(sheet, header)
+        return _gen()
+
+    def cins(self, sheet: str) -> Iterator[str]:
+        """cin déjà enregistrés (dédoublonnage de l'import en masse)."""
+        cur = self._con().execute("SELECT DISTINCT cin FROM rows WHERE sheet = ? AND cin != ''", (sheet,))
+        for (cin,) in cur:
+            yield cin
+
+    def find(self, sheet: Optional[str] = None, cin: Optional[str] = None, nom: Optional[str] = None,
+             prenom: Optional[str] = None, after: int = 0, limit: int = 50,
+             ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Lignes filtrées (cin exact, nom / prénom par préfixe normalisé), par id
+        croissant. Pagination par curseur : renvoie (lignes, id à passer en
+        `after` pour la page suivante, ou None).
+        """
+        where, args = ["id > ?"], [after]
+        if sheet:
+            where.append("sheet = ?"); args.append(sheet)
+        if cin:
+            where.append("cin = ?"); args.append(cin.strip())
+        for col, prefix in (("nom", nom), ("prenom", prenom)):
+            key = norm_name(prefix)
+            if key:   # préfixe en intervalle : utilisable par l'index
+                where.append(f"{col} >= ? AND {col} < ?"); args += [key, key + "\U0010ffff"]
+        cur = self._con().execute(
+            f"SELECT id, sheet, data FROM rows WHERE {' AND '.join(where)} ORDER BY id LIMIT ?",
+            (*args, limit + 1),
+        )
+        headers: Dict[str, List[str]] = {}
+        out = []
+        for i, s, d in cur:
+            if s not in headers:
+                headers[s] = self.header(s)
+            out.append({"id": i, "sheet": s, "fields": self._decode(d, headers[s])})
+        if len(out) > limit:
+            return out[:limit], out[limit - 1]["id"]
+        return out, None
+
+    def version(self) -> int:
+        """Change à chaque nouvelle ligne (id max)."""
+        (v,) = self._con().execute("SELECT COALESCE(MAX(id), 0) FROM rows").fetchone()
+        return int(v)
+
+    def is_empty(self) -> bool:
+        return self.version() == 0
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._con().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._con().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def claim(self, key: str) -> bool:
+        """Vrai pour le premier appelant seulement (tâche unique entre process)."""
+        cur = self._con().execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", (key, str(os.getpid())))
+        return cur.rowcount == 1
+
+    def marked(self, key: str) -> bool:
+        return self._meta(key) is not None
+
+    def lease(self, key: str, seconds: float) -> bool:
+        """Tâche en cours dans un seul process ; reprise par un autre si le bail expire (process tué)."""
+        now = time.time()
+        with self._tx() as con:
+            row = con.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            if row is not None and float(row[0]) > now:
+                return False
+            con.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(now + seconds)))
+        return True
+
+    def release(self, key: str) -> None:
+        self._con().execute("DELETE FROM meta WHERE key = ?", (key,))
+
+    # ------------------------------- export ------------------------------
+    def export_xlsx(self, path: Path) -> Optional[Path]:
+        """
+        Matérialise le classeur (une feuille par doc_type, entête en ligne 1).
+        Réutilise le fichier existant si aucune ligne n'a été ajoutée depuis.
+        Retourne None si le store est vide.
+        """
+        version = self.version()
+        if version == 0:
+            return None
+        with self._export_lock:
+            if path.exists() and self._meta("xlsx_version") == str(version):
+                return path
+            import openpyxl   # seulement pour l'export / la migration
+            wb = openpyxl.Workbook(write_only=True)
+            for sheet in SHEETS:
+                header = self.header(sheet)
+                if not header:
+                    continue
+                ws = wb.create_sheet(title=sheet)
+                ws.append(header)
+                for row in self._iter_aligned(sheet, header):
+                    ws.append(row)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            wb.save(tmp)
+            os.replace(tmp, path)   # atomique : jamais de fichier à moitié écrit
+            self._set_meta("xlsx_version", str(version))
+            return path
+
+    # ------------------------------ migration ----------------------------
+    def import_xlsx(self, path: Path) -> int:
+        """Reprise unique d'un students_data.xlsx existant (ancien format)."""
+        if not path.exists() or not self.is_empty() or not self.claim("xlsx_import"):
+            return 0   # claim : un seul worker fait la reprise
+        import openpyxl
+        wb = openpyxl.load_workbook(path, read_only=True)
+        n = 0
+        try:
+            for sheet in SHEETS:
+                if sheet not in wb.sheetnames:
+                    continue
+                it: Iterable = wb[sheet].iter_rows(values_only=True)
+                header = [str(h or "").strip() for h in next(iter(it), ())]
+                rows = [
+                    {h: ("" if v is None else str(v)) for h, v in zip(header, r) if h}
+                    for r in it
+                ]
+                self.append_rows(sheet, rows)
+                n += len(rows)
+        finally:
+            wb.close()
+        self._set_meta("xlsx_version", str(self.version()))
+        return n
@@ -1,24 +1,37 @@
-import io
+import asyncio
 from typing import Optional, Dict, Any, List
 from pathlib import Path
 import sys, logging, re, unicodedata
-from fastapi.responses import FileResponse, RedirectResponse
-from pypdf.errors import PdfReadError, PdfStreamError
-from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Query
-from fastapi.responses import StreamingResponse, JSONResponse
-from pypdf import PdfReader, PdfWriter
-from pypdf.generic import NameObject, BooleanObject
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-import openpyxl
-import os, json
-import gspread
-from google.oauth2.service_account import Credentials
+from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+import os, json, secrets, threading, zipfile
 
 from .settings import settings
-# --- monter l'UI Gradio à la racine ---
-import gradio as gr
-from .build_ui import build_demo  # adapte l'import si besoin (chemin relatif au repo)
+from .pipeline import (
+    TEMPLATES, TEMPLATES_DIR, safe_filename, get_fields, as_text, extract_all_values,
+    fill_acroform, overlay_text, get_template_path, get_template, open_source_pdf,
+    render_quitus, extract_source, template_version, get_plan, OUTPUT_MODES,
+)
+from .batch import BatchSources, stream_batch_zip
+from .executor import PIPELINE
+from .admission import Admission, Caller
+from .local_store import LocalStore
+from .sheets_sink import SheetsSink
+from .group_commit import GroupCommitter
+from .responses import BytesResponse, file_response
+from .result_cache import ResultCache, content_key
+from .export import (
+    MEDIA_TYPES, WRITERS, iter_gsheet_rows, open_sheets, tee_to_cache,
+    cache_path as export_cache_path,
+)
+from . import metrics
+from .metrics import MetricsMiddleware, stage, timed_iter
+from .uploads import SourcePdf, UploadLimitMiddleware, save_upload, source_from_bytes, spool_upload
+from .jobs import JobManager
+from .bulk_import import ImportManager
+# gradio, gspread / google-auth et openpyxl : importés à la demande (démarrage rapide,
+# cf. UI_ENABLED et EXCEL_MODE)
 
 # --- logging global (lisible sur Render aussi) ---
 logging.basicConfig(
@@ -28,21 +41,30 @@ logging.basicConfig(
 )
 log = logging.getLogger("quitus-api")
 
-# --- helper nom de fichier propre (pour quitus_fullname.pdf) ---
-def safe_filename(full_name: str, fallback: str = "document") -> str:
-    s = unicodedata.normalize("NFKD", (full_name or "")).encode("ascii", "ignore").decode("ascii")
-    s = re.sub(r"[^A-Za-z0-9]+", "_", s).strip("_")
-    return s or fallback
-
 # --------------------------- App & chemins ---------------------------
 app = FastAPI(title="Quitus Filler API")
+app.add_middleware(UploadLimitMiddleware, limits={
+    "/process": settings.MAX_UPLOAD_MB * 1024 * 1024,
+    "/process/batch": settings.BATCH_MAX_UPLOAD_MB * 1024 * 1024,
+    "/jobs": settings.MAX_UPLOAD_MB * 1024 * 1024,
+    "/imports": settings.IMPORT_MAX_UPLOAD_MB * 1024 * 1024,
+})
+app.add_middleware(MetricsMiddleware)
 
 BASE_DIR = Path(__file__).parent
-TEMPLATES_DIR = BASE_DIR / "templates"          # un seul modèle: quitus.pdf
-DATA_DIR = BASE_DIR.parent / "data"
-DATA_DIR.mkdir(exist_ok=True)
-EXCEL_PATH = DATA_DIR / "students_data.xlsx"
+DATA_DIR = Path(settings.DATA_DIR) if settings.DATA_DIR else BASE_DIR.parent / "data"
+DATA_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_DIR = DATA_DIR / "uploads"                # uploads > UPLOAD_SPOOL_KB copiés pour les workers process
+UPLOAD_DIR.mkdir(exist_ok=True)
+NEED_PATH = PIPELINE.backend == "process"        # sinon : descripteur sur le spool de la requête, sans copie
+EXCEL_PATH = DATA_DIR / "students_data.xlsx"    # généré à la demande (export)
+STORE_PATH = DATA_DIR / "students_data.sqlite3"  # source de vérité en mode local
+EXPORT_DIR = DATA_DIR / "exports"                # exports mis en cache (clé = révision)
 
+LOCAL_STORE = LocalStore(STORE_PATH)
+# écritures groupées : une transaction pour les lignes de toutes les requêtes en attente
+# (le verrou d'écriture SQLite sérialise déjà les workers uvicorn entre eux)
+LOCAL_WRITES = GroupCommitter(LOCAL_STORE.append_batch, settings.PERSIST_GROUP_MAX_ROWS, name="local")
 
 
 # ------------------------------ Sécurité ----------------------------
@@ -50,78 +72,18 @@ def require_api_key(x_api_key: Optional[str] = Header(default=None)) -> None:
     if settings.API_KEY and x_api_key != settings.API_KEY:
         raise HTTPException(status_code=401, detail="Invalid API key")
 
-# --------------------------- Helpers PDF ----------------------------
-def get_fields(reader: PdfReader) -> Dict[str, Dict[str, Any]]:
-    try:
-        return reader.get_fields() or {}
-    except Exception:
-        return {}
-
-def as_text(v: Any) -> str:
-    if isinstance(v, dict):
-        v = v.get("/V", "")
-    return "" if v is None else str(v).strip()
-
-def extract_all_values(fields: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
-    return {name: as_text(obj) for name, obj in fields.items()}
-
-def fill_acroform(base_reader: PdfReader, mapping: Dict[str, str]) -> bytes:
-    writer = PdfWriter()
-    writer.clone_document_from_reader(base_reader)
-    if "/AcroForm" in writer._root_object:
-        writer._root_object["/AcroForm"][NameObject("/NeedAppearances")] = BooleanObject(True)
-    writer.update_page_form_field_values(writer.pages[0], mapping)
-    buf = io.BytesIO(); writer.write(buf); buf.seek(0)
-    return buf.read()
-
-def overlay_text(base_reader: PdfReader, lines: List[tuple[str, float, float]]) -> bytes:
-    writer = PdfWriter()
-    for p in base_reader.pages:
-        writer.add_page(p)
-    packet = io.BytesIO()
-    c = canvas.Canvas(packet, pagesize=A4); c.setFont("Helvetica", 12)
-    for txt, x, y in lines: c.drawString(x, y, txt)
-    c.save(); packet.seek(0)
-    overlay_pdf = PdfReader(packet)
-    writer.pages[0].merge_page(overlay_pdf.pages[0])
-    out = io.BytesIO(); writer.write(out); out.seek(0)
-    return out.read()
-
-def get_template_path() -> Path:
-    path = TEMPLATES_DIR / "quitus.pdf"   # <— modèle unique
-    if not path.exists():
-        raise HTTPException(status_code=500, detail="Template not found: quitus.pdf")
-    return path
-
-# --------------------------- Helpers Excel --------------------------
-def ensure_sheet(wb: openpyxl.Workbook, name: str):
-    return wb[name] if name in wb.sheetnames else wb.create_sheet(title=name)
-
-def read_header(ws) -> List[str]:
-    return [(c.value or "").strip() for c in ws[1]] if ws.max_row >= 1 else []
-
-def write_header(ws, header: List[str]) -> None:
-    if ws.max_row == 0:
-        ws.append(header)
-    else:
-        for i, h in enumerate(header, start=1):
-            ws.cell(row=1, column=i).value = h
-
+# --------------------------- Local (SQLite) -------------------------
 def append_row_all_fields(doc_type: str, values: Dict[str, str]) -> None:
     """Log TOUS les champs du PDF source. Feuille selon doc_type."""
+    append_rows_all_fields(doc_type, [values])
+
+def append_rows_all_fields(doc_type: str, rows: List[Dict[str, str]]) -> None:
+    """Écriture groupée (append-only, une transaction pour N lignes)."""
     sheet = "Licence" if doc_type == "licence" else "Master"
-    wb = openpyxl.load_workbook(EXCEL_PATH) if EXCEL_PATH.exists() else openpyxl.Workbook()
-    if "Sheet" in wb.sheetnames:
-        del wb["Sheet"]
-    ws = ensure_sheet(wb, sheet)
-    header = read_header(ws)
-    # ajoute les nouvelles colonnes à la volée
-    for k in values.keys():
-        if k not in header:
-            header.append(k)
-    write_header(ws, header)
-    ws.append([values.get(col, "") for col in header])
-    wb.save(EXCEL_PATH)
+    if settings.PERSIST_GROUP_COMMIT:
+        LOCAL_WRITES.submit(sheet, rows)
+    else:
+        LOCAL_STORE.append_rows(sheet, rows)
 
 # -------- Google Sheets (persistant) --------
 _GS_CLIENT = None
@@ -139,6 +101,8 @@ def _gs_client():
         sa_json = settings.GCP_SA_JSON
         if not sa_json:
             raise RuntimeError("GCP_SA_JSON manquant dans les variables d'environnement")
+        import gspread
+        from google.oauth2.service_account import Credentials
         creds = Credentials.from_service_account_info(json.loads(sa_json), scopes=GS_SCOPES)
         _GS_CLIENT = gspread.authorize(creds)
     return _GS_CLIENT
@@ -148,6 +112,12 @@ def _gs_sheet():
     if _GS_SHEET is not None:
         return _GS_SHEET
 
+    if settings.GSHEET_FAKE:   # backend en mémoire (dev / tests / bench)
+        from .sheets_fake import FakeSpreadsheet
+        _GS_SHEET = FakeSpreadsheet(settings.GSHEET_NAME)
+        return _GS_SHEET
+
+    import gspread
     gc = _gs_client()
     sheet_id = settings.GSHEET_ID
     sheet_name = settings.GSHEET_NAME
@@ -169,28 +139,105 @@ def _gs_sheet():
     _GS_SHEET = sh
     return _GS_SHEET
 
+# quitus déjà générés (clé = contenu source + doc_type + version du modèle)
+RESULT_CACHE = ResultCache(
+    max_items=settings.RESULT_CACHE_ITEMS,
+    disk_dir=DATA_DIR / "results",
+    disk_max_bytes=settings.RESULT_CACHE_DISK_MB * 1024 * 1024,
+)
+_INFLIGHT: Dict[str, "asyncio.Future[tuple[str, bytes]]"] = {}
+
+# admission : quota par client, file équitable interactive / bulk devant le pipeline
+ADMISSION = Admission(
+    slots=settings.ADMISSION_SLOTS or PIPELINE.workers,
+    weights={"interactive": settings.ADMISSION_INTERACTIVE_WEIGHT, "bulk": settings.ADMISSION_BULK_WEIGHT},
+    reserved=settings.ADMISSION_RESERVED,
+    client_concurrency=settings.ADMISSION_CLIENT_CONCURRENCY,
+    rate=settings.ADMISSION_RATE,
+    burst=settings.ADMISSION_BURST,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    max_wait=settings.ADMISSION_MAX_WAIT,
+    retry_after=settings.PIPELINE_RETRY_AFTER,
+    enabled=settings.ADMISSION_ENABLED,
+    interactive_per_client=settings.ADMISSION_INTERACTIVE_PER_CLIENT,
+    trusted_proxies=settings.ADMISSION_TRUSTED_PROXIES,
+)
+
+def client_of(request: Request) -> Optional[str]:
+    """Identité pour les quotas : adresse IP (cf. ADMISSION_TRUSTED_PROXIES), jamais un en-tête libre."""
+    return ADMISSION.client(request.client.host if request.client else None,
+                            request.headers.get("x-forwarded-for"))
+
+def admitted_submit(caller: Caller):
+    """PIPELINE.submit pour un fichier de lot (thread du ZIP) : attend sa place dans la file bulk."""
+    loop = asyncio.get_running_loop()
+
+    def submit(fn, *args):
+        asyncio.run_coroutine_threadsafe(ADMISSION.acquire(caller, patient=True), loop).result()
+        try:
+            fut = PIPELINE.submit(fn, *args)
+        except BaseException:
+            loop.call_soon_threadsafe(ADMISSION.release, caller)
+            raise
+        fut.add_done_callback(lambda _: loop.call_soon_threadsafe(ADMISSION.release, caller))
+        return fut
+    return submit
+
+# envoi groupé + retry ; spool durable pour ne rien perdre au redémarrage
+SHEETS_SINK = SheetsSink(
+    _gs_sheet,
+    DATA_DIR / "sheets_spool.sqlite3",
+    flush_rows=settings.GSHEET_FLUSH_ROWS,
+    flush_interval=settings.GSHEET_FLUSH_INTERVAL,
+)
+
+
+# index des étudiants (GET /students) : le store lui-même en mode local ; en mode
+# gsheets, miroir local des lignes envoyées (Google Sheets n'est jamais relu)
+STUDENT_INDEX = (LocalStore(DATA_DIR / "sheets_index.sqlite3")
+                 if settings.EXCEL_MODE.lower() == "gsheets" else LOCAL_STORE)
 
-def _gs_ensure_worksheet(sh, title: str):
+def _rebuild_sheets_index() -> None:
+    """
+    Miroir reconstruit depuis Google Sheets + lignes encore dans le spool.
+    Lu dans une base temporaire puis substitué d'un bloc, marqueur compris :
+    un échec ne laisse rien à moitié, et le démarrage suivant réessaie.
+    """
+    if not STUDENT_INDEX.lease("rebuilding_from_sheets", 600):
+        return   # un autre worker s'en charge
+    path = DATA_DIR / f"sheets_index.rebuild-{os.getpid()}.sqlite3"
+    staging = LocalStore(path)
     try:
-        return sh.worksheet(title)
-    except gspread.exceptions.WorksheetNotFound:
-        return sh.add_worksheet(title=title, rows=100, cols=26)
-
-def _gs_read_header(ws) -> list[str]:
-    values = ws.row_values(1) if ws.row_count >= 1 else []
-    return [h.strip() for h in values] if values else []
-
-def _gs_write_header(ws, header: list[str]):
-    """Écrit l'entête sur la ligne 1, en étendant au besoin."""
-    if not header:
-        return
-    # (facultatif) s'assurer d'avoir assez de colonnes
-    needed = len(header) - ws.col_count
-    if needed > 0:
-        ws.add_cols(needed)
-
-    # Version la plus simple et sûre : commencer à A1 et laisser gspread étendre
-    ws.update("A1", [header])
+        with SHEETS_SINK.paused():   # aucun envoi : chaque ligne est soit dans la feuille, soit dans le spool
+            sheets = {ws.title: ws for ws in _gs_sheet().worksheets()}
+            for title in ("Licence", "Master"):
+                if title not in sheets:
+                    continue
+                it = iter_gsheet_rows(sheets[title], settings.EXPORT_CHUNK_ROWS)
+                header = next(it, [])
+                batch: List[Dict[str, str]] = []
+                for row in it:
+                    if not any(row):
+                        continue
+                    batch.append({h: v for h, v in zip(header, row) if h})
+                    if len(batch) >= 1000:
+                        staging.append_rows(title, batch); batch = []
+                staging.append_rows(title, batch)
+            pending: Dict[str, List[Dict[str, str]]] = {}
+            for title, values in SHEETS_SINK.iter_pending(SHEETS_SINK.last_id()):
+                pending.setdefault(title, []).append(values)
+            n = STUDENT_INDEX.replace_rows(
+                [(title, staging.iter_rows(title)) for title in ("Licence", "Master")] + list(pending.items()),
+                "rebuilt_from_sheets")
+        log.info("Index étudiants reconstruit depuis Google Sheets (%d lignes)", n)
+    except Exception as e:
+        log.warning("Index étudiants : reconstruction depuis Google Sheets échouée (%s) ; "
+                    "nouvel essai au prochain démarrage", e)
+    finally:
+        STUDENT_INDEX.release("rebuilding_from_sheets")
+        staging.close()
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{path}{suffix}").unlink(missing_ok=True)
 
 def append_row_all_fields_sheets(doc_type: str, values: dict[str, str]) -> None:
     """
@@ -199,30 +246,105 @@ def append_row_all_fields_sheets(doc_type: str, values: dict[str, str]) -> None:
     - Ajoute dynamiquement les colonnes manquantes
     - Aligne la ligne sur l'entête
     """
-    sh = _gs_sheet()
-    ws = _gs_ensure_worksheet(sh, "Licence" if doc_type == "licence" else "Master")
+    append_rows_all_fields_sheets(doc_type, [values])
+
+def _spool_batch(batch: List[tuple[str, List[Dict[str, str]]]]) -> None:
+    SHEETS_SINK.enqueue_batch(batch)
+    if STUDENT_INDEX is not LOCAL_STORE:
+        try:
+            STUDENT_INDEX.append_batch(batch)
+        except Exception as e:   # index secondaire : les lignes sont déjà dans le spool
+            log.warning("Index étudiants non mis à jour (%s)", e)
 
-    header = _gs_read_header(ws)
-    if not header:
-        header = list(values.keys())
-        _gs_write_header(ws, header)
+SPOOL_WRITES = GroupCommitter(_spool_batch, settings.PERSIST_GROUP_MAX_ROWS, name="gsheets_spool")
+
+def append_rows_all_fields_sheets(doc_type: str, rows: list[dict[str, str]]) -> None:
+    """Mise en file (spool local) ; l'envoi groupé se fait en tâche de fond."""
+    sheet = "Licence" if doc_type == "licence" else "Master"
+    if settings.PERSIST_GROUP_COMMIT:
+        SPOOL_WRITES.submit(sheet, rows)
     else:
-        # ajoute les nouvelles colonnes à la fin
-        changed = False
-        for k in values.keys():
-            if k not in header:
-                header.append(k); changed = True
-        if changed:
-            _gs_write_header(ws, header)
+        _spool_batch([(sheet, rows)])
+
+def persist_rows(doc_type: str, rows: List[Dict[str, str]]) -> None:
+    """Persistance selon EXCEL_MODE (local | gsheets)."""
+    gsheets = settings.EXCEL_MODE.lower() == "gsheets"
+    backend, op = ("gsheets_spool", "enqueue") if gsheets else ("local", "append_rows")
+    metrics.PERSIST_CALLS.inc(backend=backend, op=op)
+    try:
+        if gsheets:
+            append_rows_all_fields_sheets(doc_type, rows)
+        else:
+            append_rows_all_fields(doc_type, rows)
+    except Exception:
+        metrics.PERSIST_ERRORS.inc(backend=backend, op=op)
+        raise
+
+def _existing_cins(doc_type: str):
+    return STUDENT_INDEX.cins("Licence" if doc_type == "licence" else "Master")
+
+# import en masse (POST /imports, python -m app.bulk_import) : lignes seules, sans quitus
+IMPORTS = ImportManager(
+    DATA_DIR / "imports",
+    persist_rows,
+    existing_cins=_existing_cins,
+    workers=settings.IMPORT_WORKERS,
+    batch_rows=settings.IMPORT_BATCH_ROWS,
+)
 
-    row = [values.get(col, "") for col in header]
-    ws.append_row(row, value_input_option="USER_ENTERED")
+def parse_doc_type(doc_type: Optional[str], doc_type_q: Optional[str]) -> str:
+    dt = (doc_type or doc_type_q or "licence").lower()
+    if dt not in {"licence", "master"}:
+        raise HTTPException(status_code=400, detail="doc_type must be 'licence' or 'master'")
+    return dt
+
+def parse_template(template: Optional[str], template_q: Optional[str], dt: str) -> Optional[str]:
+    """Modèle demandé (None = défaut), vérifié avant de lire l'upload."""
+    tid = (template or template_q or "").strip() or None
+    plan = get_plan(tid)   # 400 inconnu / 500 modèle par défaut absent ou invalide
+    if dt not in plan.spec.doc_types:
+        raise HTTPException(status_code=400, detail=f"Template '{plan.id}' does not support doc_type '{dt}'")
+    return tid
+
+def parse_output(output: Optional[str], output_q: Optional[str]) -> str:
+    """Sortie demandée : "form" (interactif) ou "flat" (aplati, compressé) ; défaut OUTPUT_MODE."""
+    mode = (output or output_q or settings.OUTPUT_MODE).strip().lower()
+    if mode not in OUTPUT_MODES:
+        raise HTTPException(status_code=400, detail="output must be 'form' or 'flat'")
+    return mode
+
+# ------------------------------ Cycle de vie ------------------------
+@app.on_event("startup")
+def _startup() -> None:
+    if LOCAL_STORE.import_xlsx(EXCEL_PATH):            # reprise d'un ancien classeur
+        log.info("students_data.xlsx importé dans %s", STORE_PATH.name)
+    PIPELINE.warm()   # modèle chargé (et workers process démarrés) avant la 1re requête
+    if settings.EXCEL_MODE.lower() == "gsheets" and SHEETS_SINK.pending():
+        SHEETS_SINK.start()   # lignes restées dans le spool au dernier arrêt
+    if STUDENT_INDEX is not LOCAL_STORE and not STUDENT_INDEX.marked("rebuilt_from_sheets"):
+        threading.Thread(target=_rebuild_sheets_index, name="students-index", daemon=True).start()
+
+@app.on_event("startup")
+async def _start_jobs() -> None:
+    JOBS.start()      # sur la boucle du serveur : purge + balayage TTL
+
+@app.on_event("shutdown")
+async def _stop_jobs() -> None:
+    await JOBS.close()
+
+@app.on_event("shutdown")
+def _shutdown() -> None:
+    IMPORTS.close()   # lot en cours validé ; reprise au prochain POST /imports
+    PIPELINE.shutdown()
+    LOCAL_WRITES.close()
+    SPOOL_WRITES.close()
+    SHEETS_SINK.close()
 
 # ------------------------------- Routes -----------------------------
 # Redirection claire de la racine vers l'UI (évite le //)
 @app.get("/", include_in_schema=False)
 def root_redirect():
-    return RedirectResponse(url="/app", status_code=307)
+    return RedirectResponse(url="/app" if settings.UI_ENABLED else "/docs", status_code=307)
 @app.get("/manifest.json")
 def manifest():
     return JSONResponse({
@@ -232,133 +354,403 @@ def manifest():
         "display": "standalone",
         "icons": []
     })
+async def _generate(dt: str, data: SourcePdf, template: Optional[str] = None,
+                    output: str = "form") -> tuple[str, bytes]:
+    # 2) extraire champs (hors boucle asyncio, cf. PIPELINE)
+    with stage("parse", dt):
+        all_values = await PIPELINE.run_cpu("parse", extract_source, data)
+
+    # 3) Persistance
+    with stage("persist", dt):
+        await PIPELINE.run_io("persist", persist_rows, dt, [all_values])
+
+    # 4) remplir modèle + 5) nommage quitus_<fullname>.pdf
+    with stage("fill", dt):
+        return await PIPELINE.run_cpu("fill", render_quitus, dt, all_values, template, output)
+
+async def _process_source(dt: str, src: SourcePdf, idempotency_key: Optional[str],
+                          template: Optional[str] = None, output: str = "form") -> tuple[str, bytes, str]:
+    # même PDF + même doc_type + même modèle + même sortie => même quitus, déjà persisté
+    with stage("cache_lookup", dt):
+        version = template_version(template)
+        key = content_key(src.sha256, dt, version if output == "form" else f"{version}|{output}")
+        if idempotency_key and RESULT_CACHE.idempotency_conflict(idempotency_key, key):
+            raise HTTPException(status_code=422, detail="Idempotency-Key already used with a different request")
+        cached = RESULT_CACHE.get(key)
+
+    if cached is not None:
+        filename, pdf_out = cached
+        cache_status = "HIT"
+    elif key in _INFLIGHT:
+        # doublon simultané (double clic) : on attend le premier calcul
+        filename, pdf_out = await asyncio.shield(_INFLIGHT[key])
+        cache_status = "HIT"
+    else:
+        fut = asyncio.get_running_loop().create_future()
+        _INFLIGHT[key] = fut
+        try:
+            async with ADMISSION.slot():   # appelant posé par la route (contextvar), hérité par les jobs
+                filename, pdf_out = await _generate(dt, src, template, output)
+            RESULT_CACHE.put(key, (filename, pdf_out))
+            fut.set_result((filename, pdf_out))
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()   # marquée comme lue s'il n'y a aucun doublon en attente
+            raise
+        finally:
+            _INFLIGHT.pop(key, None)
+        cache_status = "MISS"
+    if idempotency_key:   # liée au contenu seulement une fois le quitus obtenu
+        RESULT_CACHE.bind_idempotency(idempotency_key, key)
+    return filename, pdf_out, cache_status
+
+# jobs asynchrones (POST /jobs) : même chemin que /process, résultat sur disque avec TTL
+JOBS = JobManager(
+    _process_source,
+    DATA_DIR / "jobs",
+    workers=settings.JOBS_WORKERS,
+    max_pending=settings.JOBS_MAX_PENDING,
+    ttl=settings.JOB_TTL,
+    retry_after=settings.PIPELINE_RETRY_AFTER,
+)
+
 @app.post("/process")
 async def process_quitus(
+    request: Request,
     source_pdf: UploadFile = File(...),
     doc_type: Optional[str] = Form(None),     # accept form
     doc_type_q: Optional[str] = Query(None),  # ou query
+    template: Optional[str] = Form(None),     # id du modèle (cf. GET /templates)
+    template_q: Optional[str] = Query(None),
+    output: Optional[str] = Form(None),       # form | flat (défaut OUTPUT_MODE)
+    output_q: Optional[str] = Query(None),
     x_api_key: Optional[str] = Header(default=None),
+    idempotency_key: Optional[str] = Header(default=None),
 ):
     require_api_key(x_api_key)
-    dt = (doc_type or doc_type_q or "licence").lower()
-    if dt not in {"licence", "master"}:
-        raise HTTPException(status_code=400, detail="doc_type must be 'licence' or 'master'")
-
-    # 1) lire les octets UNE fois + valider (%PDF)
-    data = await source_pdf.read()
-    if not data or len(data) < 5 or not data.startswith(b"%PDF"):
-        raise HTTPException(status_code=400, detail="Invalid or empty PDF (missing %PDF header)")
+    ADMISSION.enter(client_of(request), "interactive")   # bulk au-delà de sa part (cf. admission.py)
+    dt = parse_doc_type(doc_type, doc_type_q)
+    tid = parse_template(template, template_q, dt)
+    mode = parse_output(output, output_q)
+
+    # 1) relecture bornée du corps reçu (413 / 400 si non-PDF), gros fichier gardé sur disque
+    with stage("read", dt):
+        src = await spool_upload(source_pdf, settings.MAX_UPLOAD_MB * 1024 * 1024,
+                                 settings.UPLOAD_SPOOL_KB * 1024, UPLOAD_DIR, need_path=NEED_PATH)
+    metrics.UPLOAD_BYTES.observe(src.size, route="/process")
     try:
-        src_reader = PdfReader(io.BytesIO(data), strict=False)
-    except (PdfReadError, PdfStreamError) as e:
-        raise HTTPException(status_code=400, detail=f"Unreadable PDF: {e}")
-
-    # 2) extraire champs
-    all_values = extract_all_values(get_fields(src_reader))
-    nom = all_values.get("student_nom", "")
-    prenom = all_values.get("student_prenom", "")
-    cin = all_values.get("cin", "")
-    filiere_lic = all_values.get("filiere_lic", "")
-    filiere_master = all_values.get("filiere_master", "")
-    full_name = f"{nom} {prenom}".strip()
-    filiere_finale = filiere_lic if dt == "licence" else (filiere_master or filiere_lic)
-
-   
-    # 3) Persistance
-    mode = settings.EXCEL_MODE.lower()
-    if mode == "gsheets":
-        append_row_all_fields_sheets(dt, all_values)
-    else:
-        append_row_all_fields(dt, all_values)
-   
-    # 4) remplir modèle
-    with open(get_template_path(), "rb") as fh:
-        q_reader = PdfReader(io.BytesIO(fh.read()), strict=False)
-    mapping = {"student_nom": full_name, "cin": cin, "filiere_lic": filiere_finale}
-    q_fields = get_fields(q_reader)
-    if q_fields:
-        pdf_out = fill_acroform(q_reader, mapping)
-    else:
-        lines = [(full_name, 120, 690), (cin, 160, 665), (filiere_finale, 160, 640)]
-        pdf_out = overlay_text(q_reader, lines)
+        filename, pdf_out, cache_status = await _process_source(dt, src, idempotency_key, tid, mode)
+    finally:
+        src.cleanup()
 
-    # 5) nommage quitus_<fullname>.pdf
-    slug = safe_filename(full_name, fallback=dt)
-    filename = f"quitus_{slug}.pdf"
-    return StreamingResponse(
-        io.BytesIO(pdf_out),
+    # octets du cache servis tels quels : un seul envoi avec Content-Length
+    return BytesResponse(
+        pdf_out,
         media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Cache": cache_status,
+        }
     )
 
+@app.post("/process/batch")
+async def process_batch(
+    request: Request,
+    source_pdfs: List[UploadFile] = File(...),   # PDFs et/ou archives .zip de PDFs
+    doc_type: Optional[str] = Form(None),
+    doc_type_q: Optional[str] = Query(None),
+    template: Optional[str] = Form(None),
+    template_q: Optional[str] = Query(None),
+    output: Optional[str] = Form(None),
+    output_q: Optional[str] = Query(None),
+    x_api_key: Optional[str] = Header(default=None),
+):
+    """
+    Traite un lot de PDF sources en parallèle et renvoie un ZIP en streaming :
+    un quitus_<slug>.pdf par fichier (dans l'ordre de fin de traitement)
+    + manifest.json (statut/erreur par fichier). Les lignes extraites sont
+    persistées en une seule écriture groupée à la fin du lot.
+    """
+    require_api_key(x_api_key)
+    caller = ADMISSION.enter(client_of(request), "bulk")
+    dt = parse_doc_type(doc_type, doc_type_q)
+    tid = parse_template(template, template_q, dt)
+    mode = parse_output(output, output_q)
+
+    # uploads spoolés comme /process ; archives vérifiées (nombre, tailles) sans rien décompresser
+    sources = BatchSources(settings.MAX_UPLOAD_MB * 1024 * 1024, settings.BATCH_MAX_FILES)
+    try:
+        for up in source_pdfs:
+            src = await spool_upload(up, settings.BATCH_MAX_UPLOAD_MB * 1024 * 1024,
+                                     settings.UPLOAD_SPOOL_KB * 1024, UPLOAD_DIR, check_pdf=False,
+                                     need_path=NEED_PATH)
+            metrics.UPLOAD_BYTES.observe(src.size, route="/process/batch")
+            sources.add(up.filename or "source.pdf", src)
+        if not sources:
+            raise HTTPException(status_code=400, detail="No source PDF in batch")
+    except BaseException:
+        sources.close()
+        raise
+
+    def _persist(rows: List[Dict[str, str]]) -> None:
+        persist_rows(dt, rows)
+
+    # chaque fichier attend sa place dans la file bulk : un gros lot ne bloque pas /process
+    submit, window = (admitted_submit(caller), ADMISSION.slots) if ADMISSION.enabled else (None, PIPELINE.workers * 2)
+    return StreamingResponse(
+        stream_batch_zip(dt, sources, _persist, tid, mode, submit, window),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="quitus_{dt}_batch.zip"'}
+    )
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    request: Request,
+    source_pdf: UploadFile = File(...),
+    doc_type: Optional[str] = Form(None),
+    doc_type_q: Optional[str] = Query(None),
+    template: Optional[str] = Form(None),
+    template_q: Optional[str] = Query(None),
+    output: Optional[str] = Form(None),
+    output_q: Optional[str] = Query(None),
+    x_api_key: Optional[str] = Header(default=None),
+    idempotency_key: Optional[str] = Header(default=None),
+):
+    """Comme /process, mais rend la main tout de suite : 202 + id du job."""
+    require_api_key(x_api_key)
+    ADMISSION.enter(client_of(request), "bulk")   # le job hérite de l'appelant
+    dt = parse_doc_type(doc_type, doc_type_q)
+    tid = parse_template(template, template_q, dt)
+    mode = parse_output(output, output_q)
+    with stage("read", dt):
+        src = await spool_upload(source_pdf, settings.MAX_UPLOAD_MB * 1024 * 1024,
+                                 settings.UPLOAD_SPOOL_KB * 1024, UPLOAD_DIR, need_path=NEED_PATH)
+    metrics.UPLOAD_BYTES.observe(src.size, route="/jobs")
+    job = JOBS.submit(dt, src, idempotency_key, tid, mode)
+    return JSONResponse(job.to_dict(), status_code=202, headers={"Location": f"/jobs/{job.id}"})
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, x_api_key: Optional[str] = Header(default=None)):
+    require_api_key(x_api_key)
+    return JOBS.get(job_id).to_dict()
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str, x_api_key: Optional[str] = Header(default=None),
+                     if_none_match: Optional[str] = Header(default=None)):
+    require_api_key(x_api_key)
+    job = JOBS.get(job_id)
+    if job.status == "error":
+        raise HTTPException(status_code=job.error_status or 500, detail=job.error)
+    if job.status != "done" or job.path is None:
+        raise HTTPException(status_code=409, detail=f"Job not finished (status: {job.status})",
+                            headers={"Retry-After": "1"})
+    return file_response(job.path, if_none_match, media_type="application/pdf", filename=job.filename,
+                         headers={"X-Cache": job.cache or "MISS"})
+
+@app.post("/imports", status_code=202)
+async def create_import(
+    archive: Optional[UploadFile] = File(None),   # .zip de PDF déjà soumis...
+    path: Optional[str] = Form(None),             # ...ou dossier serveur, relatif à IMPORT_ROOT
+    doc_type: Optional[str] = Form(None),
+    doc_type_q: Optional[str] = Query(None),
+    x_api_key: Optional[str] = Header(default=None),
+):
+    """
+    Import en masse : journalise les champs de chaque PDF (sans quitus),
+    dédoublonné par cin. Relancer le même import (même dossier ou même
+    archive, même doc_type) reprend là où il s'était arrêté.
+    """
+    require_api_key(x_api_key)
+    dt = parse_doc_type(doc_type, doc_type_q)
+    if (archive is None) == (not path):
+        raise HTTPException(status_code=400, detail="Provide either 'archive' or 'path'")
+    if IMPORTS.busy():
+        raise HTTPException(status_code=409, detail="Another import is running")
+
+    if path:
+        if not settings.IMPORT_ROOT:
+            raise HTTPException(status_code=400, detail="Server-side imports are disabled (IMPORT_ROOT)")
+        base = Path(settings.IMPORT_ROOT).resolve()
+        root = (base / path).resolve()
+        if root != base and base not in root.parents:
+            raise HTTPException(status_code=400, detail="Path outside IMPORT_ROOT")
+        if not root.exists():
+            raise HTTPException(status_code=400, detail=f"Not found: {path}")
+        import_id, source, uploaded = IMPORTS.import_id(str(root), dt), path, False
+    else:
+        tmp = IMPORTS.directory / f"upload-{secrets.token_hex(8)}.zip"
+        digest = await save_upload(archive, tmp, settings.IMPORT_MAX_UPLOAD_MB * 1024 * 1024)
+        if not zipfile.is_zipfile(tmp):
+            tmp.unlink(missing_ok=True)
+            raise HTTPException(status_code=400, detail="Archive must be a .zip of PDF files")
+        import_id = IMPORTS.import_id(digest, dt)   # même archive -> même import (reprise)
+        root = IMPORTS.directory / f"{import_id}.zip"
+        os.replace(tmp, root)
+        source, uploaded = archive.filename or "archive.zip", True
+
+    IMPORTS.start(import_id, root, dt, source, remove_when_done=uploaded)
+    return JSONResponse(IMPORTS.status(import_id), status_code=202, headers={"Location": f"/imports/{import_id}"})
+
+@app.get("/imports/{import_id}")
+def import_status(import_id: str, x_api_key: Optional[str] = Header(default=None)):
+    """Avancement : totaux du checkpoint (tous runs) + run en cours, premières erreurs."""
+    require_api_key(x_api_key)
+    return IMPORTS.status(import_id)
+
+@app.get("/students")
+def find_students(
+    cin: Optional[str] = Query(None),
+    nom: Optional[str] = Query(None),      # préfixe, sans accents ni casse
+    prenom: Optional[str] = Query(None),
+    sheet: Optional[str] = Query(None),    # Licence | Master (défaut : les deux)
+    limit: int = Query(50, ge=1, le=500),
+    after: int = Query(0, ge=0),           # curseur : `next` de la page précédente
+    x_api_key: Optional[str] = Header(default=None),
+):
+    """Recherche dans les lignes journalisées, via l'index local (jamais un parcours complet)."""
+    require_api_key(x_api_key)
+    if sheet is not None:
+        sheet = sheet.capitalize()
+        if sheet not in ("Licence", "Master"):
+            raise HTTPException(status_code=400, detail="sheet must be 'Licence' or 'Master'")
+    with stage("lookup", (sheet or "all").lower()):
+        items, nxt = STUDENT_INDEX.find(sheet=sheet, cin=cin, nom=nom, prenom=prenom, after=after, limit=limit)
+    return {"items": items, "next": nxt}
+
+@app.get("/templates")
+def list_templates(x_api_key: Optional[str] = Header(default=None)):
+    """Modèles disponibles (id à passer dans `template`) et erreurs de validation."""
+    require_api_key(x_api_key)
+    return TEMPLATES.describe()
+
 @app.get("/health")
 def health():
     return {
         "ok": True,
         "excel_exists": EXCEL_PATH.exists(),
         "excel_path": str(EXCEL_PATH),
+        "store_path": str(STORE_PATH),
         "template_exists": (TEMPLATES_DIR / "quitus.pdf").exists(),
+        "templates": [{"id": t["id"], "ok": t["ok"]} for t in TEMPLATES.describe()],
+        "result_cache": RESULT_CACHE.snapshot(),
     }
 
-@app.get("/download/excel")
-def download_excel(
-    sheet: Optional[str] = Query(None, description="Licence | Master (vide = les deux)"),
-    x_api_key: Optional[str] = Header(default=None),
-):
-    require_api_key(x_api_key)
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Exposition Prometheus (texte 0.0.4), sans clé API : à protéger côté réseau."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    metrics.PIPELINE_INFLIGHT.set(PIPELINE.inflight)
+    for status, n in JOBS.counts().items():
+        metrics.JOBS.set(n, status=status)
+    counts = ADMISSION.counts()
+    for priority in counts["running"]:
+        metrics.ADMISSION_RUNNING.set(counts["running"][priority], priority=priority)
+        metrics.ADMISSION_QUEUED.set(counts["queued"][priority], priority=priority)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _export(sheet: Optional[str], fmt: str):
+    """Export -> fichier déjà prêt (Path) ou flux d'octets (écrit en cache au passage)."""
+    fmt = fmt.lower()
+    if fmt not in WRITERS:
+        raise HTTPException(status_code=400, detail="format must be 'xlsx', 'csv' or 'ndjson'")
+    titles = [sheet] if sheet else ["Licence", "Master"]   # essaie dans cet ordre
+    if fmt == "csv" and len(titles) > 1:
+        raise HTTPException(status_code=400, detail="CSV export needs ?sheet=Licence|Master")
 
     mode = settings.EXCEL_MODE.lower()
+    scope = (sheet or "all").lower()   # label doc_type des métriques d'export
     if mode == "gsheets":
-        # Export Google Sheets -> XLSX en mémoire
-        sh = _gs_sheet()
+        # Export Google Sheets en streaming (lecture par plages)
+        with stage("export_flush", scope):
+            try:
+                SHEETS_SINK.flush()   # inclure les lignes encore dans le spool
+            except Exception as e:
+                log.warning("Export sans les lignes en attente (%s)", e)
+        with stage("export_revision", scope):
+            sh = _gs_sheet()
+            try:
+                revision = sh.get_lastUpdateTime()
+            except Exception:
+                revision = None       # pas de cache sans révision fiable
 
-        # Prépare le classeur de sortie
-        wb = openpyxl.Workbook()
-        # supprime la feuille par défaut si présente
-        if wb.active and wb.active.max_row == 1 and wb.active.max_column == 1 and not wb.active["A1"].value:
-            wb.remove(wb.active)
+        from gspread.exceptions import WorksheetNotFound
 
-        def add_ws(title: str):
+        def _open(title: str):
             try:
                 ws_g = sh.worksheet(title)
-            except gspread.exceptions.WorksheetNotFound:
-                return False
-            values = ws_g.get_all_values()  # liste de listes
-            ws_x = wb.create_sheet(title=title)
-            for row in values:
-                ws_x.append(row)
-            # fige l'entête si elle existe
-            if values:
-                ws_x.freeze_panes = "A2"
-            return True
-
-        added = False
-        if sheet:
-            added = add_ws(sheet)
-        else:
-            # essaie dans cet ordre
-            for t in ("Licence", "Master"):
-                added = add_ws(t) or added
-
-        if not added:
-            raise HTTPException(status_code=404, detail="No data in Google Sheets yet")
-
-        buf = io.BytesIO()
-        wb.save(buf); buf.seek(0)
-        return StreamingResponse(
-            buf,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": 'attachment; filename="students_data.xlsx"'}
-        )
-
-    # ---- mode local (fichier sur disque) ----
-    if not EXCEL_PATH.exists():
-        raise HTTPException(status_code=404, detail="No Excel yet")
-    return FileResponse(
-        EXCEL_PATH,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename="students_data.xlsx",
+            except WorksheetNotFound:
+                return None
+            return iter_gsheet_rows(ws_g, settings.EXPORT_CHUNK_ROWS)
+        missing = "No data in Google Sheets yet"
+    else:
+        # ---- mode local : classeur matérialisé depuis le store (mis en cache) ----
+        if fmt == "xlsx":
+            with stage("export_materialize", scope):
+                path = LOCAL_STORE.export_xlsx(EXCEL_PATH)
+            if path is None:
+                raise HTTPException(status_code=404, detail="No Excel yet")
+            return path
+        revision = str(LOCAL_STORE.version())
+        _open = LOCAL_STORE.iter_table
+        missing = "No Excel yet"
+
+    cached = export_cache_path(EXPORT_DIR, fmt, sheet, revision and f"{mode}-{revision}")
+    if cached is not None and cached.exists():
+        return cached
+
+    sheets = open_sheets(titles, _open)
+    if not sheets:
+        raise HTTPException(status_code=404, detail=missing)
+    return timed_iter(tee_to_cache(WRITERS[fmt](sheets), cached), "export_stream", scope)
+
+@app.get("/download/excel")
+def download_excel(
+    sheet: Optional[str] = Query(None, description="Licence | Master (vide = les deux)"),
+    fmt: str = Query("xlsx", alias="format", description="xlsx | csv | ndjson"),
+    x_api_key: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    require_api_key(x_api_key)
+    out = _export(sheet, fmt)
+    fmt = fmt.lower()
+    filename = f"students_data.{fmt}"
+    if isinstance(out, Path):
+        return file_response(out, if_none_match, media_type=MEDIA_TYPES[fmt], filename=filename)
+    return StreamingResponse(
+        out,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
-demo = build_demo(default_api_url="/process")  # même service
-app = gr.mount_gradio_app(app, demo, path="/app") # l'UI sert "/" ; l'API reste dispo (ex: /process, /health, /docs)
+# --- monter l'UI Gradio (UI_ENABLED=0 : réplique API seule, gradio jamais importé) ---
+if settings.UI_ENABLED:
+    import gradio as gr
+    from .build_ui import build_demo  # adapte l'import si besoin (chemin relatif au repo)
+    from .ui_client import UiFiles
+
+    UI_FILES = UiFiles(DATA_DIR / "ui", ttl=settings.JOB_TTL)
+
+    async def _ui_generate(data: bytes, doc_type: str) -> str:
+        """UI in-process : job local (pas d'appel HTTP en boucle) -> chemin du quitus."""
+        dt = parse_doc_type(doc_type, None)
+        job = JOBS.submit(dt, source_from_bytes(data, settings.MAX_UPLOAD_MB * 1024 * 1024),
+                          output=parse_output(None, None))
+        await JOBS.wait(job, timeout=90)
+        if job.status != "done":
+            raise HTTPException(status_code=job.error_status or 500, detail=job.error)
+        return str(job.path)   # supprimé après JOB_TTL
+
+    def _ui_export() -> str:
+        """UI in-process : classeur sans requête HTTP vers soi-même -> chemin du fichier."""
+        out = _export(None, "xlsx")
+        if isinstance(out, Path):
+            return str(out)   # Gradio en fait sa propre copie
+        path = UI_FILES.path_for("students_data.xlsx")
+        with open(path, "wb") as fh:
+            for chunk in out:
+                fh.write(chunk)
+        return str(path)
+
+    demo = build_demo(default_api_url="/process", generate=_ui_generate, export=_ui_export)  # même service
+    app = gr.mount_gradio_app(app, demo, path="/app") # l'UI sert "/" ; l'API reste dispo (ex: /process, /health, /docs)
@@ -0,0 +1,234 @@
+# API/app/metrics.py
+"""
+Métriques Prometheus (format texte 0.0.4) + temps par étape, sans dépendance.
+
+- Counter / Gauge / Histogram avec labels, thread-safe
+- stage("parse", doc_type="licence") : span chronométré -> histogramme
+  quitus_stage_seconds et, si TIMING_LOGS, détail dans le log de la requête
+- MetricsMiddleware (ASGI) : latence par route jusqu'au dernier octet envoyé,
+  requêtes en cours, log JSON par requête si TIMING_LOGS=1
+- METRICS_ENABLED=0 : middleware et spans deviennent des no-op
+"""
+import bisect
+import contextvars
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .settings import settings
+
+ENABLED = settings.METRICS_ENABLED
+
+log = logging.getLogger("quitus-api")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (10e3, 50e3, 100e3, 250e3, 500e3, 1e6, 2.5e6, 5e6, 10e6, 25e6, 50e6)
+
+LabelKey = Tuple[str, ...]
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: LabelKey, le: Optional[str] = None) -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **k):
+        super().__init__(*a, **k)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        out = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        out += [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+        return out
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelKey, List[float]] = {}   # [compte par bucket..., +Inf, somme]
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def render(self) -> List[str]:
+        out = super().render()
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for key, row in items:
+            acc = 0.0
+            for b, n in zip(self.buckets + (math.inf,), row[:-1]):
+                acc += n
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, _fmt(b))} {_fmt(acc)}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {row[-1]!r}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {_fmt(acc)}")
+        return out
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    return "\n".join(line for m in REGISTRY for line in m.render()) + "\n"
+
+
+# ------------------------------ métriques ------------------------------
+HTTP_LATENCY = Histogram("quitus_http_request_seconds", "HTTP request latency", ("method", "route", "status"))
+HTTP_INFLIGHT = Gauge("quitus_http_inflight_requests", "HTTP requests in progress")
+STAGE_LATENCY = Histogram("quitus_stage_seconds", "Pipeline stage latency", ("stage", "doc_type"))
+UPLOAD_BYTES = Histogram("quitus_upload_bytes", "Uploaded source PDF size", ("route",), buckets=SIZE_BUCKETS)
+PERSIST_CALLS = Counter("quitus_persist_calls_total", "Persistence backend calls", ("backend", "op"))
+PERSIST_ERRORS = Counter("quitus_persist_errors_total", "Persistence backend errors", ("backend", "op"))
+PIPELINE_INFLIGHT = Gauge("quitus_pipeline_inflight_tasks", "Pipeline tasks queued or running")
+JOBS = Gauge("quitus_jobs", "Jobs retained, by status", ("status",))
+GROUP_COMMIT_ROWS = Histogram("quitus_group_commit_rows", "Rows per grouped write transaction", ("writer",),
+                              buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+IMPORT_FILES = Counter("quitus_import_files_total", "Bulk-imported source files, by outcome", ("status",))
+ADMISSION_WAIT = Histogram("quitus_admission_wait_seconds", "Queue time before a pipeline slot", ("priority",))
+ADMISSION_REJECTED = Counter("quitus_admission_rejected_total", "Requests refused by admission control",
+                             ("priority", "reason"))
+ADMISSION_DEMOTED = Counter("quitus_admission_demoted_total", "Interactive requests moved to bulk (client over its share)")
+ADMISSION_RUNNING = Gauge("quitus_admission_running", "Admitted computations in progress", ("priority",))
+ADMISSION_QUEUED = Gauge("quitus_admission_queued", "Computations waiting for a slot", ("priority",))
+
+# détail des étapes de la requête courante (pour TIMING_LOGS)
+_request_stages: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "quitus_request_stages", default=None
+)
+
+
+@contextmanager
+def stage(name: str, doc_type: str = "") -> Iterator[None]:
+    """Chronomètre une étape (histogramme + log de requête)."""
+    if not ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_LATENCY.observe(dt, stage=name, doc_type=doc_type)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + dt
+
+
+def begin_request() -> Optional[contextvars.Token]:
+    return _request_stages.set({}) if ENABLED and settings.TIMING_LOGS else None
+
+
+def end_request(token: Optional[contextvars.Token]) -> Dict[str, float]:
+    if token is None:
+        return {}
+    stages = _request_stages.get() or {}
+    _request_stages.reset(token)
+    return stages
+
+
+def timed_iter(chunks: Iterator[bytes], name: str, doc_type: str = "") -> Iterator[bytes]:
+    """Comme stage(), pour un corps de réponse produit en streaming."""
+    with stage(name, doc_type):
+        yield from chunks
+
+
+# ------------------------------ middleware ------------------------------
+class MetricsMiddleware:
+    """Middleware ASGI pur : mesure aussi les corps envoyés en streaming."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = begin_request()
+        HTTP_INFLIGHT.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed = time.perf_counter() - t0
+            HTTP_INFLIGHT.dec()
+            # gabarit de route (pas le chemin brut : cardinalité bornée)
+            route = getattr(scope.get("route"), "path", "other")
+            HTTP_LATENCY.observe(elapsed, method=scope["method"], route=route, status=str(status))
+            stages = end_request(token)
+            if token is not None:
+                log.info("timing %s", json.dumps({
+                    "method": scope["method"], "route": route, "status": status,
+                    "total_ms": round(elapsed * 1e3, 2),
+                    "stages_ms": {k: round(v * 1e3, 2) for k, v in stages.items()},
+                }))
@@ -0,0 +1,99 @@
+# API/app/pdf_pack.py
+"""
+Écriture compacte d'une copie préparée (sortie "flat").
+
+pypdf n'écrit ni flux d'objets (/ObjStm) ni table xref compressée. Pour une
+copie préparée, un seul objet change d'une requête à l'autre : tout le reste
+est sérialisé une fois (objets non-flux regroupés dans un /ObjStm compressé),
+et chaque requête n'ajoute que ce flux puis une xref en flux (PDF 1.5).
+
+- /ID[1] = empreinte du flux variable : même contenu => mêmes octets
+- PDF chiffré : non géré (PdfWriter.write reste utilisé, cf. packable)
+"""
+import hashlib
+import io
+import struct
+import zlib
+from typing import List, Optional, Tuple
+
+from pypdf import PdfWriter
+from pypdf.generic import IndirectObject, StreamObject
+
+_W = (1, 4, 2)   # largeurs des champs de la xref : type, offset / n° du flux, génération / index
+
+
+def packable(writer: PdfWriter) -> bool:
+    return not getattr(writer, "_encryption", None)
+
+
+def _serialize(obj) -> bytes:
+    buf = io.BytesIO()
+    obj.write_to_stream(buf)
+    return buf.getvalue()
+
+
+def _entry(kind: int, a: int, b: int) -> bytes:
+    return struct.pack(">BIH", kind, a, b)
+
+
+class PackedPdf:
+    """Copie figée de `writer` ; seul l'objet `dynamic` (un flux) est réécrit à chaque appel."""
+
+    def __init__(self, writer: PdfWriter, dynamic: IndirectObject):
+        self.writer = writer
+        self.dynamic = dynamic
+        objects = writer._objects
+        objstm_id = len(objects) + 1
+        self.xref_id = objstm_id + 1
+
+        prefix = io.BytesIO()
+        version = max(str(writer.pdf_header).strip()[5:] or "1.5", "1.5")
+        prefix.write(b"%%PDF-%s\n%%\xe2\xe3\xcf\xd3\n" % version.encode())
+
+        entries: List[bytes] = [_entry(0, 0, 65535)]
+        members: List[Tuple[int, bytes]] = []
+        for idnum, obj in enumerate(objects, start=1):
+            if obj is None:
+                entries.append(_entry(0, 0, 0))
+            elif idnum == dynamic.idnum:
+                entries.append(b"")   # offset connu à la fin du préfixe
+            elif isinstance(obj, StreamObject):
+                entries.append(_entry(1, prefix.tell(), 0))
+                prefix.write(b"%d 0 obj\n%s\nendobj\n" % (idnum, _serialize(obj)))
+            else:
+                entries.append(_entry(2, objstm_id, len(members)))
+                members.append((idnum, _serialize(obj)))
+
+        # /ObjStm : "n° offset ..." puis les objets, le tout en Flate
+        head, body = [], io.BytesIO()
+        for idnum, data in members:
+            head.append(b"%d %d" % (idnum, body.tell()))
+            body.write(data + b"\n")
+        head_bytes = b" ".join(head) + b"\n"
+        packed = zlib.compress(head_bytes + body.getvalue(), 9)
+        entries.append(_entry(1, prefix.tell(), 0))
+        prefix.write(b"%d 0 obj\n<< /Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d >>\nstream\n"
+                     % (objstm_id, len(members), len(head_bytes), len(packed)))
+        prefix.write(packed + b"\nendstream\nendobj\n")
+
+        self._prefix = prefix.getvalue()
+        entries[dynamic.idnum] = _entry(1, len(self._prefix), 0)
+        self._entries = entries
+
+        root = writer.root_object.indirect_reference
+        info = writer._info.indirect_reference if writer._info is not None else None
+        self._trailer = b"/Root %d 0 R%s" % (root.idnum, b" /Info %d 0 R" % info.idnum if info else b"")
+        self._id0 = (_serialize(writer._ID[0]) if writer._ID
+                     else b"<%s>" % hashlib.md5(self._prefix).hexdigest().encode())
+
+    def write(self, stream: Optional[StreamObject] = None) -> bytes:
+        """Octets du document avec l'état courant du flux variable."""
+        dyn = _serialize(stream if stream is not None else self.dynamic.get_object())
+        body = b"%d 0 obj\n%s\nendobj\n" % (self.dynamic.idnum, dyn)
+        xref_at = len(self._prefix) + len(body)
+        xref = zlib.compress(b"".join(self._entries) + _entry(1, xref_at, 0))
+        id1 = hashlib.md5(dyn).hexdigest().encode()
+        tail = (b"%d 0 obj\n<< /Type /XRef /Size %d /W [%d %d %d] %s /ID [%s <%s>] "
+                b"/Filter /FlateDecode /Length %d >>\nstream\n"
+                % (self.xref_id, self.xref_id + 1, *_W, self._trailer, self._id0, id1, len(xref)))
+        return b"".join((self._prefix, body, tail, xref, b"\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n" % xref_at))
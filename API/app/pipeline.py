@@ -0,0 +1,165 @@
+# API/app/pipeline.py
+"""
+Pipeline PDF (extraction des champs source + remplissage du quitus).
+
+Module sans état HTTP ni UI : importable tel quel par les workers
+d'un ProcessPoolExecutor (cf. executor.py).
+"""
+import io
+import mmap
+import re
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from fastapi import HTTPException
+from pypdf import PdfReader, PdfWriter
+from pypdf.errors import PdfReadError, PdfStreamError
+from pypdf.generic import BooleanObject, NameObject
+
+from .fields import FieldExtractionError, extract_values
+from .template_cache import UnsupportedText
+from .template_registry import TemplateLookupError, TemplatePlan, TemplateRegistry, TemplateSpecError
+from .uploads import SourcePdf
+
+BASE_DIR = Path(__file__).parent
+TEMPLATES_DIR = BASE_DIR / "templates"          # <id>.pdf (+ <id>.json), cf. template_registry.py
+DEFAULT_TEMPLATE = "quitus"
+OUTPUT_MODES = ("form", "flat")   # formulaire interactif | champs aplatis, sans AcroForm (cf. Template.flatten)
+
+# modèles parsés une fois (rechargés si le fichier change), specs compilées au scan
+TEMPLATES = TemplateRegistry(TEMPLATES_DIR, default=DEFAULT_TEMPLATE)
+
+# --- helper nom de fichier propre (pour quitus_fullname.pdf) ---
+def safe_filename(full_name: str, fallback: str = "document") -> str:
+    s = unicodedata.normalize("NFKD", (full_name or "")).encode("ascii", "ignore").decode("ascii")
+    s = re.sub(r"[^A-Za-z0-9]+", "_", s).strip("_")
+    return s or fallback
+
+# --------------------------- Helpers PDF ----------------------------
+def get_fields(reader: PdfReader) -> Dict[str, Dict[str, Any]]:
+    try:
+        return reader.get_fields() or {}
+    except Exception:
+        return {}
+
+def as_text(v: Any) -> str:
+    if isinstance(v, dict):
+        v = v.get("/V", "")
+    return "" if v is None else str(v).strip()
+
+def extract_all_values(fields: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    return {name: as_text(obj) for name, obj in fields.items()}
+
+def fill_acroform(base_reader: PdfReader, mapping: Dict[str, str]) -> bytes:
+    writer = PdfWriter()
+    writer.clone_document_from_reader(base_reader)
+    if "/AcroForm" in writer._root_object:
+        writer._root_object["/AcroForm"][NameObject("/NeedAppearances")] = BooleanObject(True)
+    writer.update_page_form_field_values(writer.pages[0], mapping)
+    buf = io.BytesIO(); writer.write(buf)
+    return buf.getvalue()
+
+def overlay_text(base_reader: PdfReader, lines: List[tuple[str, float, float]]) -> bytes:
+    """Ancien chemin reportlab + merge_page (référence des benchs, cf. Template.overlay)."""
+    from reportlab.lib.pagesizes import A4   # modèles sans AcroForm uniquement
+    from reportlab.pdfgen import canvas
+    writer = PdfWriter()
+    for p in base_reader.pages:
+        writer.add_page(p)
+    packet = io.BytesIO()
+    c = canvas.Canvas(packet, pagesize=A4); c.setFont("Helvetica", 12)
+    for txt, x, y in lines: c.drawString(x, y, txt)
+    c.save(); packet.seek(0)
+    overlay_pdf = PdfReader(packet)
+    writer.pages[0].merge_page(overlay_pdf.pages[0])
+    out = io.BytesIO(); writer.write(out)
+    return out.getvalue()
+
+def _not_found(template_id: Optional[str]) -> HTTPException:
+    tid = template_id or DEFAULT_TEMPLATE
+    if tid == DEFAULT_TEMPLATE:
+        return HTTPException(status_code=500, detail=f"Template not found: {tid}.pdf")
+    return HTTPException(status_code=400, detail=f"Unknown template '{tid}'")
+
+def get_template_path(template_id: Optional[str] = None) -> Path:
+    path = TEMPLATES_DIR / f"{template_id or DEFAULT_TEMPLATE}.pdf"
+    if not path.exists():
+        raise _not_found(template_id)
+    return path
+
+def get_plan(template_id: Optional[str] = None) -> TemplatePlan:
+    """Modèle préparé + spec compilée (cf. TEMPLATES)."""
+    try:
+        return TEMPLATES.get(template_id)
+    except (TemplateLookupError, FileNotFoundError):
+        raise _not_found(template_id)
+    except TemplateSpecError as e:
+        raise HTTPException(status_code=500, detail=f"Invalid template spec: {e}")
+
+def get_template(template_id: Optional[str] = None):
+    return get_plan(template_id).template
+
+def template_version(template_id: Optional[str] = None) -> str:
+    """Identifiant du modèle choisi + spec (mtime + taille), sans le parser."""
+    try:
+        return TEMPLATES.version(template_id)
+    except (TemplateLookupError, FileNotFoundError):
+        raise _not_found(template_id)
+
+# ------------------------------ Pipeline ----------------------------
+def open_source_pdf(data: Union[bytes, mmap.mmap]) -> PdfReader:
+    """Valide l'en-tête %PDF puis ouvre le document (400 sinon). mmap lu sans copie."""
+    if not data or len(data) < 5 or data[:4] != b"%PDF":
+        raise HTTPException(status_code=400, detail="Invalid or empty PDF (missing %PDF header)")
+    try:
+        return PdfReader(data if isinstance(data, mmap.mmap) else io.BytesIO(data), strict=False)
+    except (PdfReadError, PdfStreamError) as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable PDF: {e}")
+
+def render_quitus(dt: str, all_values: Dict[str, str], template_id: Optional[str] = None,
+                  output: str = "form") -> tuple[str, bytes]:
+    """Remplit le modèle à partir des champs extraits -> (nom de fichier, octets PDF)."""
+    # modèle parsé et spec compilée une seule fois, cf. TEMPLATES
+    plan = get_plan(template_id)
+    if dt not in plan.spec.doc_types:
+        raise HTTPException(status_code=400, detail=f"Template '{plan.id}' does not support doc_type '{dt}'")
+    mapping = plan.spec.mapping(dt, all_values)
+    tpl = plan.template
+    try:
+        if output == "flat":
+            pdf_out = tpl.flatten(mapping, None if tpl.has_acroform else plan.spec.overlay_lines(mapping))
+        elif tpl.has_acroform:
+            pdf_out = tpl.fill(mapping)
+        else:
+            pdf_out = tpl.overlay(plan.spec.overlay_lines(mapping))
+    except UnsupportedText as e:   # modèle sans AcroForm : pas de lecteur pour dessiner le texte
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # nommage quitus_<fullname>.pdf
+    slug = safe_filename(plan.spec.slug_source(all_values), fallback=dt)
+    return f"quitus_{slug}.pdf", pdf_out
+
+
+# ---------------------- Étapes (exécutables en worker) ---------------------
+def extract_source(data: Union[bytes, SourcePdf]) -> Dict[str, str]:
+    """Étape 'parse' : octets source -> tous les champs du formulaire (cf. fields.py)."""
+    if isinstance(data, SourcePdf):
+        with data.open() as buf:   # fichier spoolé : mmap ouvert le temps du parcours
+            return extract_source(buf)
+    reader = open_source_pdf(data)
+    try:
+        return extract_values(reader)
+    except FieldExtractionError as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable form fields: {e}")
+
+def build_quitus(dt: str, data: Union[bytes, SourcePdf], template_id: Optional[str] = None,
+                 output: str = "form") -> tuple[Dict[str, str], str, bytes]:
+    """parse + fill d'un seul tenant (utilisé par /process/batch)."""
+    all_values = extract_source(data)
+    filename, pdf_out = render_quitus(dt, all_values, template_id, output)
+    return all_values, filename, pdf_out
+
+def warm_worker() -> None:
+    """Initializer des workers : modèles chargés, validés et compilés avant la première requête."""
+    TEMPLATES.scan()
@@ -0,0 +1,42 @@
+# API/app/responses.py
+"""
+Réponses binaires sans copie (quitus, exports, résultats de jobs).
+
+- BytesResponse : corps déjà en mémoire (bytes du cache de résultats) envoyé
+  tel quel, en un seul message ASGI, avec Content-Length exact
+  (StreamingResponse sur un BytesIO le découpait ligne par ligne, en chunked).
+  Servi par POST /process : pas une ressource, donc ni ETag ni Range
+- file_response : ressources GET sur disque (résultats de jobs, exports) ;
+  FileResponse (Range et ETag déjà gérés par Starlette) + 304
+"""
+import os
+from pathlib import Path
+from typing import Mapping, Optional, Union
+
+from starlette.responses import FileResponse, Response
+
+Body = Union[bytes, memoryview]
+
+
+def not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+class BytesResponse(Response):
+    """Response dont le corps n'est ni recopié ni découpé (Response.render ne touche pas aux bytes)."""
+
+    def __init__(self, body: Body, media_type: Optional[str] = None,
+                 headers: Optional[Mapping[str, str]] = None, status_code: int = 200):
+        super().__init__(body, status_code, headers, media_type)
+
+
+def file_response(path: Path, if_none_match: Optional[str], **kwargs) -> Response:
+    """FileResponse, ou 304 si le client a déjà cette version du fichier."""
+    response = FileResponse(path, stat_result=os.stat(path), **kwargs)
+    etag = response.headers["etag"]
+    if not_modified(if_none_match, etag):
+        return Response(status_code=304, headers={"etag": etag})
+    return response
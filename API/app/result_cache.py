@@ -0,0 +1,144 @@
+# API/app/result_cache.py
+"""
+Cache des quitus générés, adressé par contenu.
+
+Clé = sha256(octets source) + doc_type + version du modèle : un même PDF
+ré-envoyé (double clic, retry après timeout) renvoie le quitus déjà produit,
+sans re-parse, sans re-remplissage et sans nouvelle ligne dans Excel/Sheets.
+
+- niveau mémoire : LRU borné en nombre d'entrées
+- niveau disque (optionnel) : un fichier par résultat, éviction par taille
+- Idempotency-Key : clé client -> clé de contenu, associée une fois le quitus
+  produit (réutilisée avec un autre contenu = conflit ; après un échec, la
+  clé reste libre pour un envoi corrigé)
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+Result = Tuple[str, bytes]   # (nom de fichier, octets PDF)
+
+
+def content_key(data: Union[bytes, Any], doc_type: str, template_version: str) -> str:
+    """data : octets source, ou un sha256 déjà alimenté au fil de l'upload."""
+    h = hashlib.sha256(data) if isinstance(data, (bytes, bytearray, memoryview)) else data.copy()
+    h.update(b"\0" + doc_type.encode() + b"\0" + template_version.encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_items: int = 256, disk_dir: Optional[Path] = None, disk_max_bytes: int = 0,
+                 max_idempotency_keys: int = 10_000):
+        self.max_items = max_items
+        self.disk_dir = disk_dir if disk_max_bytes > 0 else None
+        self.disk_max_bytes = disk_max_bytes
+        self.max_idempotency_keys = max_idempotency_keys
+        self._mem: "OrderedDict[str, Result]" = OrderedDict()
+        self._idem: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "stores": 0, "evictions": 0}
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    # ------------------------------ lecture ------------------------------
+    def get(self, key: str) -> Optional[Result]:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                self._mem.move_to_end(key)
+                self.stats["hits_memory"] += 1
+                return hit
+        hit = self._disk_get(key)
+        with self._lock:
+            if hit is not None:
+                self.stats["hits_disk"] += 1
+                self._mem_put(key, hit)
+            else:
+                self.stats["misses"] += 1
+        return hit
+
+    # ------------------------------ écriture -----------------------------
+    def put(self, key: str, result: Result) -> None:
+        with self._lock:
+            self._mem_put(key, result)
+            self.stats["stores"] += 1
+        self._disk_put(key, result)
+
+    def _mem_put(self, key: str, result: Result) -> None:
+        self._mem[key] = result
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # ---------------------------- idempotence ----------------------------
+    def idempotency_conflict(self, idem_key: str, key: str) -> bool:
+        """Vrai si idem_key est déjà associée à un autre contenu (réutilisation invalide de la clé)."""
+        with self._lock:
+            known = self._idem.get(idem_key)
+            return known is not None and known != key
+
+    def bind_idempotency(self, idem_key: str, key: str) -> None:
+        """Associe idem_key à la clé de contenu d'un résultat produit (ou servi)."""
+        with self._lock:
+            self._idem[idem_key] = key
+            self._idem.move_to_end(idem_key)
+            while len(self._idem) > self.max_idempotency_keys:
+                self._idem.popitem(last=False)
+
+    # ------------------------------- disque ------------------------------
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        assert self.disk_dir is not None
+        return self.disk_dir / f"{key}.pdf", self.disk_dir / f"{key}.json"
+
+    def _disk_get(self, key: str) -> Optional[Result]:
+        if self.disk_dir is None:
+            return None
+        pdf, meta = self._paths(key)
+        try:
+            filename = json.loads(meta.read_text("utf-8"))["filename"]
+            data = pdf.read_bytes()
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(pdf)   # LRU disque : mtime = dernier accès
+        return filename, data
+
+    def _disk_put(self, key: str, result: Result) -> None:
+        if self.disk_dir is None:
+            return
+        pdf, meta = self._paths(key)
+        tmp = pdf.with_name(pdf.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(result[1])
+        os.replace(tmp, pdf)
+        meta.write_text(json.dumps({"filename": result[0]}), "utf-8")
+        self._disk_evict()
+
+    def _disk_evict(self) -> None:
+        assert self.disk_dir is not None
+        files = []
+        total = 0
+        for p in self.disk_dir.glob("*.pdf"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+        if total <= self.disk_max_bytes:
+            return
+        for _, size, p in sorted(files):
+            p.unlink(missing_ok=True)
+            p.with_suffix(".json").unlink(missing_ok=True)
+            total -= size
+            with self._lock:
+                self.stats["evictions"] += 1
+            if total <= self.disk_max_bytes:
+                return
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, entries_memory=len(self._mem))
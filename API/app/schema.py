@@ -0,0 +1,105 @@
+# API/app/schema.py
+"""
+Colonnes d'une feuille, internées : nom de champ -> index, dans l'ordre d'ajout.
+
+- une colonne n'est jamais déplacée ni supprimée : la version d'un schéma est
+  son nombre de colonnes, et une ligne encodée à la version v reste valable
+  pour toute version >= v (colonnes suivantes = absentes)
+- ajout de colonnes en O(nouvelles colonnes), sans reparcourir l'entête
+- ligne compacte (Row) : liste de valeurs dans l'ordre des colonnes, None =
+  champ absent du PDF source ; sortie vers un backend sans réalignement
+  (cf. aligned)
+"""
+import threading
+from typing import Dict, Iterable, List, Mapping, Optional
+
+Row = List[Optional[str]]
+
+
+class Schema:
+    __slots__ = ("names", "index", "_lock")
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for name in names:   # entête existante reprise telle quelle (doublons, cases vides)
+            self.index.setdefault(name, len(self.names))
+            self.names.append(name)
+
+    @property
+    def version(self) -> int:
+        return len(self.names)
+
+    def add(self, keys: Iterable[str]) -> List[str]:
+        """Interne les noms inconnus (ordre de première apparition) -> colonnes ajoutées."""
+        index = self.index
+        new = [k for k in keys if k not in index]
+        if new:
+            with self._lock:
+                new = [k for k in dict.fromkeys(new) if k not in index]
+                for k in new:
+                    index[k] = len(self.names)
+                    self.names.append(k)
+        return new
+
+    def add_rows(self, rows: Iterable[Mapping[str, str]]) -> List[str]:
+        new: List[str] = []
+        for values in rows:
+            new += self.add(values)
+        return new
+
+    def encode(self, values: Mapping[str, str]) -> Row:
+        """dict -> Row (colonnes inconnues ajoutées au passage)."""
+        index = self.index
+        if any(k not in index for k in values):
+            self.add(values)
+        row: Row = [None] * len(self.names)
+        for k, v in values.items():
+            row[index[k]] = v
+        return row
+
+    def decode(self, row: Row) -> Dict[str, str]:
+        """Row -> dict des seuls champs présents."""
+        return {n: v for n, v in zip(self.names, row) if v is not None}
+
+    def line(self, values: Mapping[str, str]) -> List[str]:
+        """dict -> valeurs pour toutes les colonnes actuelles, en un passage (colonnes déjà internées)."""
+        index = self.index
+        out = [""] * len(self.names)
+        for k, v in values.items():
+            out[index[k]] = v
+        return out
+
+    def aligned(self, row: Row) -> List[str]:
+        """Valeurs pour toutes les colonnes actuelles ("" si absentes)."""
+        out = ["" if v is None else v for v in row]
+        if len(out) < len(self.names):
+            out += [""] * (len(self.names) - len(out))
+        return out
+
+
+class SchemaRegistry:
+    """Un schéma par feuille, chargé à la première demande via `load(sheet)`."""
+
+    def __init__(self, load=None):
+        self._load = load
+        self._schemas: Dict[str, Schema] = {}
+        self._lock = threading.Lock()
+
+    def get(self, sheet: str) -> Schema:
+        schema = self._schemas.get(sheet)
+        if schema is None:
+            with self._lock:
+                schema = self._schemas.get(sheet)
+                if schema is None:
+                    schema = self._schemas[sheet] = Schema(self._load(sheet) if self._load else ())
+        return schema
+
+    def reset(self, sheet: Optional[str] = None) -> None:
+        """Oublie le(s) schéma(s) en cache (rechargés au prochain get)."""
+        with self._lock:
+            if sheet is None:
+                self._schemas.clear()
+            else:
+                self._schemas.pop(sheet, None)
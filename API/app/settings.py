@@ -7,14 +7,66 @@ class Settings(BaseSettings):
     API_KEY: str = ""
 
     ALLOWED_ORIGINS: List[str] = Field(default_factory=lambda: ["*"])
+    UI_ENABLED: bool = True            # 0 = API seule (gradio non importé, démarrage rapide)
 
     EXCEL_MODE: str = "local"          # "local" ou "gsheets"
     GSHEET_ID: Optional[str] = None
     GSHEET_NAME: str = "quitus-students"
     GSHEET_CREATE: bool = False
     GCP_SA_JSON: Optional[str] = None
+    GSHEET_FAKE: bool = False          # backend en mémoire (dev/tests), pas d'appel Google
+    GSHEET_FLUSH_ROWS: int = 50        # envoi dès N lignes en attente...
+    GSHEET_FLUSH_INTERVAL: float = 5.0 # ...ou toutes les N secondes
+    EXPORT_CHUNK_ROWS: int = 2000      # /download/excel : lignes lues par appel API
+    PERSIST_GROUP_COMMIT: bool = True  # lignes des requêtes simultanées écrites en une transaction
+    PERSIST_GROUP_MAX_ROWS: int = 1000 # taille max d'une écriture groupée
 
-    MAX_UPLOAD_MB: int = 10
+    DATA_DIR: Optional[str] = None     # défaut : API/data
+    MAX_UPLOAD_MB: int = 10            # /process : 413 au-delà (vérifié en streaming)
+    BATCH_MAX_UPLOAD_MB: int = 200     # /process/batch : corps complet (PDF + ZIP)
+    UPLOAD_SPOOL_KB: int = 1024        # au-delà : fichier temporaire relu via mmap
+
+    RESULT_CACHE_ITEMS: int = 256      # quitus gardés en mémoire (LRU)
+    RESULT_CACHE_DISK_MB: int = 0      # 0 = pas de niveau disque (data/results)
+
+    OUTPUT_MODE: str = "form"          # "form" (interactif) | "flat" (aplati + compressé), cf. `output`
+
+    BATCH_MAX_FILES: int = 500         # nb max de PDF par lot (ZIP inclus)
+
+    JOBS_WORKERS: int = 4              # /jobs : jobs exécutés simultanément
+    JOBS_MAX_PENDING: int = 100        # au-delà : 503 + Retry-After
+    JOB_TTL: int = 3600                # secondes de rétention d'un résultat
+
+    IMPORT_WORKERS: int = 0            # import en masse : process d'extraction (0 = nb de cœurs)
+    IMPORT_BATCH_ROWS: int = 500       # lignes par écriture groupée (et par checkpoint)
+    IMPORT_ROOT: Optional[str] = None  # POST /imports avec `path` : dossier serveur autorisé (sinon désactivé)
+    IMPORT_MAX_UPLOAD_MB: int = 1024   # POST /imports : archive .zip envoyée
+
+    # exécution du pipeline PDF hors boucle asyncio
+    PIPELINE_BACKEND: str = "thread"   # "thread" | "process" | "inline"
+    PIPELINE_WORKERS: int = 0          # 0 = nb de cœurs
+    PIPELINE_MAX_QUEUE: int = 32       # au-delà : 503 + Retry-After
+    PIPELINE_RETRY_AFTER: int = 2      # secondes
+    STAGE_TIMEOUT_PARSE: float = 30.0
+    STAGE_TIMEOUT_FILL: float = 30.0
+    # persist : sans timeout (cf. executor.py)
+
+    # admission devant le pipeline (cf. admission.py)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_SLOTS: int = 0                 # calculs simultanés (0 = PIPELINE_WORKERS)
+    ADMISSION_INTERACTIVE_WEIGHT: float = 4.0  # part de /process et de l'UI...
+    ADMISSION_BULK_WEIGHT: float = 1.0       # ...face à /jobs et /process/batch
+    ADMISSION_RESERVED: int = 1              # places que bulk ne prend jamais
+    ADMISSION_CLIENT_CONCURRENCY: int = 0    # calculs simultanés par client (0 = sans plafond)
+    ADMISSION_INTERACTIVE_PER_CLIENT: int = 1  # calculs interactifs simultanés par client, au-delà : bulk (0 = jamais)
+    ADMISSION_TRUSTED_PROXIES: List[str] = Field(default_factory=list)  # IP/réseaux des reverse proxies dont on lit X-Forwarded-For
+    ADMISSION_RATE: float = 0.0              # requêtes/s par client (0 = sans quota), 429 au-delà
+    ADMISSION_BURST: int = 20                # rafale tolérée par client
+    ADMISSION_MAX_QUEUE: int = 200           # attentes au-delà : 503 + Retry-After
+    ADMISSION_MAX_WAIT: float = 30.0         # secondes d'attente max d'une requête, puis 503
+
+    METRICS_ENABLED: bool = True       # /metrics (Prometheus) + temps par étape
+    TIMING_LOGS: bool = False          # une ligne JSON par requête (détail des étapes)
 
     model_config = SettingsConfigDict(
         env_file=".env",
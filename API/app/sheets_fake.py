@@ -0,0 +1,119 @@
+# API/app/sheets_fake.py
+"""
+Faux backend gspread en mémoire (GSHEET_FAKE=1).
+
+Couvre le sous-ensemble de l'API utilisé par l'app (worksheet, add_worksheet,
+row_values, update, append_rows, get_all_values...) pour développer, tester
+et mesurer le mode gsheets sans compte Google. Compte les appels API.
+"""
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import a1_to_rowcol
+
+
+class FakeAPIError(Exception):
+    """Erreur HTTP de l'API (même attribut `code` que gspread.APIError)."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"[{code}]: {message}")
+        self.code = code
+
+
+class FakeWorksheet:
+    def __init__(self, sh: "FakeSpreadsheet", title: str, rows: int = 100, cols: int = 26):
+        self._sh = sh
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self._values: List[List[str]] = []
+
+    def _call(self, name: str) -> None:
+        self._sh.calls[name] += 1
+        if self._sh.fail_next:
+            self._sh.fail_next -= 1
+            raise self._sh.error_factory()
+
+    def row_values(self, row: int) -> List[str]:
+        self._call("row_values")
+        with self._sh.lock:
+            return list(self._values[row - 1]) if row <= len(self._values) else []
+
+    def add_cols(self, n: int) -> None:
+        self._call("add_cols")
+        self.col_count += n
+
+    def update(self, range_name: str, values: List[List[Any]], **kwargs) -> None:
+        """Écrit `values` à partir du coin haut-gauche de la plage ('B3' ou 'B3:D4')."""
+        self._call("update")
+        row0, col0 = a1_to_rowcol(range_name.split(":")[0])
+        with self._sh.lock:
+            self._sh.revision += 1
+            while len(self._values) < row0 - 1 + len(values):
+                self._values.append([])
+            for i, row in enumerate(values):
+                cur = self._values[row0 - 1 + i]
+                if len(cur) < col0 - 1 + len(row):
+                    cur.extend([""] * (col0 - 1 + len(row) - len(cur)))
+                cur[col0 - 1:col0 - 1 + len(row)] = [str(v) for v in row]
+            self.row_count = max(self.row_count, len(self._values))
+
+    def append_rows(self, rows: List[List[Any]], value_input_option: Optional[str] = None, **kwargs) -> None:
+        self._call("append_rows")
+        with self._sh.lock:
+            self._sh.revision += 1
+            self._values.extend([[str(v) for v in r] for r in rows])
+            self.row_count = max(self.row_count, len(self._values))
+
+    def append_row(self, row: List[Any], value_input_option: Optional[str] = None, **kwargs) -> None:
+        self.append_rows([row], value_input_option=value_input_option)
+
+    def get_all_values(self) -> List[List[str]]:
+        self._call("get_all_values")
+        with self._sh.lock:
+            return [list(r) for r in self._values]
+
+    def get(self, range_name: str) -> List[List[str]]:
+        """Plage 'A<start>:<col><end>' (seules les lignes comptent ici), lignes vides finales omises comme l'API."""
+        self._call("get")
+        a, b = range_name.split(":")
+        start = int("".join(ch for ch in a if ch.isdigit()))
+        end = int("".join(ch for ch in b if ch.isdigit()))
+        with self._sh.lock:
+            out = [list(r) for r in self._values[start - 1:end]]
+        while out and not any(out[-1]):
+            out.pop()
+        return out
+
+
+class FakeSpreadsheet:
+    def __init__(self, title: str = "fake"):
+        self.title = title
+        self.id = "fake"
+        self.lock = threading.RLock()
+        self.calls: Counter = Counter()
+        self.revision = 0                        # cf. get_lastUpdateTime
+        self.fail_next = 0                       # nb d'appels à faire échouer (tests de retry)
+        self.error_factory = lambda: FakeAPIError(429, "Quota exceeded")
+        self._ws: Dict[str, FakeWorksheet] = {}
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.calls["worksheet"] += 1
+        try:
+            return self._ws[title]
+        except KeyError:
+            raise WorksheetNotFound(title)
+
+    def add_worksheet(self, title: str, rows: int = 100, cols: int = 26) -> FakeWorksheet:
+        self.calls["add_worksheet"] += 1
+        with self.lock:
+            ws = self._ws.setdefault(title, FakeWorksheet(self, title, rows, cols))
+        return ws
+
+    def get_lastUpdateTime(self) -> str:
+        return f"rev-{self.revision}"
+
+    def worksheets(self) -> List[FakeWorksheet]:
+        return list(self._ws.values())
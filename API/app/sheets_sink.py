@@ -0,0 +1,373 @@
+# API/app/sheets_sink.py
+"""
+Écriture tamponnée vers Google Sheets (EXCEL_MODE=gsheets).
+
+La requête ne fait qu'un INSERT dans un spool SQLite local (durable) ;
+un thread de fond regroupe les lignes et les envoie par append_rows :
+- déclenchement par taille (GSHEET_FLUSH_ROWS) ou par délai (GSHEET_FLUSH_INTERVAL)
+- handles de feuilles et entêtes en cache : plus de row_values(1) par ligne ;
+  entête internée (schema.Schema), lignes construites directement dans
+  l'ordre des colonnes
+- échec transitoire (quota 429, 5xx, réseau) -> retry avec backoff
+  exponentiel, les lignes restent dans le spool et survivent à un redémarrage
+- refus définitif de l'API (400, 403...) -> le lot est coupé en deux jusqu'à
+  isoler les lignes fautives, mises de côté dans la table `dead` (cf.
+  requeue_dead) : elles ne bloquent plus le reste du spool
+- chaque lot est "réservé" (bail) : plusieurs workers peuvent partager le spool
+- un seul worker envoie à la fois (bail "leader" dans le spool) : l'entête
+  n'est jamais modifiée par deux process, et le cache d'entête est relu quand
+  le rôle change de main
+"""
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .metrics import PERSIST_CALLS, PERSIST_ERRORS
+from .schema import Schema
+
+log = logging.getLogger("quitus-api")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    sheet       TEXT NOT NULL,
+    data        TEXT NOT NULL,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS dead (
+    id    INTEGER PRIMARY KEY,
+    sheet TEXT NOT NULL,
+    data  TEXT NOT NULL,
+    error TEXT NOT NULL,
+    at    REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leader (
+    name  TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    until REAL NOT NULL
+);
+"""
+
+_TRANSIENT_STATUS = {408, 429}
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Vaut-il la peine de réessayer ? (quota, 5xx, réseau ; sinon refus définitif)."""
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if not isinstance(status, int):
+        status = getattr(exc, "code", None)   # gspread.APIError (-1 si réponse illisible)
+    if isinstance(status, int) and status > 0:
+        return status in _TRANSIENT_STATUS or status >= 500
+    if isinstance(exc, (OSError, TimeoutError)):   # requests.RequestException en hérite
+        return True
+    return type(exc).__name__ == "TransportError"   # google.auth : jeton non rafraîchi (réseau)
+
+
+class SheetsSink:
+    def __init__(
+        self,
+        open_sheet: Callable[[], Any],
+        spool_path: Path,
+        flush_rows: int = 50,
+        flush_interval: float = 5.0,
+        max_backoff: float = 300.0,
+        lease_seconds: float = 120.0,
+        leader_seconds: float = 30.0,
+    ):
+        self._open_sheet = open_sheet
+        self.spool_path = spool_path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self.leader_seconds = leader_seconds
+        self.owner = f"{os.getpid()}-{id(self):x}"
+
+        self._local = threading.local()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failures = 0
+
+        # caches : titre -> worksheet / entête
+        self._ws: Dict[str, Any] = {}
+        self._headers: Dict[str, Schema] = {}
+        # spool créé à la 1re connexion : rien sur disque en mode local
+
+    # ------------------------------ spool --------------------------------
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.spool_path, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA busy_timeout=30000")
+            con.executescript(_SCHEMA)
+            self._local.con = con
+        return con
+
+    def enqueue(self, sheet: str, rows: List[Dict[str, str]]) -> None:
+        """Chemin requête : écriture locale uniquement, aucun appel Google."""
+        self.enqueue_batch([(sheet, rows)])
+
+    def enqueue_batch(self, batch: List[Tuple[str, List[Dict[str, str]]]]) -> None:
+        """Lignes de plusieurs requêtes, une seule transaction (cf. group_commit)."""
+        values = [(sheet, json.dumps(v, ensure_ascii=False)) for sheet, rows in batch for v in rows]
+        if not values:
+            return
+        con = self._con()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.executemany("INSERT INTO spool (sheet, data) VALUES (?, ?)", values)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        self.start()
+        if self.pending() >= self.flush_rows:
+            self._wake.set()
+
+    def pending(self) -> int:
+        (n,) = self._con().execute("SELECT COUNT(*) FROM spool").fetchone()
+        return int(n)
+
+    def last_id(self) -> int:
+        (n,) = self._con().execute("SELECT COALESCE(MAX(id), 0) FROM spool").fetchone()
+        return int(n)
+
+    def iter_pending(self, upto: int) -> Iterator[Tuple[str, Dict[str, str]]]:
+        """Lignes pas encore envoyées, jusqu'à l'id `upto` inclus."""
+        cur = self._con().execute("SELECT sheet, data FROM spool WHERE id <= ? ORDER BY id", (upto,))
+        for sheet, data in cur:
+            yield sheet, json.loads(data)
+
+    @contextmanager
+    def paused(self, timeout: float = 600.0) -> Iterator[None]:
+        """Aucun envoi, dans aucun worker, pendant le bloc (les lignes continuent d'entrer dans le spool)."""
+        with self._flush_lock:
+            deadline = time.time() + self.leader_seconds * 2
+            while not self._lead(hold=timeout) and time.time() < deadline:
+                time.sleep(0.5)
+            try:
+                yield
+            finally:
+                self._resign()
+
+    # ------------------------ worker qui envoie -------------------------
+    def _lead(self, hold: Optional[float] = None) -> bool:
+        """Prend ou prolonge le rôle d'envoi ; faux si un autre worker le tient."""
+        con = self._con()
+        now = time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            row = con.execute("SELECT owner, until FROM leader WHERE name = 'flush'").fetchone()
+            if row is not None and row[0] != self.owner and row[1] >= now:
+                con.execute("COMMIT")
+                return False
+            con.execute("INSERT OR REPLACE INTO leader (name, owner, until) VALUES ('flush', ?, ?)",
+                        (self.owner, now + (hold or self.leader_seconds)))
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        if row is None or row[0] != self.owner:
+            # un autre process a pu modifier l'entête : on la relira
+            self._headers.clear()
+            self._ws.clear()
+        return True
+
+    def _resign(self) -> None:
+        self._con().execute("UPDATE leader SET until = 0 WHERE name = 'flush' AND owner = ?", (self.owner,))
+
+    def _claim(self, limit: int) -> List[Tuple[int, str, Dict[str, str]]]:
+        con = self._con()
+        now = time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            rows = con.execute(
+                "SELECT id, sheet, data FROM spool WHERE lease_until < ? ORDER BY id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            if rows:
+                con.executemany(
+                    "UPDATE spool SET lease_until = ? WHERE id = ?",
+                    [(now + self.lease_seconds, r[0]) for r in rows],
+                )
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return [(i, sheet, json.loads(data)) for i, sheet, data in rows]
+
+    def _release(self, ids: List[int], done: bool) -> None:
+        sql = "DELETE FROM spool WHERE id = ?" if done else "UPDATE spool SET lease_until = 0 WHERE id = ?"
+        self._con().executemany(sql, [(i,) for i in ids])
+
+    def _dead_letter(self, ids: List[int], error: str) -> None:
+        con = self._con()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.executemany("INSERT OR REPLACE INTO dead (id, sheet, data, error, at) "
+                            "SELECT id, sheet, data, ?, ? FROM spool WHERE id = ?",
+                            [(error, time.time(), i) for i in ids])
+            con.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in ids])
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    def dead(self) -> int:
+        (n,) = self._con().execute("SELECT COUNT(*) FROM dead").fetchone()
+        return int(n)
+
+    def requeue_dead(self) -> int:
+        """Remet les lignes refusées dans le spool (après correction de la feuille) ; renvoie leur nombre."""
+        con = self._con()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            n = con.execute("INSERT INTO spool (id, sheet, data) SELECT id, sheet, data FROM dead").rowcount
+            con.execute("DELETE FROM dead")
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        if n:
+            self.start()
+            self._wake.set()
+        return n
+
+    # --------------------------- Google Sheets ----------------------------
+    def _worksheet(self, title: str):
+        ws = self._ws.get(title)
+        if ws is None:
+            from gspread.exceptions import WorksheetNotFound
+            sh = self._open_sheet()
+            try:
+                ws = sh.worksheet(title)
+            except WorksheetNotFound:
+                ws = sh.add_worksheet(title=title, rows=100, cols=26)
+            self._ws[title] = ws
+        return ws
+
+    def _header(self, title: str, ws) -> Schema:
+        schema = self._headers.get(title)
+        if schema is None:
+            values = ws.row_values(1) if ws.row_count >= 1 else []
+            schema = self._headers[title] = Schema(h.strip() for h in values)
+        return schema
+
+    def _write_rows(self, title: str, rows: List[Dict[str, str]]) -> None:
+        ws = self._worksheet(title)
+        schema = self._header(title, ws)
+        fresh = not schema.version
+        if schema.add_rows(rows) or fresh:
+            needed = schema.version - ws.col_count
+            if needed > 0:
+                ws.add_cols(needed)
+            ws.update("A1", [list(schema.names)])
+        ws.append_rows([schema.line(values) for values in rows],
+                       value_input_option="USER_ENTERED")
+
+    # ------------------------------ flush ---------------------------------
+    def _send(self, sheet: str, items: List[Tuple[int, Dict[str, str]]]) -> Tuple[int, List[int]]:
+        """
+        Envoie les lignes d'une feuille ; refus définitif -> moitié par moitié
+        jusqu'à la ligne fautive, mise de côté. Renvoie (envoyées, ids traités) ;
+        une erreur transitoire remonte telle quelle.
+        """
+        self._worksheet(sheet)   # ouverture (identifiants, partage...) : pas la faute du lot -> retry
+        PERSIST_CALLS.inc(backend="gsheets", op="append_rows")
+        try:
+            self._write_rows(sheet, [v for _, v in items])
+        except Exception as e:
+            PERSIST_ERRORS.inc(backend="gsheets", op="append_rows")
+            # cache potentiellement périmé (entête modifiée à la main, etc.)
+            self._headers.pop(sheet, None)
+            self._ws.pop(sheet, None)
+            if is_transient(e):
+                raise
+            if len(items) > 1:
+                half = len(items) // 2
+                sent, ids = self._send(sheet, items[:half])
+                more, rest = self._send(sheet, items[half:])
+                return sent + more, ids + rest
+            PERSIST_ERRORS.inc(backend="gsheets", op="dead_letter")
+            log.error("Google Sheets: ligne %d refusée (%s: %s), mise de côté", items[0][0], type(e).__name__, e)
+            self._dead_letter([items[0][0]], f"{type(e).__name__}: {e}")
+            return 0, [items[0][0]]
+        ids = [i for i, _ in items]
+        self._release(ids, done=True)
+        return len(ids), ids
+
+    def flush(self, max_rows: int = 1000) -> int:
+        """Envoie tout ce qui est en attente (lots de max_rows). Lève en cas d'échec transitoire."""
+        sent = 0
+        with self._flush_lock:
+            while True:
+                if not self._lead():   # un autre worker envoie (spool partagé)
+                    return sent
+                batch = self._claim(max_rows)
+                if not batch:
+                    return sent
+                by_sheet: Dict[str, List[Tuple[int, Dict[str, str]]]] = {}
+                for i, sheet, values in batch:
+                    by_sheet.setdefault(sheet, []).append((i, values))
+                pending = {i for i, _, _ in batch}
+                for sheet, items in by_sheet.items():
+                    try:
+                        n, ids = self._send(sheet, items)
+                    except Exception:
+                        self._release(sorted(pending), done=False)
+                        raise
+                    pending.difference_update(ids)
+                    sent += n
+
+    def _backoff(self) -> float:
+        base = min(self.max_backoff, self.flush_interval * (2 ** min(self._failures, 16)))
+        return base * (0.5 + random.random() / 2)   # jitter
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self._failures:
+                self._stop.wait(self._backoff())   # pas de réveil anticipé pendant un backoff
+            else:
+                self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                log.warning("Google Sheets flush échoué (%s) ; retry dans ~%.0fs, %d ligne(s) en attente",
+                            e, self._backoff(), self.pending())
+
+    # --------------------------- cycle de vie ------------------------------
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._run, name="sheets-sink", daemon=True)
+                    self._thread.start()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Arrêt propre : dernier flush (best effort), le reste reste dans le spool."""
+        if self._thread is None and not self.spool_path.exists():
+            return   # jamais utilisé (mode local)
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            log.warning("Google Sheets: %d ligne(s) conservées dans le spool (%s)", self.pending(), e)
+        self._resign()   # un autre worker reprend sans attendre la fin du bail
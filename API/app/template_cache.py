@@ -0,0 +1,480 @@
+# API/app/template_cache.py
+"""
+Cache mémoire du modèle quitus.
+
+Le modèle est parsé une seule fois (puis rechargé si son mtime change) :
+- carte des champs (get_fields) précalculée
+- disposition des widgets AcroForm résolue (rect, police, couleur)
+- copies "préparées" du document réutilisées d'une requête à l'autre :
+  on ne patche que les /V et les flux d'apparence, sans re-cloner.
+- modèles sans AcroForm : même principe, la page 0 porte déjà la police
+  Helvetica et un flux de contenu vide en fin de /Contents ; remplir = réécrire
+  ce flux (quelques Tj), sans reportlab ni merge_page.
+- sortie "flat" (OUTPUT_MODE) : copie préparée sans AcroForm ni widgets texte,
+  flux compressés et objets identiques fusionnés une fois pour toutes ; les
+  apparences sont posées dans un dernier flux de la page 0 (un seul Flate par
+  requête), plus rien à régénérer à l'ouverture.
+- texte hors WinAnsi (cp1252, police Helvetica standard) : jamais remplacé
+  par "?" ; formulaire -> /V seule, apparence laissée au lecteur
+  (NeedAppearances) ; flat -> sortie formulaire ; overlay -> UnsupportedText
+"""
+import io
+import os
+import re
+import threading
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from queue import Empty, SimpleQueue
+from typing import Any, Dict, List, Optional, Tuple
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (
+    ArrayObject,
+    BooleanObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    EncodedStreamObject,
+    FloatObject,
+    IndirectObject,
+    NameObject,
+    StreamObject,
+    TextStringObject,
+)
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from .pdf_pack import PackedPdf, packable
+
+_DA_FONT = re.compile(r"/([^\s/]+)\s+([\d.]+)\s+Tf")
+DEFAULT_FONT_SIZE = 12.0
+OVERLAY_FONT = "QuitusOv"     # nom de ressource ajouté à la page 0
+OVERLAY_FONT_SIZE = 12.0
+
+
+@dataclass(frozen=True)
+class WidgetLayout:
+    """Position d'un widget dans la page 0 du modèle."""
+    field_name: str
+    annot_index: int          # index dans /Annots de la page 0
+    x: float                  # coin bas gauche du /Rect
+    y: float
+    width: float
+    height: float
+    font_name: str
+    font_size: float          # 0 = auto
+    color_ops: str            # ex: "0.008 0.467 0.741 rg"
+    align: int                # /Q : 0 gauche, 1 centre, 2 droite
+
+
+@dataclass
+class _Prepared:
+    """Copie du modèle prête à remplir (une par requête concurrente)."""
+    writer: PdfWriter
+    fields: Dict[str, DictionaryObject]          # nom -> objet champ (porte /V)
+    defaults: Dict[str, Any]                     # nom -> /V du modèle (None si absent)
+    streams: List[Tuple[WidgetLayout, DecodedStreamObject]]
+    annots: List[Tuple[DictionaryObject, DictionaryObject, Any]]   # widget, /AP générée, /AP du modèle
+
+
+@dataclass
+class _PreparedOverlay:
+    """Copie d'un modèle dont seul le dernier flux de la page 0 change (overlay, flat)."""
+    writer: PdfWriter
+    stream: StreamObject
+    widgets: List[WidgetLayout] = field(default_factory=list)   # flat : polices renommées pour la page
+    defaults: Dict[str, str] = field(default_factory=dict)      # flat : valeurs /V du modèle
+    packed: Optional[PackedPdf] = None                          # flat : écriture compacte (cf. pdf_pack)
+
+
+class UnsupportedText(ValueError):
+    """Caractères que la police Helvetica standard (WinAnsi) ne sait pas dessiner."""
+
+
+def encodable(text: str) -> bool:
+    try:
+        text.encode("cp1252")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def _pdf_escape(text: str) -> bytes:
+    try:
+        raw = text.encode("cp1252")
+    except UnicodeEncodeError as e:
+        raise UnsupportedText(f"Text not supported by the template font: {text[e.start:e.end]!r}") from None
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _parse_da(da: str) -> Tuple[str, float, str]:
+    m = _DA_FONT.search(da or "")
+    if not m:
+        return "Helv", 0.0, "0 g"
+    color = (da[m.end():] or "").strip() or "0 g"
+    return m.group(1), float(m.group(2)), color
+
+
+def build_appearance(layout: WidgetLayout, text: str) -> bytes:
+    """Flux d'apparence minimal d'un champ texte mono-ligne."""
+    if not text:
+        return b"/Tx BMC\nEMC\n"
+    w, h = layout.width, layout.height
+    size = layout.font_size or min(DEFAULT_FONT_SIZE, max(h - 4, 4))
+    tw = stringWidth(text, "Helvetica", size)
+    if not layout.font_size and tw > w - 4 and tw > 0:
+        # taille auto : on réduit pour tenir dans la largeur
+        size = max(size * (w - 4) / tw, 4)
+        tw = stringWidth(text, "Helvetica", size)
+    if layout.align == 1:
+        x = (w - tw) / 2
+    elif layout.align == 2:
+        x = w - 2 - tw
+    else:
+        x = 2
+    y = (h - size * 0.78) / 2
+    return (
+        b"/Tx BMC\nq\n1 1 %.2f %.2f re W n\nBT\n/%s %.2f Tf %s\n%.2f %.2f Td\n(%s) Tj\nET\nQ\nEMC\n"
+        % (w - 2, h - 2, layout.font_name.encode(), size, layout.color_ops.encode(), x, y, _pdf_escape(text))
+    )
+
+
+def build_overlay(lines: List[Tuple[str, float, float]]) -> bytes:
+    """Texte posé en (x, y), Helvetica 12 noir : l'équivalent de canvas.drawString."""
+    out = [b"Q\nBT\n/%s %.1f Tf\n0 g\n" % (OVERLAY_FONT.encode(), OVERLAY_FONT_SIZE)]
+    for text, x, y in lines:
+        if text:
+            out.append(b"1 0 0 1 %.2f %.2f Tm (%s) Tj\n" % (x, y, _pdf_escape(text)))
+    out.append(b"ET\n")
+    return b"".join(out)
+
+
+def _inherited(page: DictionaryObject, key: str) -> Optional[Any]:
+    node: Optional[DictionaryObject] = page
+    while node is not None:
+        if key in node:
+            return node[key]
+        parent = node.get("/Parent")
+        node = parent.get_object() if parent is not None else None
+    return None
+
+
+def _helvetica(writer: PdfWriter) -> IndirectObject:
+    return writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+        NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+    }))
+
+
+def _own_fonts(page: DictionaryObject) -> DictionaryObject:
+    """/Resources et /Font propres à la page (copies : peuvent être partagés ou hérités)."""
+    res = _inherited(page, "/Resources")
+    res = DictionaryObject(res.get_object()) if res is not None else DictionaryObject()
+    fonts = res.get("/Font")
+    fonts = DictionaryObject(fonts.get_object()) if fonts is not None else DictionaryObject()
+    res[NameObject("/Font")] = fonts
+    page[NameObject("/Resources")] = res
+    return fonts
+
+
+def _same_ref(a: Any, b: Any) -> bool:
+    return b is not None and isinstance(a, IndirectObject) and isinstance(b, IndirectObject) and a.idnum == b.idnum
+
+
+def _wrap_contents(writer: PdfWriter, page: DictionaryObject, stream: StreamObject) -> None:
+    """/Contents = [q, contenu d'origine..., flux ajouté (commence par Q)] : l'état
+    graphique du modèle (cm, couleurs) ne déborde pas sur ce qu'on ajoute."""
+    contents = page.get("/Contents")
+    if contents is None:
+        original: List[Any] = []
+    elif isinstance(contents.get_object(), ArrayObject):
+        original = list(contents.get_object())
+    else:
+        original = [contents]
+    push = DecodedStreamObject()
+    push.set_data(b"q\n")
+    page[NameObject("/Contents")] = ArrayObject(
+        [writer._add_object(push), *original, writer._add_object(stream)])
+
+
+def _compact(writer: PdfWriter) -> None:
+    """Flate sur les flux non filtrés + fusion des objets identiques / orphelins."""
+    for i, obj in enumerate(writer._objects):
+        if isinstance(obj, StreamObject) and "/Filter" not in obj:
+            writer._objects[i] = obj.flate_encode()
+    writer.compress_identical_objects()
+
+
+def _flate_stream(data: bytes) -> EncodedStreamObject:
+    raw = DecodedStreamObject()
+    raw.set_data(data)
+    return raw.flate_encode()
+
+
+def build_flat(widgets: List[WidgetLayout], mapping: Dict[str, str]) -> bytes:
+    """Apparences des champs posées dans la page, à la place des widgets."""
+    out = [b"Q\n"]
+    for layout in widgets:
+        text = mapping.get(layout.field_name, "")
+        if text:
+            out.append(b"q 1 0 0 1 %.2f %.2f cm\n%sQ\n" % (layout.x, layout.y, build_appearance(layout, text)))
+    return b"".join(out)
+
+
+@dataclass
+class Template:
+    """Modèle parsé + disposition précalculée. Immuable une fois chargé."""
+    path: Path
+    mtime: float
+    data: bytes
+    reader: PdfReader
+    fields: Dict[str, Dict[str, Any]]
+    widgets: List[WidgetLayout] = field(default_factory=list)
+    # PdfReader n'est pas thread-safe (flux partagé) : accès sérialisés
+    reader_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _pool: "SimpleQueue[_Prepared]" = field(default_factory=SimpleQueue, repr=False)
+    _overlay_pool: "SimpleQueue[_PreparedOverlay]" = field(default_factory=SimpleQueue, repr=False)
+    _flat_pool: "SimpleQueue[_PreparedOverlay]" = field(default_factory=SimpleQueue, repr=False)
+
+    @property
+    def has_acroform(self) -> bool:
+        return bool(self.fields)
+
+    # ------------------------- copies préparées -------------------------
+    def _prepare(self) -> _Prepared:
+        writer = PdfWriter()
+        with self.reader_lock:
+            writer.clone_document_from_reader(self.reader)
+        root = writer._root_object
+        acro = root["/AcroForm"]
+        acro[NameObject("/NeedAppearances")] = BooleanObject(True)
+        fonts = acro.get("/DR", DictionaryObject()).get_object().get("/Font", DictionaryObject())
+        resources = DictionaryObject({NameObject("/Font"): fonts})
+
+        annots = writer.pages[0].get("/Annots", ArrayObject())
+        fields: Dict[str, DictionaryObject] = {}
+        defaults: Dict[str, Any] = {}
+        streams: List[Tuple[WidgetLayout, DecodedStreamObject]] = []
+        widgets: List[Tuple[DictionaryObject, DictionaryObject, Any]] = []
+        for layout in self.widgets:
+            annot = annots[layout.annot_index].get_object()
+            parent = annot.get("/Parent")
+            obj = fields[layout.field_name] = parent.get_object() if parent is not None else annot
+            defaults[layout.field_name] = obj.raw_get("/V") if "/V" in obj else None
+            ap = DecodedStreamObject()
+            ap.update({
+                NameObject("/Type"): NameObject("/XObject"),
+                NameObject("/Subtype"): NameObject("/Form"),
+                NameObject("/BBox"): ArrayObject([FloatObject(0), FloatObject(0),
+                                                  FloatObject(layout.width), FloatObject(layout.height)]),
+                NameObject("/Resources"): resources,
+            })
+            ap.set_data(build_appearance(layout, ""))
+            generated = DictionaryObject({NameObject("/N"): writer._add_object(ap)})
+            widgets.append((annot, generated, annot.raw_get("/AP") if "/AP" in annot else None))
+            streams.append((layout, ap))
+        return _Prepared(writer=writer, fields=fields, defaults=defaults, streams=streams, annots=widgets)
+
+    def _acquire(self) -> _Prepared:
+        try:
+            return self._pool.get_nowait()
+        except Empty:
+            return self._prepare()
+
+    def fill(self, mapping: Dict[str, str]) -> bytes:
+        """Remplit une copie préparée : seuls les champs du mapping changent (/V et apparence),
+        les autres gardent la valeur et l'apparence du modèle. Valeur hors WinAnsi : /V seule,
+        le lecteur dessine le champ (NeedAppearances)."""
+        prep = self._acquire()
+        try:
+            for name, obj in prep.fields.items():
+                if name in mapping:
+                    obj[NameObject("/V")] = TextStringObject(mapping[name])
+                elif prep.defaults[name] is not None:
+                    obj[NameObject("/V")] = prep.defaults[name]
+                else:
+                    obj.pop("/V", None)
+            for (layout, ap), (annot, generated, original) in zip(prep.streams, prep.annots):
+                value = mapping.get(layout.field_name)
+                if value is not None and encodable(value):
+                    ap.set_data(build_appearance(layout, value))
+                    annot[NameObject("/AP")] = generated
+                elif value is not None:
+                    annot.pop("/AP", None)
+                elif original is not None:
+                    annot[NameObject("/AP")] = original
+                else:
+                    annot.pop("/AP", None)
+            buf = io.BytesIO()
+            prep.writer.write(buf)
+            return buf.getvalue()
+        finally:
+            self._pool.put(prep)
+
+    # ------------------------- overlay (sans AcroForm) -------------------------
+    def _prepare_overlay(self, compact: bool = False) -> _PreparedOverlay:
+        writer = PdfWriter()
+        with self.reader_lock:
+            writer.clone_document_from_reader(self.reader)
+        page = writer.pages[0]
+        _own_fonts(page)[NameObject("/" + OVERLAY_FONT)] = _helvetica(writer)
+        if compact:
+            _compact(writer)
+        stream = _flate_stream(b"") if compact else DecodedStreamObject()
+        stream.set_data(build_overlay([]))
+        _wrap_contents(writer, page, stream)
+        packed = PackedPdf(writer, stream.indirect_reference) if compact and packable(writer) else None
+        return _PreparedOverlay(writer=writer, stream=stream, packed=packed)
+
+    def _prepare_flat(self) -> _PreparedOverlay:
+        """Copie sans formulaire : widgets texte retirés, polices du /DR recopiées dans la page."""
+        if not self.has_acroform:
+            return self._prepare_overlay(compact=True)
+        writer = PdfWriter()
+        with self.reader_lock:
+            writer.clone_document_from_reader(self.reader)
+        root = writer._root_object
+        acro = root["/AcroForm"].get_object()
+        dr_fonts = acro.get("/DR", DictionaryObject()).get_object().get("/Font", DictionaryObject()).get_object()
+        page = writer.pages[0]
+        fonts = _own_fonts(page)
+
+        renamed: Dict[str, str] = {}
+        for name in dict.fromkeys(w.font_name for w in self.widgets):
+            key = NameObject("/" + name)
+            ref = dr_fonts.raw_get(key) if key in dr_fonts else None
+            n = 0
+            while key in fonts and not _same_ref(fonts.raw_get(key), ref):
+                n += 1
+                key = NameObject(f"/QuitusF{n}")   # même nom, autre police dans la page : alias
+            if key not in fonts:
+                fonts[key] = ref if ref is not None else _helvetica(writer)
+            renamed[name] = key[1:]
+        widgets = [replace(w, font_name=renamed[w.font_name]) for w in self.widgets]
+
+        annots = page.get("/Annots")
+        defaults: Dict[str, str] = {}
+        for w in self.widgets:   # valeurs par défaut du modèle, dessinées si absentes du mapping
+            annot = annots[w.annot_index].get_object()
+            parent = annot.get("/Parent")
+            value = (parent.get_object() if parent is not None else annot).get("/V")
+            if value is not None and str(value):
+                defaults.setdefault(w.field_name, str(value))
+        flat = {w.annot_index for w in self.widgets}
+        if annots is not None:
+            kept = ArrayObject([a for i, a in enumerate(annots.get_object()) if i not in flat])
+            if kept:
+                page[NameObject("/Annots")] = kept
+            else:
+                del page["/Annots"]
+        del root["/AcroForm"]
+        _compact(writer)
+
+        stream = _flate_stream(build_flat(widgets, {}))
+        _wrap_contents(writer, page, stream)
+        packed = PackedPdf(writer, stream.indirect_reference) if packable(writer) else None
+        return _PreparedOverlay(writer=writer, stream=stream, widgets=widgets, defaults=defaults, packed=packed)
+
+    def _render(self, pool: "SimpleQueue[_PreparedOverlay]", prepare, data) -> bytes:
+        try:
+            prep = pool.get_nowait()
+        except Empty:
+            prep = prepare()
+        try:
+            prep.stream.set_data(data(prep))
+            if prep.packed is not None:
+                return prep.packed.write()
+            buf = io.BytesIO()
+            prep.writer.write(buf)
+            return buf.getvalue()
+        finally:
+            pool.put(prep)
+
+    def overlay(self, lines: List[Tuple[str, float, float]]) -> bytes:
+        """Pose les lignes sur la page 0 d'une copie préparée (modèles sans AcroForm)."""
+        return self._render(self._overlay_pool, self._prepare_overlay, lambda prep: build_overlay(lines))
+
+    def flatten(self, mapping: Optional[Dict[str, str]] = None,
+                lines: Optional[List[Tuple[str, float, float]]] = None) -> bytes:
+        """
+        Sortie "flat" : champs (mapping) ou lignes (modèles sans AcroForm) posés
+        dans la page. Valeur hors WinAnsi : sortie formulaire (cf. fill) ;
+        sans AcroForm, UnsupportedText.
+        """
+        if self.has_acroform:
+            if not all(encodable(v) for v in (mapping or {}).values()):
+                return self.fill(mapping or {})
+            return self._render(self._flat_pool, self._prepare_flat,
+                                lambda prep: build_flat(prep.widgets, {**prep.defaults, **(mapping or {})}))
+        return self._render(self._flat_pool, self._prepare_flat, lambda prep: build_overlay(lines or []))
+
+
+def _widget_layouts(reader: PdfReader) -> List[WidgetLayout]:
+    if not reader.pages:
+        return []
+    out: List[WidgetLayout] = []
+    for i, ref in enumerate(reader.pages[0].get("/Annots", []) or []):
+        annot = ref.get_object()
+        if annot.get("/Subtype") != "/Widget":
+            continue
+        parent = annot.get("/Parent")
+        parent = parent.get_object() if parent is not None else None
+        name = annot.get("/T") or (parent.get("/T") if parent else None)
+        ft = annot.get("/FT") or (parent.get("/FT") if parent else None)
+        if not name or ft != "/Tx":
+            continue
+        x1, y1, x2, y2 = [float(v) for v in annot["/Rect"]]
+        da = annot.get("/DA") or (parent.get("/DA") if parent else "") or ""
+        font_name, font_size, color_ops = _parse_da(str(da))
+        q = annot.get("/Q", parent.get("/Q", 0) if parent else 0)
+        out.append(WidgetLayout(
+            field_name=str(name), annot_index=i, x=min(x1, x2), y=min(y1, y2),
+            width=abs(x2 - x1), height=abs(y2 - y1),
+            font_name=font_name, font_size=font_size, color_ops=color_ops, align=int(q),
+        ))
+    return out
+
+
+def load_template(path: Path) -> Template:
+    data = path.read_bytes()
+    reader = PdfReader(io.BytesIO(data), strict=False)
+    try:
+        fields = reader.get_fields() or {}
+    except Exception:
+        fields = {}
+    tpl = Template(
+        path=path,
+        mtime=path.stat().st_mtime,
+        data=data,
+        reader=reader,
+        fields=fields,
+        widgets=_widget_layouts(reader) if fields else [],
+    )
+    if tpl.has_acroform:
+        tpl._pool.put(tpl._prepare())   # première copie prête dès le chargement
+    elif reader.pages:
+        tpl._overlay_pool.put(tpl._prepare_overlay())
+    return tpl
+
+
+class TemplateCache:
+    """Garde le modèle parsé en mémoire et le recharge quand le fichier change."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._tpl: Optional[Template] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Template:
+        mtime = os.stat(self.path).st_mtime   # FileNotFoundError si absent
+        tpl = self._tpl
+        if tpl is not None and tpl.mtime == mtime:
+            return tpl
+        with self._lock:
+            if self._tpl is None or self._tpl.mtime != mtime:
+                self._tpl = load_template(self.path)
+            return self._tpl
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._tpl = None
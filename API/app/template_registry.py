@@ -0,0 +1,289 @@
+# API/app/template_registry.py
+"""
+Registre des modèles de quitus : un PDF par variante (faculté, année...)
+dans templates/, avec une spec JSON optionnelle de même nom.
+
+    templates/quitus.pdf + quitus.json
+    templates/fst_2025.pdf + fst_2025.json
+
+Spec (toutes les clés sont optionnelles sauf "fields") :
+    {
+      "title": "Quitus FST 2025",
+      "doc_types": ["licence", "master"],
+      "fields": {                                   # champ du modèle -> expression
+        "student_nom": "{student_nom} {student_prenom}",
+        "filiere_lic": {"licence": "{filiere_lic}", "master": "{filiere_master|filiere_lic}"}
+      },
+      "overlay": {"student_nom": [120, 690]},       # modèles sans AcroForm : position (x, y)
+      "filename": "{student_nom} {student_prenom}"  # -> quitus_<slug>.pdf
+    }
+
+{a|b} : champ source a, ou b si a est vide. Les specs sont validées au
+démarrage contre les vrais champs du modèle puis compilées : au remplissage,
+il ne reste qu'à concaténer des chaînes (aucun parsing, aucune recherche).
+"""
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .template_cache import Template, TemplateCache
+
+log = logging.getLogger("quitus-api")
+
+DOC_TYPES = ("licence", "master")
+
+# comportement historique de quitus.pdf (utilisé si quitus.json est absent)
+DEFAULT_SPEC: Dict[str, Any] = {
+    "title": "Quitus",
+    "doc_types": list(DOC_TYPES),
+    "fields": {
+        "student_nom": "{student_nom} {student_prenom}",
+        "cin": "{cin}",
+        "filiere_lic": {"licence": "{filiere_lic}", "master": "{filiere_master|filiere_lic}"},
+    },
+    "overlay": {"student_nom": [120, 690], "cin": [160, 665], "filiere_lic": [160, 640]},
+    "filename": "{student_nom} {student_prenom}",
+}
+
+_SPEC_KEYS = {"title", "doc_types", "fields", "overlay", "filename"}
+_PLACEHOLDER = re.compile(r"\{([^{}]*)\}")
+
+# expression compilée : littéraux et alternatives de champs sources
+Token = Union[str, Tuple[str, ...]]
+Expr = Tuple[Token, ...]
+
+
+class TemplateSpecError(ValueError):
+    """Spec de modèle invalide (détail dans .errors)."""
+
+    def __init__(self, template_id: str, errors: List[str]):
+        super().__init__(f"{template_id}: " + "; ".join(errors))
+        self.template_id = template_id
+        self.errors = errors
+
+
+def compile_expr(expr: str) -> Expr:
+    """'{a} {b|c}' -> (('a',), ' ', ('b', 'c'))."""
+    out: List[Token] = []
+    pos = 0
+    for m in _PLACEHOLDER.finditer(expr):
+        if m.start() > pos:
+            out.append(expr[pos:m.start()])
+        names = tuple(n.strip() for n in m.group(1).split("|"))
+        if not all(names):
+            raise ValueError(f"empty field name in {expr!r}")
+        out.append(names)
+        pos = m.end()
+    if pos < len(expr):
+        out.append(expr[pos:])
+    return tuple(out)
+
+
+def render_expr(expr: Expr, values: Dict[str, str]) -> str:
+    parts: List[str] = []
+    for tok in expr:
+        if isinstance(tok, str):
+            parts.append(tok)
+            continue
+        for name in tok:
+            v = values.get(name, "")
+            if v:
+                parts.append(v)
+                break
+    return "".join(parts).strip()
+
+
+@dataclass(frozen=True)
+class CompiledSpec:
+    """Plan de remplissage : expressions compilées par doc_type."""
+    title: str
+    doc_types: Tuple[str, ...]
+    fields: Dict[str, Dict[str, Expr]]           # doc_type -> {champ modèle: expression}
+    overlay: Tuple[Tuple[str, float, float], ...]
+    filename: Expr
+
+    def mapping(self, doc_type: str, values: Dict[str, str]) -> Dict[str, str]:
+        return {name: render_expr(expr, values) for name, expr in self.fields[doc_type].items()}
+
+    def overlay_lines(self, mapping: Dict[str, str]) -> List[Tuple[str, float, float]]:
+        return [(mapping.get(name, ""), x, y) for name, x, y in self.overlay]
+
+    def slug_source(self, values: Dict[str, str]) -> str:
+        return render_expr(self.filename, values)
+
+
+def compile_spec(template_id: str, raw: Dict[str, Any], tpl: Optional[Template]) -> CompiledSpec:
+    """Valide la spec (et, si fourni, contre les champs du modèle) puis la compile."""
+    errors: List[str] = []
+    if not isinstance(raw, dict):
+        raise TemplateSpecError(template_id, ["spec must be a JSON object"])
+    unknown = set(raw) - _SPEC_KEYS
+    if unknown:
+        errors.append(f"unknown keys: {sorted(unknown)}")
+
+    doc_types = tuple(raw.get("doc_types") or DOC_TYPES)
+    bad = [d for d in doc_types if d not in DOC_TYPES]
+    if bad:
+        errors.append(f"unknown doc_types: {bad}")
+
+    fields: Dict[str, Dict[str, Expr]] = {d: {} for d in doc_types}
+    raw_fields = raw.get("fields")
+    if not isinstance(raw_fields, dict) or not raw_fields:
+        errors.append("'fields' must be a non-empty object")
+        raw_fields = {}
+    for target, expr in raw_fields.items():
+        per_dt = expr if isinstance(expr, dict) else {d: expr for d in doc_types}
+        extra = set(per_dt) - set(doc_types)
+        if extra:
+            errors.append(f"field {target!r}: doc_types {sorted(extra)} not declared")
+        for d in doc_types:
+            e = per_dt.get(d)
+            if not isinstance(e, str):
+                errors.append(f"field {target!r}: missing expression for {d!r}")
+                continue
+            try:
+                fields[d][target] = compile_expr(e)
+            except ValueError as exc:
+                errors.append(f"field {target!r}: {exc}")
+
+    overlay: List[Tuple[str, float, float]] = []
+    for target, pos in (raw.get("overlay") or {}).items():
+        if target not in raw_fields:
+            errors.append(f"overlay {target!r} is not in 'fields'")
+        elif (not isinstance(pos, (list, tuple)) or len(pos) != 2
+              or not all(isinstance(v, (int, float)) for v in pos)):
+            errors.append(f"overlay {target!r} must be [x, y]")
+        else:
+            overlay.append((target, float(pos[0]), float(pos[1])))
+
+    try:
+        filename = compile_expr(str(raw.get("filename", DEFAULT_SPEC["filename"])))
+    except ValueError as exc:
+        errors.append(f"filename: {exc}")
+        filename = ()
+
+    if tpl is not None:
+        if tpl.has_acroform:
+            widgets = {w.field_name for w in tpl.widgets}
+            missing = sorted(t for t in raw_fields if t not in widgets)
+            if missing:
+                errors.append(f"fields not in template AcroForm (text, page 1): {missing}")
+        elif not overlay:
+            errors.append("template has no AcroForm: 'overlay' positions are required")
+
+    if errors:
+        raise TemplateSpecError(template_id, errors)
+    return CompiledSpec(
+        title=str(raw.get("title") or template_id), doc_types=doc_types,
+        fields=fields, overlay=tuple(overlay), filename=filename,
+    )
+
+
+# ------------------------------ registre ------------------------------
+@dataclass
+class TemplateEntry:
+    id: str
+    cache: TemplateCache
+    spec_path: Optional[Path]
+    spec: Optional[CompiledSpec] = None
+    checked: Optional[Template] = None             # modèle contre lequel la spec a été validée
+    spec_mtime: Optional[int] = None               # mtime de la spec compilée (None : pas de spec)
+    errors: List[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class TemplatePlan:
+    """Ce qu'il faut pour remplir : modèle préparé + spec compilée."""
+    id: str
+    template: Template
+    spec: CompiledSpec
+
+
+class TemplateLookupError(LookupError):
+    pass
+
+
+class TemplateRegistry:
+    def __init__(self, directory: Path, default: str = "quitus"):
+        self.directory = directory
+        self.default = default
+        self._entries: Dict[str, TemplateEntry] = {}
+        self._scanned = False
+        self._lock = threading.Lock()
+
+    def scan(self) -> Dict[str, List[str]]:
+        """Charge, valide et compile tous les modèles ; renvoie les erreurs par modèle."""
+        entries: Dict[str, TemplateEntry] = {}
+        for pdf in sorted(self.directory.glob("*.pdf")):
+            spec_path = pdf.with_suffix(".json")
+            entry = TemplateEntry(pdf.stem, TemplateCache(pdf), spec_path if spec_path.exists() else None)
+            self._check(entry)
+            entries[entry.id] = entry
+        with self._lock:
+            self._entries = entries
+            self._scanned = True
+        for e in entries.values():
+            if e.errors:
+                log.error("Modèle %s ignoré : %s", e.id, "; ".join(e.errors))
+        return {e.id: e.errors for e in entries.values()}
+
+    @staticmethod
+    def _spec_mtime(entry: TemplateEntry) -> Optional[int]:
+        try:
+            return os.stat(entry.spec_path).st_mtime_ns if entry.spec_path else None
+        except FileNotFoundError:
+            return None
+
+    def _check(self, entry: TemplateEntry) -> None:
+        entry.spec_mtime = self._spec_mtime(entry)   # relevé avant lecture : une écriture concurrente sera revue
+        try:
+            tpl = entry.cache.get()
+            raw = json.loads(entry.spec_path.read_text("utf-8")) if entry.spec_path else DEFAULT_SPEC
+            entry.spec = compile_spec(entry.id, raw, tpl)
+            entry.checked, entry.errors = tpl, []
+        except TemplateSpecError as e:
+            entry.spec, entry.checked, entry.errors = None, None, e.errors
+        except Exception as e:   # JSON invalide, PDF absent ou illisible
+            entry.spec, entry.checked, entry.errors = None, None, [f"{type(e).__name__}: {e}"]
+
+    def _entry(self, template_id: Optional[str]) -> TemplateEntry:
+        if not self._scanned:
+            self.scan()
+        tid = template_id or self.default
+        entry = self._entries.get(tid)
+        if entry is None:
+            raise TemplateLookupError(tid)
+        return entry
+
+    def get(self, template_id: Optional[str] = None) -> TemplatePlan:
+        """Plan prêt à remplir. TemplateLookupError si inconnu, TemplateSpecError si invalide."""
+        entry = self._entry(template_id)
+        tpl = entry.cache.get()                      # FileNotFoundError si supprimé
+        if tpl is not entry.checked or self._spec_mtime(entry) != entry.spec_mtime:
+            with self._lock:                         # modèle ou spec modifié sur disque : revalidation
+                if tpl is not entry.checked or self._spec_mtime(entry) != entry.spec_mtime:
+                    self._check(entry)
+        if entry.spec is None:
+            raise TemplateSpecError(entry.id, entry.errors)
+        return TemplatePlan(entry.id, tpl, entry.spec)
+
+    def version(self, template_id: Optional[str] = None) -> str:
+        """Identifiant du modèle + spec (mtime, taille), sans parser le PDF."""
+        entry = self._entry(template_id)
+        st = os.stat(entry.cache.path)
+        spec = f"{os.stat(entry.spec_path).st_mtime_ns}" if entry.spec_path else "default"
+        return f"{entry.id}:{st.st_mtime_ns}-{st.st_size}:{spec}"
+
+    def describe(self) -> List[Dict[str, Any]]:
+        if not self._scanned:
+            self.scan()
+        return [
+            {"id": e.id, "title": e.spec.title if e.spec else None, "default": e.id == self.default,
+             "doc_types": list(e.spec.doc_types) if e.spec else [], "ok": not e.errors, "errors": e.errors}
+            for e in self._entries.values()
+        ]
@@ -0,0 +1,89 @@
+# API/app/ui_client.py
+"""
+Appels HTTP de l'UI Gradio quand l'API est distante (API_URL absolue), ou
+quand l'UI tourne sans pipeline in-process.
+
+- une session requests partagée : connexions keep-alive réutilisées d'un clic
+  à l'autre (plus de handshake TCP/TLS par clic)
+- réponses écrites sur disque par blocs (stream=True), jamais en mémoire
+- fichiers rendus à Gradio dans un dossier temporaire du process, purgé des
+  fichiers de plus de UI_FILE_TTL secondes
+"""
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CHUNK = 64 * 1024
+_FILENAME = re.compile(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', re.IGNORECASE)
+
+
+def filename_from(headers: Any, default: str) -> str:
+    """Nom de fichier de Content-Disposition (sans chemin), sinon default."""
+    m = _FILENAME.search(headers.get("content-disposition", "") or "")
+    name = Path(m.group(1)).name if m else ""
+    return name or default
+
+
+class UiFiles:
+    """Un sous-dossier par fichier rendu (le nom est celui vu par l'utilisateur)."""
+
+    def __init__(self, base: Optional[Path] = None, ttl: float = 3600.0):
+        self.base = base or Path(tempfile.mkdtemp(prefix="quitus-ui-"))
+        self.base.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def path_for(self, filename: str) -> Path:
+        self.sweep()
+        return Path(tempfile.mkdtemp(dir=self.base)) / filename
+
+    def sweep(self) -> None:
+        now = time.time()
+        if now - self._last_sweep < min(self.ttl, 60.0):
+            return
+        with self._lock:
+            self._last_sweep = now
+            for d in self.base.iterdir():
+                try:
+                    if now - d.stat().st_mtime > self.ttl:
+                        shutil.rmtree(d, ignore_errors=True)
+                except FileNotFoundError:
+                    pass
+
+
+class ApiClient:
+    """Session partagée (thread-safe pour nos usages : une requête = un appel)."""
+
+    def __init__(self, api_key: str = "", pool_size: int = 8, files: Optional[UiFiles] = None):
+        self.api_key = api_key
+        self.files = files or UiFiles(ttl=float(os.getenv("UI_FILE_TTL", "3600")))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def download(self, method: str, url: str, default_name: str, expect_type: Optional[str] = None,
+                 timeout: float = 90, **kwargs: Any) -> Tuple[Optional[str], str]:
+        """Appel + corps de réponse écrit par blocs -> (chemin, statut) ; (None, message) en cas d'erreur."""
+        headers: Dict[str, str] = {"X-API-Key": self.api_key} if self.api_key else {}
+        try:
+            with self.session.request(method, url, headers=headers, timeout=timeout, stream=True, **kwargs) as r:
+                ctype = (r.headers.get("content-type") or "").split(";")[0].strip().lower()
+                if r.status_code != 200 or (expect_type and ctype != expect_type):
+                    return None, f"Erreur API: {r.status_code} - {r.text[:500]}"
+                out = self.files.path_for(filename_from(r.headers, default_name))
+                with open(out, "wb") as fh:
+                    for chunk in r.iter_content(CHUNK):
+                        fh.write(chunk)
+        except requests.RequestException as e:
+            return None, f"Erreur réseau: {e}"
+        return str(out), "OK"
@@ -0,0 +1,228 @@
+# API/app/uploads.py
+"""
+Réception des PDF sources, mémoire bornée quelle que soit la taille envoyée.
+
+- UploadLimitMiddleware : refuse (413) un corps trop gros dès Content-Length,
+  ou pendant le parsing multipart si l'en-tête est absent / faux
+- spool_upload() : le corps est déjà reçu (Starlette l'a spoolé, fichier
+  temporaire au-delà de 1 Mo) ; on le relit par blocs pour le sha256 et
+  l'entête %PDF, sans le recopier : au-delà de UPLOAD_SPOOL_KB, SourcePdf
+  garde un descripteur sur ce fichier, relu via mmap
+- SourcePdf sur octets ou chemin est picklable (workers process) ; sur
+  descripteur, il ne sert que dans le process (cf. need_path)
+"""
+import hashlib
+import io
+import json
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Union
+
+from fastapi import HTTPException, UploadFile
+
+CHUNK = 64 * 1024
+MULTIPART_SLACK = 64 * 1024   # entêtes multipart + champs de formulaire
+
+
+@dataclass
+class SourcePdf:
+    """PDF source reçu : en mémoire (petit), fichier temporaire ou descripteur sur le spool de l'upload."""
+    size: int
+    sha256: Any = None                 # hashlib (non picklable) : côté requête seulement
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+    fd: Optional[int] = None           # fichier spoolé par Starlette (dup : survit à sa fermeture)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        if self.fd is not None and self.path is None:
+            raise TypeError("SourcePdf sur descripteur : non transmissible à un autre process (need_path)")
+        return dict(self.__dict__, sha256=None, fd=None)
+
+    @contextmanager
+    def open(self) -> Iterator[Union[bytes, mmap.mmap]]:
+        """Tampon lisible par PdfReader (mmap : pages chargées à la demande par l'OS)."""
+        if self.path is None and self.fd is None:
+            yield self.data or b""
+            return
+        with self.stream() as fh:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mm
+            finally:
+                mm.close()
+
+    def stream(self) -> BinaryIO:
+        """Fichier binaire indépendant (position propre), à fermer par l'appelant."""
+        if self.path is not None:
+            return open(self.path, "rb")
+        if self.fd is not None:
+            return os.fdopen(os.dup(self.fd), "rb")
+        return io.BytesIO(self.data or b"")
+
+    def read(self) -> bytes:
+        with self.open() as buf:
+            return bytes(buf)
+
+    def cleanup(self) -> None:
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def source_from_bytes(data: bytes, limit: int) -> SourcePdf:
+    """Source déjà en mémoire (UI Gradio in-process) : mêmes contrôles que spool_upload."""
+    if len(data) > limit:
+        raise too_large(limit)
+    if not data.startswith(b"%PDF"):
+        raise HTTPException(status_code=400, detail="Invalid or empty PDF (missing %PDF header)")
+    return SourcePdf(size=len(data), sha256=hashlib.sha256(data), data=data)
+
+
+def too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload too large (max {limit // (1024 * 1024)} MB)")
+
+
+def _dup_fileno(upload: UploadFile) -> Optional[int]:
+    """Descripteur à nous sur le fichier de l'upload, ou None s'il n'est pas sur disque."""
+    try:
+        return os.dup(upload.file.fileno())   # SpooledTemporaryFile : bascule sur disque si besoin
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+async def spool_upload(upload: UploadFile, limit: int, spool_bytes: int,
+                       spool_dir: Optional[Path] = None, check_pdf: bool = True,
+                       need_path: bool = False) -> SourcePdf:
+    """
+    Source bornée depuis l'upload reçu (400 si pas %PDF, 413 au-delà de limit).
+    Au-delà de spool_bytes, aucune copie : descripteur sur le fichier de
+    l'upload, sauf need_path (workers process) -> copie dans spool_dir.
+
+    check_pdf=False : contenu quelconque (lots : PDF ou ZIP, erreurs par fichier dans le manifeste).
+    """
+    if upload.size is not None and upload.size > limit:
+        raise too_large(limit)
+    h = hashlib.sha256()
+    buf: Optional[io.BytesIO] = io.BytesIO()
+    fh = None
+    fd = None
+    size = 0
+    try:
+        await upload.seek(0)
+        while True:
+            chunk = await upload.read(CHUNK)
+            if not chunk:
+                break
+            if check_pdf and size == 0 and not chunk.startswith(b"%PDF"):
+                raise HTTPException(status_code=400, detail="Invalid or empty PDF (missing %PDF header)")
+            size += len(chunk)
+            if size > limit:
+                raise too_large(limit)
+            h.update(chunk)
+            if buf is not None and size > spool_bytes:
+                # au-delà du seuil : la mémoire ne dépasse plus spool_bytes
+                fd = None if need_path else _dup_fileno(upload)
+                if fd is None:
+                    fh = tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", dir=spool_dir, delete=False)
+                    fh.write(buf.getbuffer())
+                buf = None
+            if fh is not None:
+                fh.write(chunk)
+            elif buf is not None:
+                buf.write(chunk)
+        if check_pdf and size == 0:
+            raise HTTPException(status_code=400, detail="Invalid or empty PDF (missing %PDF header)")
+    except BaseException:
+        if fh is not None:
+            fh.close()
+            os.unlink(fh.name)
+        if fd is not None:
+            os.close(fd)
+        raise
+    if buf is not None:
+        return SourcePdf(size=size, sha256=h, data=buf.getvalue())
+    if fd is not None:
+        return SourcePdf(size=size, sha256=h, fd=fd)
+    fh.close()
+    return SourcePdf(size=size, sha256=h, path=fh.name)
+
+
+async def save_upload(upload: UploadFile, dest: Path, limit: int) -> str:
+    """Copie bornée d'un upload quelconque (archive) vers dest ; renvoie son sha256."""
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(dest, "wb") as fh:
+            while True:
+                chunk = await upload.read(CHUNK)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise too_large(limit)
+                h.update(chunk)
+                fh.write(chunk)
+    except BaseException:
+        dest.unlink(missing_ok=True)
+        raise
+    return h.hexdigest()
+
+
+# ------------------------------ middleware ------------------------------
+class UploadLimitMiddleware:
+    """Taille max du corps par route (préfixe de chemin), vérifiée en streaming."""
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        # préfixe le plus long d'abord : /process/batch avant /process
+        self.limits = sorted(limits.items(), key=lambda kv: -len(kv[0]))
+
+    def _limit(self, path: str) -> Optional[int]:
+        for prefix, limit in self.limits:
+            if path == prefix or path.startswith(prefix + "/"):
+                return limit
+        return None
+
+    async def __call__(self, scope, receive, send):
+        limit = self._limit(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit + MULTIPART_SLACK:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+
+        async def _receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit + MULTIPART_SLACK:
+                    raise too_large(limit)   # remonte via le parsing du formulaire -> 413
+            return message
+
+        await self.app(scope, _receive, send)
+
+    @staticmethod
+    async def _reject(send, limit: int) -> None:
+        body = json.dumps({"detail": too_large(limit).detail}).encode()
+        await send({"type": "http.response.start", "status": 413, "headers": [
+            (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+            (b"connection", b"close"),
+        ]})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,124 @@
+# API/bench/bench_admission.py
+"""
+Étudiants sur /process pendant qu'un service envoie des lots : latence
+interactive et débit bulk, avec et sans contrôle d'admission.
+
+    cd API
+    python -m bench.bench_admission                          # 4 étudiants, 2 lots de 60 fichiers
+    python -m bench.bench_admission --students 8 --batches 4 --files 100 --workers 4
+
+Par mode (ADMISSION_ENABLED=1 puis 0, même process, sources distinctes) :
+- latence /process des étudiants (p50/p95/max), un upload à la fois chacun
+- débit des lots (/process/batch, fichiers/s) : la capacité libre doit rester
+  utilisée par le bulk
+Puis vérification du quota par client (ADMISSION_RATE) : rafale d'un client
+au-delà de ADMISSION_BURST -> 429, même en changeant d'X-Client-Id à chaque
+requête ; un autre client n'est pas touché.
+
+Chaque client simulé a sa propre adresse, transmise en X-Forwarded-For par le
+transport ASGI (127.0.0.1, déclaré dans ADMISSION_TRUSTED_PROXIES).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+from .run import pct
+from .synth import make_source_pdf
+
+
+def _from(ip: str) -> dict:
+    return {"X-Forwarded-For": ip}
+
+
+async def _student(c, sid: int, tag: str, stop: asyncio.Event, lat: List[float], think: float) -> None:
+    i = 0
+    while not stop.is_set():
+        src = make_source_pdf(values={"cin": f"{tag}{sid:02d}{i:05d}"})
+        t = time.perf_counter()
+        r = await c.post("/process", files={"source_pdf": ("s.pdf", src, "application/pdf")},
+                         data={"doc_type": "licence"}, headers=_from(f"10.0.0.{sid + 1}"))
+        if r.status_code == 200:
+            lat.append(time.perf_counter() - t)
+        i += 1
+        await asyncio.sleep(think)
+
+
+async def _batch(c, b: int, tag: str, files: int) -> int:
+    srcs = [("source_pdfs", (f"f{i}.pdf", make_source_pdf(values={"cin": f"{tag}b{b}{i:05d}"}), "application/pdf"))
+            for i in range(files)]
+    r = await c.post("/process/batch", files=srcs, data={"doc_type": "licence"},
+                     headers=_from(f"10.0.1.{b + 1}"), timeout=None)
+    return r.status_code
+
+
+async def _run(m, args, enabled: bool) -> None:
+    import httpx
+
+    m.ADMISSION.enabled = enabled
+    tag = "A" if enabled else "N"
+    lat: List[float] = []
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=m.app), base_url="http://bench",
+                                 timeout=None) as c:
+        students = [asyncio.create_task(_student(c, s, tag, stop, lat, args.think)) for s in range(args.students)]
+        await asyncio.sleep(args.think)   # régime établi avant les lots
+        t = time.perf_counter()
+        statuses = await asyncio.gather(*[_batch(c, b, tag, args.files) for b in range(args.batches)])
+        bulk = time.perf_counter() - t
+        stop.set()
+        await asyncio.gather(*students)
+    files = args.batches * args.files
+    print(f"admission={'on ' if enabled else 'off'}  interactive n={len(lat):<4} p50={pct(lat, 50) * 1e3:7.0f}ms "
+          f"p95={pct(lat, 95) * 1e3:7.0f}ms max={max(lat, default=0) * 1e3:7.0f}ms   "
+          f"bulk {files} fichiers en {bulk:5.1f}s ({files / bulk:5.1f}/s) statuts={sorted(set(statuses))}")
+
+
+async def _check_rate(m) -> bool:
+    import httpx
+
+    m.ADMISSION.enabled, m.ADMISSION.rate, m.ADMISSION.burst = True, 1.0, 5
+    src = make_source_pdf(values={"cin": "R0000001"})   # même source : servie par le cache après le 1er
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=m.app), base_url="http://bench") as c:
+        async def post(ip: str, client_id: str = "") -> int:
+            r = await c.post("/process", files={"source_pdf": ("s.pdf", src, "application/pdf")},
+                             data={"doc_type": "licence"}, headers={**_from(ip), "X-Client-Id": client_id})
+            return r.status_code
+        burst = [await post("10.0.2.1", f"script-{i}") for i in range(12)]   # identifiant renouvelé : ignoré
+        other = await post("10.0.2.2")
+    ok = burst.count(200) == 5 and burst.count(429) == 7 and other == 200
+    print(f"quota 1 req/s, rafale 5 : script {burst.count(200)}x200 {burst.count(429)}x429, "
+          f"autre client {other}  {'OK' if ok else 'KO'}")
+    return ok
+
+
+async def amain(args) -> int:
+    import app.main as m   # après l'environnement
+
+    m.PIPELINE.warm()
+    for enabled in (True, False):
+        await _run(m, args, enabled)
+    return 0 if await _check_rate(m) else 1
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--students", type=int, default=4)
+    ap.add_argument("--batches", type=int, default=2)
+    ap.add_argument("--files", type=int, default=60, help="fichiers par lot")
+    ap.add_argument("--think", type=float, default=0.2, help="pause entre deux uploads d'un étudiant (s)")
+    ap.add_argument("--workers", type=int, default=0, help="PIPELINE_WORKERS (0 = nb de cœurs)")
+    args = ap.parse_args(argv)
+
+    os.environ.update({
+        "DATA_DIR": tempfile.mkdtemp(prefix="quitus-bench-adm-"), "API_KEY": "", "UI_ENABLED": "0",
+        "PIPELINE_WORKERS": str(args.workers), "ADMISSION_TRUSTED_PROXIES": '["127.0.0.1"]',
+    })
+    return asyncio.run(amain(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
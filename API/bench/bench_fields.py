@@ -0,0 +1,57 @@
+# API/bench/bench_fields.py
+"""
+Micro-benchmark : extraction des champs, get_fields() de pypdf vs fields.extract_values.
+
+    cd API
+    python -m bench.bench_fields                       # formulaires synthétiques
+    python -m bench.bench_fields chemin/*.pdf          # vrais formulaires étudiants
+"""
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from pypdf import PdfReader
+
+from app.fields import extract_values
+from app.pipeline import extract_all_values, get_fields
+
+from .synth import make_source_pdf
+
+
+def _time(fn: Callable[[bytes], Dict[str, str]], data: bytes, repeat: int) -> Tuple[float, Dict[str, str]]:
+    samples: List[float] = []
+    out: Dict[str, str] = {}
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(data)   # parse inclus : PdfReader est paresseux, le coût est dans le parcours
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples), out
+
+
+def current_path(data: bytes) -> Dict[str, str]:
+    return extract_all_values(get_fields(PdfReader(io.BytesIO(data), strict=False)))
+
+
+def fast_path(data: bytes) -> Dict[str, str]:
+    return extract_values(PdfReader(io.BytesIO(data), strict=False))
+
+
+def main(argv: List[str]) -> None:
+    if argv:
+        cases = [(Path(p).name, Path(p).read_bytes()) for p in argv]
+    else:
+        cases = [(f"synth_{n}f_{p}p", make_source_pdf(n_fields=n, pages=p))
+                 for n, p in ((5, 1), (50, 1), (200, 4), (500, 10))]
+    repeat = 30
+    print(f"{'document':<28}{'fields':>8}{'get_fields ms':>16}{'fast ms':>10}{'speedup':>9}  same")
+    for name, data in cases:
+        t_cur, ref = _time(current_path, data, repeat)
+        t_fast, got = _time(fast_path, data, repeat)
+        print(f"{name:<28}{len(ref):>8}{t_cur * 1e3:>16.2f}{t_fast * 1e3:>10.2f}{t_cur / t_fast:>8.1f}x  {ref == got}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,79 @@
+# API/bench/bench_import.py
+"""
+Import en masse (app.bulk_import) : débit selon le nombre de workers, mémoire.
+
+    cd API
+    python -m bench.bench_import                         # 2000 PDF, workers 1,2,4,...,nb de cœurs
+    python -m bench.bench_import --files 20000 --workers 4
+
+Les PDF synthétiques sont écrits une fois dans un dossier temporaire (10 % de
+cin en double). Chaque run repart d'un store et d'un checkpoint vides ; le
+RSS du process parent est relevé avant/après (doit rester plat).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from .run import peak_rss_mb
+from .synth import make_source_pdf
+
+
+def _make_files(root: Path, n: int) -> None:
+    for i in range(n):
+        cin = f"{i % max(1, n - n // 10):08d}"   # les n/10 derniers reprennent des cin existants
+        sub = root / f"lot_{i // 500:03d}"
+        sub.mkdir(exist_ok=True)
+        (sub / f"{i:06d}.pdf").write_bytes(make_source_pdf(values={"cin": cin}))
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=2000)
+    ap.add_argument("--workers", default=None, help="liste, ex. 1,2,4 (défaut : puissances de 2 jusqu'au nb de cœurs)")
+    ap.add_argument("--batch-rows", type=int, default=500)
+    args = ap.parse_args(argv)
+
+    from app.bulk_import import Checkpoint, run_import
+    from app.local_store import LocalStore
+
+    cores = os.cpu_count() or 2
+    if args.workers:
+        counts = [int(w) for w in args.workers.split(",")]
+    else:
+        counts = [w for w in (1, 2, 4, 8, 16, 32, 64) if w < cores] + [cores]
+
+    with tempfile.TemporaryDirectory(prefix="quitus-bench-import-") as tmp:
+        src = Path(tmp) / "src"
+        src.mkdir()
+        t0 = time.perf_counter()
+        _make_files(src, args.files)
+        print(f"{args.files} PDF générés en {time.perf_counter() - t0:.1f}s")
+
+        base = None
+        for w in counts:
+            run_dir = Path(tmp) / f"run_{w}"
+            run_dir.mkdir()
+            store = LocalStore(run_dir / "store.sqlite3")
+
+            def persist(doc_type: str, rows: List[Dict[str, str]]) -> None:
+                store.append_rows("Licence", rows)
+
+            cp = Checkpoint(run_dir / "checkpoint.sqlite3")
+            rss0 = peak_rss_mb()
+            t0 = time.perf_counter()
+            stats = run_import(src, "licence", persist, cp, workers=w, batch_rows=args.batch_rows)
+            wall = time.perf_counter() - t0
+            cp.close()
+            rate = stats.processed / wall
+            base = base or rate
+            print(f"workers={w:<3} {rate:8.1f} fichiers/s  x{rate / base:4.1f}  ok={stats.ok} "
+                  f"doublons={stats.duplicate} erreurs={stats.error}  rss max {rss0:.0f} -> {peak_rss_mb():.0f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# API/bench/bench_output.py
+"""
+Sortie "form" (formulaire interactif, NeedAppearances) contre "flat" (champs
+aplatis, sans AcroForm, flux compressés) : génération, taille, rendu.
+
+    cd API
+    python -m bench.bench_output                     # modèle par défaut, 50 quitus par mode
+    python -m bench.bench_output --count 500 --dpi 150
+
+Mesures par mode :
+- génération côté serveur (render_quitus, p50/p95)
+- taille d'un quitus, et de `count` quitus en ZIP (archivage / envoi par mail)
+- rendu de la page 0 (p50/p95) si PyMuPDF est installé (pip install pymupdf) :
+  c'est le coût payé par un lecteur ou le serveur d'impression à l'ouverture
+  (régénération des apparences en mode "form")
+"""
+import argparse
+import io
+import sys
+import time
+import zipfile
+from typing import Dict, List
+
+from .run import pct
+
+
+def _ms(samples: List[float]) -> str:
+    return f"p50={pct(samples, 50) * 1e3:7.2f}ms p95={pct(samples, 95) * 1e3:7.2f}ms"
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--count", type=int, default=50)
+    ap.add_argument("--template", default=None, help="id du modèle (défaut : quitus)")
+    ap.add_argument("--dpi", type=int, default=100, help="résolution du rendu")
+    args = ap.parse_args(argv)
+
+    from app.pipeline import OUTPUT_MODES, render_quitus
+
+    try:
+        import pymupdf
+    except ImportError:
+        pymupdf = None
+        print("PyMuPDF absent : temps de rendu non mesurés")
+
+    values = [{"cin": f"{i:08d}", "student_nom": f"Ben Salah {i}", "student_prenom": "Amira",
+               "filiere_lic": "Génie Logiciel"} for i in range(args.count)]
+    render_quitus("licence", values[0], args.template, "flat")   # copies préparées créées hors mesure
+
+    base: Dict[str, float] = {}
+    for mode in OUTPUT_MODES:
+        gen, outputs = [], []
+        for v in values:
+            t = time.perf_counter()
+            _, pdf = render_quitus("licence", v, args.template, mode)
+            gen.append(time.perf_counter() - t)
+            outputs.append(pdf)
+
+        zbuf = io.BytesIO()
+        with zipfile.ZipFile(zbuf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for i, pdf in enumerate(outputs):
+                zf.writestr(f"quitus_{i}.pdf", pdf)
+        size, zsize = len(outputs[0]), zbuf.tell()
+        base.setdefault("size", size)
+        base.setdefault("zip", zsize)
+        line = (f"{mode:<5} génération {_ms(gen)}  {size / 1024:7.1f} Ko/quitus (x{size / base['size']:.2f})"
+                f"  zip de {args.count} : {zsize / 1024:8.1f} Ko (x{zsize / base['zip']:.2f})")
+
+        if pymupdf is not None:
+            rnd = []
+            for pdf in outputs:
+                t = time.perf_counter()
+                with pymupdf.open(stream=pdf, filetype="pdf") as doc:
+                    doc[0].get_pixmap(dpi=args.dpi)
+                rnd.append(time.perf_counter() - t)
+            line += f"  rendu {_ms(rnd)}"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
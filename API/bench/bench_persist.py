@@ -0,0 +1,127 @@
+# API/bench/bench_persist.py
+"""
+Stress de la persistance locale : plusieurs process (workers uvicorn) x
+plusieurs threads (pool io du pipeline) écrivent en même temps dans le même
+store SQLite, une ligne par appel comme /process.
+
+    cd API
+    python -m bench.bench_persist                            # 1,2,4 process x 8 threads, 200 lignes par thread
+    python -m bench.bench_persist --procs 1,4,8 --threads 16 --rows 500 --fields 300
+
+Modes comparés :
+- direct : LocalStore.append_rows à chaque appel (une transaction par ligne)
+- group  : group_commit.GroupCommitter (une transaction par lot, par process)
+
+Chaque run repart d'un store vide et vérifie ensuite : aucune ligne perdue ni
+en double, entête sans doublon, chaque ligne alignée sur ses propres colonnes
+(chaque thread ajoute une colonne qui lui est propre). Code retour 1 sinon.
+"""
+import argparse
+import multiprocessing as mp
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+
+def _writer(db: str, mode: str, proc: int, threads: int, rows: int, fields: int, start, out) -> None:
+    from app.group_commit import GroupCommitter
+    from app.local_store import LocalStore
+
+    store = LocalStore(Path(db))
+    gc = GroupCommitter(store.append_batch) if mode == "group" else None
+    base = {f"field_{i:03d}": f"value {i}" for i in range(fields)}
+    errors: List[str] = []
+
+    def run(t: int) -> None:
+        own = f"w{proc}_{t}"
+        for i in range(rows):
+            values = dict(base, cin=f"{proc:02d}{t:03d}{i:05d}", marker=own, **{own: own})
+            try:
+                if gc is not None:
+                    gc.submit("Licence", [values])
+                else:
+                    store.append_rows("Licence", [values])
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    start.wait()
+    t0 = time.perf_counter()
+    for th in pool:
+        th.start()
+    for th in pool:
+        th.join()
+    if gc is not None:
+        gc.close()
+    out.put((time.perf_counter() - t0, errors))
+
+
+def _check(db: Path, expected: int) -> List[str]:
+    from app.local_store import LocalStore
+
+    store = LocalStore(db)
+    problems = []
+    table = store.iter_table("Licence")
+    header = next(table)
+    if len(header) != len(set(header)):
+        problems.append("entête avec doublons")
+    i_cin, i_marker = header.index("cin"), header.index("marker")
+    cins: Counter = Counter()
+    for row in table:
+        cins[row[i_cin]] += 1
+        marker = row[i_marker]
+        if marker not in header or row[header.index(marker)] != marker:
+            problems.append(f"ligne désalignée (cin {row[i_cin]})")
+    if len(cins) != expected:
+        problems.append(f"{len(cins)} lignes distinctes, {expected} attendues")
+    dups = sum(n - 1 for n in cins.values() if n > 1)
+    if dups:
+        problems.append(f"{dups} ligne(s) en double")
+    return problems[:10]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--procs", default="1,2,4")
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--rows", type=int, default=200, help="lignes par thread")
+    ap.add_argument("--fields", type=int, default=80, help="champs par ligne")
+    ap.add_argument("--modes", default="direct,group")
+    args = ap.parse_args(argv)
+
+    ctx = mp.get_context("spawn")   # comme des workers uvicorn : rien de partagé en mémoire
+    failed = 0
+    base: Dict[str, float] = {}
+    for mode in args.modes.split(","):
+        for procs in (int(p) for p in args.procs.split(",")):
+            with tempfile.TemporaryDirectory(prefix="quitus-bench-persist-") as tmp:
+                db = Path(tmp) / "store.sqlite3"
+                start, out = ctx.Barrier(procs), ctx.Queue()
+                workers = [ctx.Process(target=_writer, args=(str(db), mode, p, args.threads, args.rows,
+                                                              args.fields, start, out)) for p in range(procs)]
+                for w in workers:
+                    w.start()
+                results = [out.get() for _ in workers]
+                for w in workers:
+                    w.join()
+                wall = max(r[0] for r in results)
+                errors = [e for r in results for e in r[1]]
+                total = procs * args.threads * args.rows
+                problems = _check(db, total - len(errors))
+                rate = total / wall
+                base.setdefault(mode, rate)
+                failed += bool(problems or errors)
+                print(f"{mode:<7} procs={procs:<3} threads={args.threads:<3} {rate:9.0f} lignes/s "
+                      f"(x{rate / base[mode]:.2f})  erreurs={len(errors)}  "
+                      f"{'OK' if not problems else '; '.join(problems)}")
+                for e in errors[:3]:
+                    print("   ", e)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+# API/bench/bench_response.py
+"""
+Chemin de réponse d'un quitus : ancien StreamingResponse(BytesIO(pdf)) contre
+responses.BytesResponse, rejoué directement en ASGI (sans réseau).
+
+    cd API
+    python -m bench.bench_response                   # 200 réponses par variante
+    python -m bench.bench_response --count 1000 --output form
+
+Mesures par réponse :
+- messages ASGI envoyés et présence de Content-Length
+- octets recopiés hors du PDF d'origine (corps envoyés qui ne sont ni le PDF
+  ni une vue memoryview dessus)
+- pic mémoire et blocs alloués encore vivants après l'envoi (tracemalloc,
+  sur --traced réponses)
+- temps d'envoi (p50/p95), mesuré hors tracemalloc
+
+Puis vérifications : /process en un seul envoi avec Content-Length, Range et
+If-None-Match sur /jobs/{id}/result ; code retour 1 si une vérification échoue.
+(Le test tests/test_responses.py vérifie la même absence de copie.)
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from .run import pct
+
+
+def _scope(method: str = "POST", headers: Optional[Dict[str, str]] = None) -> dict:
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return {"type": "http", "method": method, "path": "/", "headers": raw}
+
+
+async def _send_all(response, scope: dict) -> List[dict]:
+    sent: List[dict] = []
+
+    async def receive():   # client toujours connecté (sinon StreamingResponse s'arrête)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    await response(scope, receive, send)
+    return sent
+
+
+def _copied(messages: List[dict], pdf: bytes) -> int:
+    n = 0
+    for m in messages:
+        body = m.get("body")
+        if not body:
+            continue
+        if body is pdf or (isinstance(body, memoryview) and body.obj is pdf):
+            continue
+        n += len(body)
+    return n
+
+
+async def _measure(name: str, make, pdf: bytes, count: int, traced: int) -> None:
+    times: List[float] = []
+    for _ in range(count):   # temps sans tracemalloc (qui ralentit chaque allocation)
+        t = time.perf_counter()
+        messages = await _send_all(make(pdf), _scope())
+        times.append(time.perf_counter() - t)
+    peaks, blocks = [], []
+    for _ in range(traced):
+        tracemalloc.start()
+        base_blocks = len(tracemalloc.take_snapshot().traces)
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        messages = await _send_all(make(pdf), _scope())
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        blocks.append(len(tracemalloc.take_snapshot().traces) - base_blocks)
+        tracemalloc.stop()
+    length = dict(messages[0]["headers"]).get(b"content-length")
+    print(f"{name:<10} messages={len(messages):<5} Content-Length={'oui' if length else 'non':<4}"
+          f" recopié={_copied(messages, pdf) / 1024:6.1f} Ko  pic={pct(peaks, 50) / 1024:6.1f} Ko"
+          f"  blocs={pct(blocks, 50):5.0f}  envoi p50={pct(times, 50) * 1e3:6.3f}ms p95={pct(times, 95) * 1e3:6.3f}ms")
+
+
+def _check(label: str, ok: bool, problems: List[str]) -> None:
+    print(f"  {'OK ' if ok else 'KO '} {label}")
+    if not ok:
+        problems.append(label)
+
+
+async def _checks(pdf: bytes) -> List[str]:
+    from app.responses import BytesResponse
+
+    problems: List[str] = []
+    msgs = await _send_all(BytesResponse(pdf, media_type="application/pdf"), _scope())
+    hdrs = {k.decode(): v.decode() for k, v in msgs[0]["headers"]}
+    _check("un seul envoi, sans copie, Content-Length", len(msgs) == 2 and msgs[1]["body"] is pdf
+           and hdrs["content-length"] == str(len(pdf)), problems)
+    return problems
+
+
+async def _check_jobs(pdf_source: bytes) -> List[str]:
+    import httpx
+
+    os.environ.update({"DATA_DIR": tempfile.mkdtemp(prefix="quitus-bench-resp-"), "API_KEY": "", "UI_ENABLED": "0"})
+    import app.main as m   # après l'environnement
+
+    problems: List[str] = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=m.app), base_url="http://bench") as c:
+        files = {"source_pdf": ("s.pdf", pdf_source, "application/pdf")}
+        r = await c.post("/process", files=files, data={"doc_type": "licence"})
+        _check("/process : Content-Length", r.status_code == 200
+               and r.headers.get("content-length") == str(len(r.content)), problems)
+        job = (await c.post("/jobs", files=files, data={"doc_type": "licence"})).json()
+        for _ in range(200):
+            r = await c.get(f"/jobs/{job['id']}/result")
+            if r.status_code != 409:
+                break
+            await asyncio.sleep(0.02)
+        etag, full = r.headers.get("etag"), r.content
+        r = await c.get(f"/jobs/{job['id']}/result", headers={"Range": "bytes=0-99"})
+        _check("/jobs/{id}/result : Range", r.status_code == 206 and r.content == full[:100], problems)
+        r = await c.get(f"/jobs/{job['id']}/result", headers={"If-None-Match": etag or ""})
+        _check("/jobs/{id}/result : If-None-Match -> 304", r.status_code == 304, problems)
+    return problems
+
+
+async def amain(args) -> int:
+    from starlette.responses import StreamingResponse
+
+    from app.pipeline import render_quitus
+    from app.responses import BytesResponse
+
+    _, pdf = render_quitus("licence", {"cin": "12345678", "student_nom": "Ben Salah",
+                                       "student_prenom": "Amira"}, None, args.output)
+    print(f"quitus {args.output} : {len(pdf) / 1024:.1f} Ko")
+    await _measure("streaming", lambda b: StreamingResponse(io.BytesIO(b), media_type="application/pdf"),
+                   pdf, args.count, args.traced)
+    await _measure("bytes", lambda b: BytesResponse(b, media_type="application/pdf"), pdf, args.count, args.traced)
+
+    print("vérifications :")
+    problems = await _checks(pdf)
+    if not args.no_app:
+        from .synth import make_source_pdf
+        problems += await _check_jobs(make_source_pdf(values={"cin": "12345678"}))
+    return 1 if problems else 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--count", type=int, default=200)
+    ap.add_argument("--traced", type=int, default=10, help="réponses mesurées sous tracemalloc")
+    ap.add_argument("--output", default="flat", help="form | flat")
+    ap.add_argument("--no-app", action="store_true", help="sans les vérifications sur l'application")
+    args = ap.parse_args(argv)
+    return asyncio.run(amain(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+# API/bench/bench_startup.py
+"""
+Démarrage à froid : import de app.main, hooks de startup, première réponse /health.
+
+    cd API
+    python -m bench.bench_startup                      # API seule vs API + UI
+    python -m bench.bench_startup --runs 5 --out bench/results/startup.json
+
+Chaque mesure tourne dans un interpréteur neuf (imports non mis en cache),
+avec DATA_DIR temporaire. Rapporte, par scénario (médiane des runs) :
+- import_ms   : import app.main
+- startup_ms  : hooks startup (migration, modèle préchargé, workers)
+- health_ms   : premier GET /health via l'app ASGI
+- total_ms    : lancement du process -> réponse /health (interpréteur inclus)
+- rss_mb      : mémoire résidente du worker après /health
+- heavy       : dépendances lourdes effectivement importées
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+API_DIR = Path(__file__).resolve().parents[1]
+
+SCENARIOS = {
+    "api": {"UI_ENABLED": "0"},
+    "api+ui": {"UI_ENABLED": "1"},
+    "api+process": {"UI_ENABLED": "0", "PIPELINE_BACKEND": "process", "PIPELINE_WORKERS": "2"},
+}
+HEAVY = ("gradio", "gspread", "google.oauth2", "openpyxl", "reportlab.pdfgen", "requests")
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss   # max, à défaut du courant
+    return r / 1024 / 1024 if sys.platform == "darwin" else r / 1024
+
+
+def child() -> None:
+    """Mesure dans le process courant, résultat JSON sur stdout."""
+    import asyncio
+
+    t0 = time.perf_counter()
+    import app.main as m
+    t_import = time.perf_counter() - t0
+
+    async def main() -> Dict[str, Any]:
+        import httpx
+
+        # protocole lifespan ASGI minimal : startup, puis shutdown à la fin
+        inbox: "asyncio.Queue[dict]" = asyncio.Queue()
+        started = asyncio.get_running_loop().create_future()
+
+        async def send(message):
+            if message["type"].startswith("lifespan.startup") and not started.done():
+                started.set_result(message)
+
+        t1 = time.perf_counter()
+        inbox.put_nowait({"type": "lifespan.startup"})
+        task = asyncio.create_task(m.app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}},
+                                         inbox.get, send))
+        msg = await started
+        if msg["type"].endswith("failed"):
+            raise RuntimeError(msg.get("message"))
+        t_startup = time.perf_counter() - t1
+        t2 = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=m.app), base_url="http://bench") as c:
+            r = await c.get("/health")
+        t_health = time.perf_counter() - t2
+        out = {
+            "import_ms": t_import * 1e3, "startup_ms": t_startup * 1e3, "health_ms": t_health * 1e3,
+            "status": r.status_code, "rss_mb": _rss_mb(),
+            "heavy": [mod for mod in HEAVY if mod in sys.modules],
+        }
+        inbox.put_nowait({"type": "lifespan.shutdown"})
+        await task
+        return out
+
+    print(json.dumps(asyncio.run(main())))
+
+
+def run_once(env: Dict[str, str]) -> Dict[str, Any]:
+    full = dict(os.environ, DATA_DIR=tempfile.mkdtemp(prefix="quitus-bench-start-"), API_KEY="", **env)
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, "-m", "bench.bench_startup", "--child"], cwd=API_DIR, env=full,
+                       capture_output=True, text=True, timeout=300)
+    total = time.perf_counter() - t0
+    if p.returncode != 0:
+        return {"error": (p.stderr.strip().splitlines() or ["?"])[-1]}
+    out = json.loads(p.stdout.strip().splitlines()[-1])
+    out["total_ms"] = total * 1e3
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--out", type=Path, default=None)
+    args = ap.parse_args(argv)
+    if args.child:
+        child()
+        return 0
+
+    results: List[Dict[str, Any]] = []
+    for name in args.scenarios.split(","):
+        runs = [run_once(SCENARIOS[name]) for _ in range(args.runs)]
+        ok = [r for r in runs if "error" not in r]
+        if not ok:
+            print(f"{name:<12} échec : {runs[0]['error']}")
+            results.append({"scenario": name, "error": runs[0]["error"]})
+            continue
+        row: Dict[str, Any] = {"scenario": name, "runs": len(ok), "heavy": ok[-1]["heavy"]}
+        for k in ("import_ms", "startup_ms", "health_ms", "total_ms", "rss_mb"):
+            row[k] = statistics.median(r[k] for r in ok)
+        results.append(row)
+        print(f"{name:<12} import={row['import_ms']:7.0f}ms startup={row['startup_ms']:7.0f}ms "
+              f"health={row['health_ms']:5.1f}ms total={row['total_ms']:7.0f}ms rss={row['rss_mb']:5.0f}MB "
+              f"heavy={','.join(row['heavy']) or '-'}")
+
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
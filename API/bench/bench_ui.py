@@ -0,0 +1,128 @@
+# API/bench/bench_ui.py
+"""
+Latence d'un clic UI (« Remplir et télécharger », « Télécharger l'Excel »),
+de l'appel du callback au fichier prêt sur disque.
+
+    cd API
+    python -m bench.bench_ui                       # 50 clics par scénario
+    python -m bench.bench_ui --clicks 200 --size-mb 4
+
+Scénarios :
+- legacy    : ancien callback, requests.post/get sans session, r.content en mémoire
+- pooled    : ui_client.ApiClient (session keep-alive partagée, corps écrit par blocs)
+- inprocess : API dans le même process (job local / export direct, sans HTTP)
+
+Le serveur est un vrai uvicorn sur 127.0.0.1 (sans TLS : en production, derrière
+https, le gain du keep-alive est plus grand). Cache de résultats coupé, sources
+toutes distinctes : chaque clic fait vraiment le traitement.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from .run import pct
+from .synth import make_source_pdf
+
+
+def legacy_click(url: str, payload: bytes) -> str:
+    """Reproduction de l'ancien build_ui.fill_quitus / download_excel."""
+    import requests
+    if payload:
+        r = requests.post(url, files={"source_pdf": ("source.pdf", payload, "application/pdf")},
+                          data={"doc_type": "licence"}, timeout=90)
+    else:
+        r = requests.get(url, timeout=60)
+    r.raise_for_status()
+    out = os.path.join(tempfile.mkdtemp(), "out.bin")
+    with open(out, "wb") as f:
+        f.write(r.content)
+    return out
+
+
+async def _clicks(fn: Callable[[int], object], n: int, threaded: bool) -> List[float]:
+    samples = []
+    for i in range(n):
+        t = time.perf_counter()
+        if threaded:
+            await asyncio.to_thread(fn, i)   # callbacks Gradio synchrones : thread du pool
+        else:
+            await fn(i)
+        samples.append(time.perf_counter() - t)
+    return samples
+
+
+def _report(name: str, samples: List[float]) -> Dict[str, float]:
+    row = {"p50_ms": pct(samples, 50) * 1e3, "p95_ms": pct(samples, 95) * 1e3,
+           "mean_ms": statistics.fmean(samples) * 1e3}
+    print(f"{name:<22} p50={row['p50_ms']:8.2f}ms p95={row['p95_ms']:8.2f}ms mean={row['mean_ms']:8.2f}ms")
+    return row
+
+
+async def main_async(args) -> None:
+    import uvicorn
+
+    import app.main as m
+    from app.ui_client import ApiClient
+
+    server = uvicorn.Server(uvicorn.Config(m.app, host="127.0.0.1", port=0, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+
+    filler = args.size_mb * 1024
+    sources = [make_source_pdf(values={"cin": f"{i:08d}"}, filler_kb=filler) for i in range(args.clicks * 3)]
+    client = ApiClient()
+    n = args.clicks
+
+    def pooled_fill(i: int) -> None:
+        path, status = client.download(
+            "POST", base + "/process", "q.pdf", expect_type="application/pdf",
+            files={"source_pdf": ("source.pdf", sources[n + i], "application/pdf")}, data={"doc_type": "licence"})
+        assert path, status
+
+    async def inprocess_fill(i: int) -> None:
+        job = m.JOBS.submit("licence", m.source_from_bytes(sources[2 * n + i], 1 << 30))
+        await m.JOBS.wait(job, timeout=90)
+        assert job.status == "done", job.error
+
+    def pooled_excel(i: int) -> None:
+        path, status = client.download("GET", base + "/download/excel", "students_data.xlsx")
+        assert path, status
+
+    def inprocess_excel(i: int) -> None:
+        assert m._export(None, "xlsx")
+
+    print(f"{n} clics par scénario, sources de ~{args.size_mb} Mo, serveur {base}")
+    _report("fill legacy", await _clicks(lambda i: legacy_click(base + "/process", sources[i]), n, True))
+    _report("fill pooled", await _clicks(pooled_fill, n, True))
+    _report("fill inprocess", await _clicks(inprocess_fill, n, False))
+    _report("excel legacy", await _clicks(lambda i: legacy_click(base + "/download/excel", b""), n, True))
+    _report("excel pooled", await _clicks(pooled_excel, n, True))
+    _report("excel inprocess", await _clicks(inprocess_excel, n, True))
+
+    server.should_exit = True
+    await task
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clicks", type=int, default=50)
+    ap.add_argument("--size-mb", type=float, default=0, help="taille ajoutée à chaque PDF source")
+    args = ap.parse_args(argv)
+    args.size_mb = int(args.size_mb) if args.size_mb >= 1 else 0
+
+    os.environ.update({"DATA_DIR": tempfile.mkdtemp(prefix="quitus-bench-ui-"), "RESULT_CACHE_ITEMS": "0",
+                       "API_KEY": "", "UI_ENABLED": "0", "MAX_UPLOAD_MB": "1024"})
+    asyncio.run(main_async(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
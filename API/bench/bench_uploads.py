@@ -0,0 +1,99 @@
+# API/bench/bench_uploads.py
+"""
+Mémoire sous uploads simultanés de gros PDF (POST /process via l'app ASGI).
+
+    cd API
+    python -m bench.bench_uploads                          # 16 x 8 Mo, spool à 1 Mo
+    python -m bench.bench_uploads --spool-kb 65536         # tout en mémoire, pour comparer
+    python -m bench.bench_uploads --max-growth-mb 150      # code retour 1 si dépassé
+
+Le client lit les corps depuis le disque par blocs : la croissance du RSS max
+mesurée est celle du serveur (parsing multipart, spool, pipeline).
+Un process par scénario : ru_maxrss est un maximum sur toute la vie du process.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import AsyncIterator, List
+
+from .run import peak_rss_mb
+from .synth import make_source_pdf
+
+BOUNDARY = "benchboundary"
+
+
+async def _body(path: Path, cin: str) -> AsyncIterator[bytes]:
+    yield (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"doc_type\"\r\n\r\nlicence\r\n"
+           f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"source_pdf\"; filename=\"{cin}.pdf\"\r\n"
+           f"Content-Type: application/pdf\r\n\r\n").encode()
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+            await asyncio.sleep(0)   # entrelace les uploads comme sur le réseau
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def _run(m, files: List[Path], concurrency: int) -> List[int]:
+    import httpx
+
+    transport = httpx.ASGITransport(app=m.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        async def one(i: int) -> int:
+            r = await client.post("/process", content=_body(files[i % len(files)], f"{i:08d}"),
+                                  headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"})
+            return r.status_code
+        return await asyncio.gather(*(one(i) for i in range(concurrency)))
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--size-mb", type=int, default=8)
+    ap.add_argument("--spool-kb", type=int, default=1024)
+    ap.add_argument("--max-growth-mb", type=float, default=0, help="seuil de croissance du RSS max (0 = pas de seuil)")
+    args = ap.parse_args(argv)
+
+    tmp = Path(tempfile.mkdtemp(prefix="quitus-bench-up-"))
+    os.environ.update({
+        "DATA_DIR": str(tmp), "RESULT_CACHE_ITEMS": "0", "API_KEY": "", "UI_ENABLED": "0",
+        "UPLOAD_SPOOL_KB": str(args.spool_kb), "MAX_UPLOAD_MB": str(args.size_mb + 1),
+    })
+    import app.main as m   # après l'environnement
+
+    # sources distinctes écrites sur disque, puis relâchées côté client
+    files = []
+    for i in range(4):
+        p = tmp / f"src_{i}.pdf"
+        p.write_bytes(make_source_pdf(40, 4, values={"cin": f"{i:08d}"}, filler_kb=args.size_mb * 1024))
+        files.append(p)
+    size_mb = files[0].stat().st_size / 1024 / 1024
+
+    m.PIPELINE.warm()
+    base = peak_rss_mb()
+    t0 = time.perf_counter()
+    statuses = asyncio.run(_run(m, files, args.concurrency))
+    wall = time.perf_counter() - t0
+    growth = peak_rss_mb() - base
+    m.PIPELINE.shutdown()
+    m.SHEETS_SINK.close()
+
+    ok = sum(s == 200 for s in statuses)
+    print(f"{args.concurrency} x {size_mb:.1f} Mo, spool={args.spool_kb} Ko : {ok}/{len(statuses)} OK en {wall:.2f}s, "
+          f"RSS max +{growth:.0f} Mo (corps cumulés {size_mb * args.concurrency:.0f} Mo)")
+    if ok != len(statuses):
+        return 1
+    if args.max_growth_mb and growth > args.max_growth_mb:
+        print(f"RSS max au-delà du seuil ({args.max_growth_mb:.0f} Mo)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
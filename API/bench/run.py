@@ -0,0 +1,271 @@
+# API/bench/run.py
+"""
+Benchmark du pipeline quitus, étape par étape puis de bout en bout.
+
+    cd API
+    python -m bench.run                                  # tout, résultats dans bench/results/
+    python -m bench.run --stages parse,fill --repeat 50
+    python -m bench.run --mode gsheets                   # persistance via le faux backend Sheets
+    python -m bench.run --compare bench/results/base.json --threshold 1.25
+
+Étapes mesurées (latence p50/p95/p99, débit, RSS max) :
+- get_fields      : extract_all_values(get_fields()) de pypdf
+- fast_fields     : fields.extract_values (lecture directe des widgets)
+- fill_acroform   : clone complet du modèle (ancien chemin)
+- template_fill   : copie préparée du TemplateCache
+- overlay_text    : reportlab + merge_page (ancien chemin, modèle sans AcroForm)
+- template_overlay: copie préparée + flux de texte minimal (Template.overlay)
+- append_row      : append_row_all_fields (store local ou spool Sheets)
+- export_table    : LocalStore.iter_table sur 5000 lignes du document (colonnes internées)
+- lookup          : GET /students côté store (cin exact, préfixe de nom) sur 100k lignes
+- e2e             : POST /process via l'app ASGI, à plusieurs niveaux de concurrence
+
+Sortie JSON : une entrée par (étape, document, concurrence) ; --compare signale
+les p95 plus lents que la référence d'un facteur > --threshold (code retour 1).
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .synth import make_plain_template, make_source_pdf
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+DOCS = {
+    "small": dict(n_fields=10, pages=1),
+    "medium": dict(n_fields=80, pages=2),
+    "large": dict(n_fields=300, pages=8, filler_kb=512),
+}
+
+
+def peak_rss_mb() -> float:
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / 1024 / 1024 if sys.platform == "darwin" else r / 1024   # octets sur macOS, Ko ailleurs
+
+
+def pct(samples: List[float], p: float) -> float:
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+
+
+def summarize(stage: str, doc: str, samples: List[float], wall: float, concurrency: int = 1,
+              extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    out = {
+        "stage": stage, "doc": doc, "concurrency": concurrency, "n": len(samples),
+        "p50_ms": pct(samples, 50) * 1e3, "p95_ms": pct(samples, 95) * 1e3, "p99_ms": pct(samples, 99) * 1e3,
+        "mean_ms": statistics.fmean(samples) * 1e3,
+        "throughput_rps": len(samples) / wall if wall else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    out.update(extra or {})
+    print(f"{stage:<17}{doc:<8}c={concurrency:<4}n={len(samples):<5}"
+          f"p50={out['p50_ms']:8.2f}ms p95={out['p95_ms']:8.2f}ms p99={out['p99_ms']:8.2f}ms "
+          f"{out['throughput_rps']:8.1f}/s rss={out['peak_rss_mb']:.0f}MB")
+    return out
+
+
+def time_sync(fn: Callable[[], Any], repeat: int) -> tuple:
+    samples = []
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return samples, time.perf_counter() - t0
+
+
+# ------------------------------ étapes ---------------------------------
+def bench_stages(m, stages: List[str], repeat: int, sources: Dict[str, bytes]) -> List[Dict[str, Any]]:
+    from pypdf import PdfReader
+
+    from app.fields import extract_values
+    from app.pipeline import extract_all_values, fill_acroform, get_fields, get_template, overlay_text
+
+    results = []
+    tpl = get_template()
+    mapping = {"student_nom": "Ben Salah Amira", "cin": "01234567", "filiere_lic": "Génie Logiciel"}
+    lines = [(mapping["student_nom"], 120, 690), (mapping["cin"], 160, 665), (mapping["filiere_lic"], 160, 640)]
+
+    for doc, data in sources.items():
+        if "get_fields" in stages:
+            s, w = time_sync(lambda: extract_all_values(get_fields(PdfReader(io.BytesIO(data), strict=False))), repeat)
+            results.append(summarize("get_fields", doc, s, w, extra={"bytes": len(data)}))
+        if "fast_fields" in stages:
+            s, w = time_sync(lambda: extract_values(PdfReader(io.BytesIO(data), strict=False)), repeat)
+            results.append(summarize("fast_fields", doc, s, w, extra={"bytes": len(data)}))
+        if "append_row" in stages:
+            values = extract_values(PdfReader(io.BytesIO(data), strict=False))
+            s, w = time_sync(lambda: m.append_row_all_fields("licence", values), repeat)
+            results.append(summarize("append_row", doc, s, w, extra={"mode": m.settings.EXCEL_MODE}))
+
+    if "export_table" in stages:
+        from app.local_store import LocalStore
+
+        for doc, data in sources.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                store = LocalStore(Path(tmp) / "export.sqlite3")
+                values = extract_values(PdfReader(io.BytesIO(data), strict=False))
+                store.append_rows("Licence", [dict(values, cin=f"{i:08d}") for i in range(5000)])
+                s, w = time_sync(lambda: sum(1 for _ in store.iter_table("Licence")), max(1, repeat // 10))
+                results.append(summarize("export_table", doc, s, w, extra={"columns": len(values)}))
+
+    if "lookup" in stages:
+        from app.local_store import LocalStore
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = LocalStore(Path(tmp) / "lookup.sqlite3")
+            base = extract_values(PdfReader(io.BytesIO(next(iter(sources.values()))), strict=False))
+            for start in range(0, 100_000, 10_000):
+                store.append_rows("Licence", [dict(base, cin=f"{i:08d}", student_nom=f"Nom {i % 997}")
+                                              for i in range(start, start + 10_000)])
+            s, w = time_sync(lambda: store.find(cin="00054321"), repeat)
+            results.append(summarize("lookup_cin", "100k", s, w))
+            s, w = time_sync(lambda: store.find(sheet="Licence", nom="nom 42", limit=50), repeat)
+            results.append(summarize("lookup_nom", "100k", s, w))
+
+    # le remplissage ne dépend que du modèle
+    if "fill_acroform" in stages:
+        s, w = time_sync(lambda: fill_acroform(tpl.reader, mapping), repeat)
+        results.append(summarize("fill_acroform", "tpl", s, w))
+    if "template_fill" in stages:
+        s, w = time_sync(lambda: tpl.fill(mapping), repeat)
+        results.append(summarize("template_fill", "tpl", s, w))
+    if "overlay_text" in stages or "template_overlay" in stages:
+        from app.template_cache import load_template
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "plain.pdf"
+            path.write_bytes(make_plain_template())
+            plain = load_template(path)
+        if "overlay_text" in stages:
+            s, w = time_sync(lambda: overlay_text(plain.reader, lines), repeat)
+            results.append(summarize("overlay_text", "plain", s, w))
+        if "template_overlay" in stages:
+            s, w = time_sync(lambda: plain.overlay(lines), repeat)
+            results.append(summarize("template_overlay", "plain", s, w))
+    return results
+
+
+async def bench_e2e(m, doc: str, pool: List[bytes], concurrency: int, requests: int) -> Dict[str, Any]:
+    import httpx
+
+    transport = httpx.ASGITransport(app=m.app)
+    samples: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def worker() -> None:
+            nonlocal errors
+            for i in counter:
+                data = pool[i % len(pool)]
+                t = time.perf_counter()
+                r = await client.post("/process", data={"doc_type": "licence"},
+                                      files={"source_pdf": ("source.pdf", data, "application/pdf")})
+                samples.append(time.perf_counter() - t)
+                errors += r.status_code != 200
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+    return summarize("e2e", doc, samples, wall, concurrency, extra={"errors": errors})
+
+
+# ------------------------------ comparaison -----------------------------
+def compare(current: List[Dict[str, Any]], baseline_path: Path, threshold: float) -> int:
+    base = {(r["stage"], r["doc"], r["concurrency"]): r for r in json.loads(baseline_path.read_text())["results"]}
+    regressions = 0
+    print(f"\n--- comparaison avec {baseline_path.name} (seuil x{threshold}) ---")
+    for r in current:
+        b = base.get((r["stage"], r["doc"], r["concurrency"]))
+        if not b or not b["p95_ms"]:
+            continue
+        ratio = r["p95_ms"] / b["p95_ms"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{r['stage']:<14}{r['doc']:<8}c={r['concurrency']:<4}p95 {b['p95_ms']:8.2f} -> {r['p95_ms']:8.2f}ms "
+              f"(x{ratio:.2f}) {flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--stages", default="get_fields,fast_fields,fill_acroform,template_fill,overlay_text,template_overlay,append_row,export_table,lookup,e2e")
+    ap.add_argument("--docs", default=",".join(DOCS))
+    ap.add_argument("--repeat", type=int, default=30)
+    ap.add_argument("--concurrency", default="1,4,16")
+    ap.add_argument("--requests", type=int, default=64, help="requêtes e2e par niveau de concurrence")
+    ap.add_argument("--mode", choices=["local", "gsheets"], default="local")
+    ap.add_argument("--backend", default=None, help="PIPELINE_BACKEND (thread | process | inline)")
+    ap.add_argument("--out", type=Path, default=None)
+    ap.add_argument("--compare", type=Path, default=None)
+    ap.add_argument("--threshold", type=float, default=1.25)
+    args = ap.parse_args(argv)
+
+    stages = args.stages.split(",")
+    docs = [d for d in args.docs.split(",") if d in DOCS]
+
+    # environnement isolé : données dans un dossier temporaire, cache de résultats coupé
+    tmp = tempfile.mkdtemp(prefix="quitus-bench-")
+    os.environ.update({
+        "DATA_DIR": tmp, "EXCEL_MODE": args.mode, "GSHEET_FAKE": "1", "RESULT_CACHE_ITEMS": "0",
+        "API_KEY": "", "UI_ENABLED": "0",
+    })
+    if args.backend:
+        os.environ["PIPELINE_BACKEND"] = args.backend
+    import app.main as m   # après l'environnement
+
+    sources = {d: make_source_pdf(**DOCS[d]) for d in docs}
+    results = bench_stages(m, stages, args.repeat, sources)
+
+    if "e2e" in stages:
+        m.PIPELINE.warm()
+        for d in docs:
+            # sources distinctes : pas de coalescence des doublons simultanés
+            pool = [make_source_pdf(**DOCS[d], values={"cin": f"{i:08d}"}) for i in range(32)]
+            for c in (int(x) for x in args.concurrency.split(",")):
+                results.append(asyncio.run(bench_e2e(m, d, pool, c, args.requests)))
+        m.PIPELINE.shutdown()
+        m.SHEETS_SINK.close()
+
+    payload = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "mode": args.mode,
+            "backend": m.PIPELINE.backend, "versions": _versions(),
+        },
+        "results": results,
+    }
+    out = args.out or RESULTS_DIR / f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(payload, indent=2))
+    print(f"\nrésultats : {out}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+def _versions() -> Dict[str, str]:
+    from importlib.metadata import PackageNotFoundError, version
+    out = {}
+    for pkg in ("pypdf", "reportlab", "openpyxl", "fastapi", "gspread"):
+        try:
+            out[pkg] = version(pkg)
+        except PackageNotFoundError:
+            pass
+    return out
+
+
+if __name__ == "__main__":
+    sys.exit(main())
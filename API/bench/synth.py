@@ -0,0 +1,71 @@
+# API/bench/synth.py
+"""
+PDF sources synthétiques (formulaires AcroForm remplis) et modèle sans
+AcroForm pour les benchmarks.
+"""
+import io
+import random
+import string
+from typing import Dict, Optional
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+BASE_FIELDS = {
+    "student_nom": "Ben Salah",
+    "student_prenom": "Amira",
+    "cin": "01234567",
+    "filiere_lic": "Génie Logiciel",
+    "filiere_master": "Data Science",
+}
+
+
+def make_source_pdf(n_fields: int = 20, pages: int = 1, values: Optional[Dict[str, str]] = None,
+                    filler_kb: int = 0) -> bytes:
+    """
+    Formulaire de `pages` pages avec les champs étudiants usuels + des champs
+    `extra_<i>` jusqu'à n_fields. filler_kb ajoute du texte aléatoire (peu
+    compressible) pour grossir le fichier d'environ autant.
+    """
+    values = dict(BASE_FIELDS, **(values or {}))
+    for i in range(max(n_fields - len(values), 0)):
+        values[f"extra_{i}"] = f"valeur {i}"
+    names = list(values)
+
+    rng = random.Random(n_fields)
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    per_page = max(1, -(-len(names) // pages))
+    for p in range(pages):
+        c.setFont("Helvetica", 10)
+        c.drawString(40, 810, f"Fiche d'inscription - page {p + 1}")
+        for j, name in enumerate(names[p * per_page:(p + 1) * per_page]):
+            y = 780 - (j % 38) * 20
+            x = 40 + (j // 38) * 270
+            c.acroForm.textfield(name=name, value=values[name], x=x, y=y, width=250, height=16,
+                                 fontSize=9, borderWidth=0)
+        if filler_kb:
+            t = c.beginText(40, 40); t.setFont("Helvetica", 4)
+            t.textLine("".join(rng.choices(string.ascii_letters, k=filler_kb * 1024 // pages)))
+            c.drawText(t)
+        c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def make_plain_template(pages: int = 1) -> bytes:
+    """Modèle « scanné » sans AcroForm : texte fixe et cadres, rempli par overlay."""
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    for p in range(pages):
+        c.setFont("Times-Bold", 16)
+        c.drawString(200, 780, "QUITUS")
+        c.setFont("Times-Roman", 11)
+        for label, y in (("Nom et prénom :", 690), ("CIN :", 665), ("Filière :", 640)):
+            c.drawString(40, y, label)
+            c.line(115, y - 3, 540, y - 3)
+        c.rect(30, 560, 530, 260)
+        c.drawString(40, 100, f"Page {p + 1}/{pages}")
+        c.showPage()
+    c.save()
+    return buf.getvalue()
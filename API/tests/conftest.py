@@ -0,0 +1,15 @@
+# API/tests/conftest.py
+"""
+Environnement isolé pour les tests : données dans un dossier temporaire, pas
+d'UI (gradio non importé), pas de clé API. Posé avant tout import de `app`.
+"""
+import os
+import tempfile
+
+os.environ.update({
+    "DATA_DIR": tempfile.mkdtemp(prefix="quitus-tests-"),
+    "UI_ENABLED": "0",
+    "API_KEY": "",
+    "EXCEL_MODE": "local",
+    "METRICS_ENABLED": "1",
+})
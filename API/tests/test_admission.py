@@ -0,0 +1,86 @@
+# API/tests/test_admission.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.admission import Admission
+
+
+def _admission(**kw) -> Admission:
+    return Admission(slots=1, weights={"interactive": 4, "bulk": 1}, reserved=0, **kw)
+
+
+def test_client_is_the_address_not_a_header():
+    adm = _admission(trusted_proxies=["10.0.0.0/8"])
+    assert adm.client("203.0.113.7", "198.51.100.1") == "ip:203.0.113.7"   # pair non fiable : en-tête ignoré
+    # via nos proxies : l'adresse ajoutée par le premier d'entre eux, pas celle qu'écrit le client
+    assert adm.client("10.0.0.2", "1.2.3.4, 198.51.100.1, 10.0.0.3") == "ip:198.51.100.1"
+    assert adm.client("10.0.0.2", "") == "ip:10.0.0.2"
+    assert adm.client(None) is None
+
+
+def test_rotating_client_id_still_limited():
+    import httpx
+
+    import app.main as m
+    from bench.synth import make_source_pdf
+
+    src = make_source_pdf(values={"cin": "Q0000001"})
+    old = m.ADMISSION.rate, m.ADMISSION.burst, m.ADMISSION._buckets
+    m.ADMISSION.rate, m.ADMISSION.burst, m.ADMISSION._buckets = 1.0, 3, {}
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=m.app), base_url="http://t") as c:
+            return [(await c.post("/process", files={"source_pdf": ("s.pdf", src, "application/pdf")},
+                                  data={"doc_type": "licence"},
+                                  headers={"X-Client-Id": f"c{i}", "X-Priority": "bulk"})).status_code
+                    for i in range(6)]
+    try:
+        assert asyncio.run(main()) == [200] * 3 + [429] * 3
+    finally:
+        m.ADMISSION.rate, m.ADMISSION.burst, m.ADMISSION._buckets = old
+
+
+def test_parallel_interactive_demoted_to_bulk():
+    async def main():
+        adm = _admission(interactive_per_client=1)
+        order = []
+        gate = asyncio.Event()
+
+        async def work(name, caller_client, priority="interactive"):
+            adm.enter(caller_client, priority)
+            async with adm.slot():
+                order.append(name)
+                await gate.wait()
+
+        first = asyncio.create_task(work("script-1", "ip:script"))   # occupe l'unique place
+        await asyncio.sleep(0)
+        later = [asyncio.create_task(work("script-2", "ip:script")),
+                 asyncio.create_task(work("script-3", "ip:script")),
+                 asyncio.create_task(work("etudiant", "ip:etudiant"))]
+        await asyncio.sleep(0)
+        # au-delà de sa part, le script attend en bulk ; l'autre client reste interactif
+        assert adm.counts()["queued"] == {"interactive": 1, "bulk": 2}
+        gate.set()
+        await asyncio.gather(first, *later)
+        assert sorted(order) == ["etudiant", "script-1", "script-2", "script-3"] and adm._interactive == {}
+    asyncio.run(main())
+
+
+def test_rate_limit_raises_429():
+    adm = _admission(rate=1.0, burst=1)
+    adm.enter("ip:a", "interactive")
+    with pytest.raises(HTTPException) as e:
+        adm.enter("ip:a", "interactive")
+    assert e.value.status_code == 429
+    adm.enter("ip:b", "interactive")
+
+
+def test_untrusted_forwarded_for_warns_once(caplog):
+    adm = _admission()
+    with caplog.at_level("WARNING", logger="quitus-api"):
+        assert adm.client("10.1.2.3", "198.51.100.1") == "ip:10.1.2.3"
+        adm.client("10.1.2.3", "198.51.100.2")
+        adm.client("10.1.2.3")
+    assert len(caplog.records) == 1 and "10.1.2.3" in caplog.records[0].getMessage()
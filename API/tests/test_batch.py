@@ -0,0 +1,66 @@
+# API/tests/test_batch.py
+import io
+import json
+import zipfile
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.batch import BatchSources
+from app.uploads import SourcePdf
+from bench.synth import make_source_pdf
+
+
+def _zip(members) -> SourcePdf:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+    return SourcePdf(size=buf.tell(), data=buf.getvalue())
+
+
+def test_member_count_checked_before_reading(monkeypatch):
+    def no_read(*a, **kw):
+        raise AssertionError("membre décompressé avant le contrôle")
+    monkeypatch.setattr(zipfile.ZipFile, "read", no_read)
+
+    sources = BatchSources(max_file=1024 * 1024, max_files=3)
+    with pytest.raises(HTTPException) as e:
+        sources.add("lot.zip", _zip([(f"{i}.pdf", b"%PDF-1.4") for i in range(4)]))
+    assert e.value.status_code == 400
+    sources.close()
+
+
+def test_oversized_member_refused_without_decompressing(monkeypatch):
+    # 11 Mo de zéros : quelques Ko compressés, au-delà de la limite par fichier
+    src = _zip([("bombe.pdf", b"\0" * (11 * 1024 * 1024)), ("ok.pdf", b"%PDF-1.4")])
+    assert src.size < 100 * 1024
+    sources = BatchSources(max_file=10 * 1024 * 1024, max_files=10)
+    sources.add("lot.zip", src)
+    (_, bomb), (_, ok) = sources.entries
+
+    monkeypatch.setattr(zipfile.ZipFile, "read", lambda *a, **kw: pytest.fail("membre décompressé"))
+    with pytest.raises(HTTPException) as e:
+        bomb()
+    assert e.value.status_code == 413
+    monkeypatch.undo()
+    assert ok() == b"%PDF-1.4"
+    sources.close()
+
+
+def test_batch_endpoint():
+    from app.main import app
+
+    zipped = _zip([("a.pdf", make_source_pdf(values={"cin": "70000001"})),
+                   ("bombe.pdf", b"\0" * (11 * 1024 * 1024))])
+    files = [("source_pdfs", ("lot.zip", zipped.data, "application/zip")),
+             ("source_pdfs", ("b.pdf", make_source_pdf(values={"cin": "70000002"}), "application/pdf"))]
+    with TestClient(app) as c:
+        r = c.post("/process/batch", files=files, data={"doc_type": "licence"})
+    assert r.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(r.content)) as out:
+        manifest = json.loads(out.read("manifest.json"))
+    assert (manifest["total"], manifest["ok"], manifest["errors"]) == (3, 2, 1)
+    (err,) = [f for f in manifest["files"] if f["status"] == "error"]
+    assert err["source"] == "lot.zip/bombe.pdf" and "too large" in err["error"]
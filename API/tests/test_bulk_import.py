@@ -0,0 +1,84 @@
+# API/tests/test_bulk_import.py
+import struct
+import zipfile
+
+import pytest
+
+from app.bulk_import import Checkpoint, ImportManager, extract_ref, iter_sources, run_import
+from bench.synth import make_source_pdf
+
+
+def test_oversized_member_not_decompressed(tmp_path, monkeypatch):
+    archive = tmp_path / "lot.zip"
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("a.pdf", make_source_pdf(values={"cin": "80000001"}))
+        zf.writestr("bombe.pdf", b"\0" * (11 * 1024 * 1024))   # > MAX_UPLOAD_MB, quelques Ko compressés
+    refs = {ref[0]: ref for ref in iter_sources(archive)}
+
+    read = zipfile.ZipFile.read
+    monkeypatch.setattr(zipfile.ZipFile, "read", lambda zf, m, *a: pytest.fail("membre décompressé")
+                        if getattr(m, "filename", m) == "bombe.pdf" else read(zf, m, *a))
+    name, values, error = extract_ref(refs["bombe.pdf"])
+    assert values is None and "too large" in error
+    name, values, error = extract_ref(refs["a.pdf"])
+    assert error is None and values["cin"] == "80000001"
+
+
+def _pdfs(directory, cins):
+    directory.mkdir()
+    for i, cin in enumerate(cins):
+        (directory / f"{i:02d}.pdf").write_bytes(make_source_pdf(values={"cin": cin}))
+    return directory
+
+
+class _Store:
+    def __init__(self, fail_on_batch=0):
+        self.rows, self.batches, self.fail_on_batch = [], 0, fail_on_batch
+
+    def persist(self, doc_type, rows):
+        self.batches += 1
+        if self.batches == self.fail_on_batch:
+            raise OSError("disque plein")
+        self.rows += [r["cin"] for r in rows]
+
+
+def test_resume_after_interrupted_run(tmp_path):
+    root = _pdfs(tmp_path / "lot", [f"7000000{i}" for i in range(6)])
+    store = _Store(fail_on_batch=2)
+    manager = ImportManager(tmp_path / "imports", store.persist, workers=1, batch_rows=2)
+    with pytest.raises(OSError):
+        manager.run("lot", root, "licence")   # arrêt brutal au 2e lot
+    assert len(store.rows) == 2
+
+    stats = manager.run("lot", root, "licence")
+    assert stats.skipped == 2 and stats.ok == 4
+    assert sorted(store.rows) == [f"7000000{i}" for i in range(6)]   # rien de perdu, rien en double
+
+
+def test_duplicates_against_store_and_within_import(tmp_path):
+    root = _pdfs(tmp_path / "lot", ["71000001", "71000002", "71000002", "71000003"])
+    store = _Store()
+    manager = ImportManager(tmp_path / "imports", store.persist, existing_cins=lambda dt: ["71000001"], workers=1)
+    stats = manager.run("lot", root, "master")
+    assert (stats.ok, stats.duplicate) == (2, 2)
+    assert sorted(store.rows) == ["71000002", "71000003"]
+
+
+def test_zip_member_with_oversized_declared_size(tmp_path):
+    archive = tmp_path / "lot.zip"
+    small = make_source_pdf(values={"cin": "72000001"})
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a.pdf", small)
+        zf.writestr("b.pdf", make_source_pdf(values={"cin": "72000002"}))
+    # entête central qui annonce 11 Mo pour a.pdf (contenu réel : quelques Ko)
+    data = bytearray(archive.read_bytes())
+    entry = data.index(b"PK\x01\x02")   # premier membre : a.pdf
+    struct.pack_into("<I", data, entry + 24, 11 * 1024 * 1024)
+    archive.write_bytes(bytes(data))
+
+    store = _Store()
+    checkpoint = Checkpoint(tmp_path / "cp.sqlite3")
+    stats = run_import(archive, "licence", store.persist, checkpoint, workers=1)
+    assert (stats.ok, stats.error) == (1, 1) and store.rows == ["72000002"]
+    assert "too large" in checkpoint.errors()[0]["error"] and checkpoint.errors()[0]["source"] == "a.pdf"
+    checkpoint.close()
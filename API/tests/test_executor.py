@@ -0,0 +1,66 @@
+# API/tests/test_executor.py
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.executor import PipelineExecutor
+
+
+def _executor(**kw) -> PipelineExecutor:
+    return PipelineExecutor("thread", workers=1, max_queue=kw.pop("max_queue", 1), retry_after=3,
+                            timeouts=kw.pop("timeouts", {}))
+
+
+@pytest.fixture
+def gate():
+    event = threading.Event()
+    yield event
+    event.set()   # même si le test échoue : aucun thread du pool ne reste bloqué
+
+
+def test_full_queue_answers_503(gate):
+    async def main():
+        ex = _executor()
+        busy = [asyncio.create_task(ex.run_cpu("parse", gate.wait)) for _ in range(2)]   # worker + file
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as e:
+            await ex.run_cpu("parse", gate.wait)
+        assert e.value.status_code == 503 and e.value.headers["Retry-After"] == "3"
+        gate.set()
+        await asyncio.gather(*busy)
+        assert ex.inflight == 0
+        ex.shutdown()
+    asyncio.run(main())
+
+
+def test_timeout_answers_504_but_keeps_counting_running_work(gate):
+    async def main():
+        ex, ran = _executor(max_queue=4, timeouts={"parse": 0.05}), []
+        with pytest.raises(HTTPException) as e:
+            await ex.run_cpu("parse", gate.wait)
+        assert e.value.status_code == 504
+        assert ex.inflight == 1   # calcul toujours en cours dans le pool : toujours compté
+
+        # tâche encore en file au moment du timeout : annulée, jamais exécutée
+        with pytest.raises(HTTPException):
+            await ex.run_cpu("parse", ran.append, "queued")
+        await asyncio.sleep(0.01)
+        assert ex.inflight == 1
+
+        gate.set()
+        for _ in range(100):
+            if ex.inflight == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert ex.inflight == 0 and ran == []
+        ex.shutdown()
+    asyncio.run(main())
+
+
+def test_persist_has_no_timeout():
+    from app.executor import PIPELINE
+
+    # l'écriture aboutirait malgré un 504 et le retry du client la doublerait
+    assert "persist" not in PIPELINE.timeouts and PIPELINE.timeouts["parse"]
@@ -0,0 +1,38 @@
+# API/tests/test_export.py
+from app.export import cache_path, iter_gsheet_rows, tee_to_cache
+from app.sheets_fake import FakeSpreadsheet
+
+
+def test_gsheet_rows_survive_blank_gaps():
+    # lignes vides en fin de plage : l'API les omet, la lecture doit continuer
+    ws = FakeSpreadsheet().add_worksheet("Licence", rows=10)
+    ws.append_rows([["cin"], ["1"], ["2"]])
+    ws.update("A7", [["3"]])
+    assert list(iter_gsheet_rows(ws, chunk_rows=3)) == [["cin"], ["1"], ["2"], [], [], [], ["3"]]
+    assert list(iter_gsheet_rows(ws, chunk_rows=2)) == [["cin"], ["1"], ["2"], [], [], [], ["3"]]
+
+
+def test_gsheet_rows_beyond_stale_row_count():
+    ws = FakeSpreadsheet().add_worksheet("Licence", rows=2)
+    ws.append_rows([[str(i)] for i in range(5)])
+    ws.row_count = 2   # propriétés lues avant les derniers ajouts
+    assert len(list(iter_gsheet_rows(ws, chunk_rows=2))) == 5
+
+
+def test_concurrent_exports_to_same_cache(tmp_path):
+    # deux /download/excel simultanés dans le même worker, générateurs entrelacés
+    path = cache_path(tmp_path, "csv", "Licence", "rev1")
+    a = tee_to_cache(iter([b"a1", b"a2"]), path)
+    b = tee_to_cache(iter([b"b1", b"b2"]), path)
+    assert [next(a), next(b), next(a), next(b)] == [b"a1", b"b1", b"a2", b"b2"]
+    assert list(a) == [] and list(b) == []
+    assert path.read_bytes() in (b"a1a2", b"b1b2")   # un export complet, pas un mélange
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+
+
+def test_interrupted_export_not_published(tmp_path):
+    path = cache_path(tmp_path, "csv", None, "rev1")
+    gen = tee_to_cache(iter([b"a", b"b"]), path)
+    next(gen)
+    gen.close()   # client parti
+    assert list(tmp_path.iterdir()) == []
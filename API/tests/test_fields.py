@@ -0,0 +1,48 @@
+# API/tests/test_fields.py
+import io
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, NameObject, NumberObject, TextStringObject
+
+from app.fields import extract_fields, extract_values
+from app.pipeline import extract_all_values
+
+
+def _nested_form() -> PdfReader:
+    # student{nom, cin[widget sans /T]}, parent{nom}, top : mêmes /T sous deux parents
+    w = PdfWriter()
+    w.add_blank_page(200, 200)
+
+    def field(parent=None, t=None, value=None, kids=()):
+        d = DictionaryObject()
+        if t is not None:
+            d[NameObject("/T")] = TextStringObject(t)
+        if value is not None:
+            d[NameObject("/FT")] = NameObject("/Tx")
+            d[NameObject("/V")] = TextStringObject(value)
+        if not t:
+            d[NameObject("/Subtype")] = NameObject("/Widget")
+            d[NameObject("/Rect")] = ArrayObject([NumberObject(0)] * 4)
+        ref = w._add_object(d)
+        if kids:
+            d[NameObject("/Kids")] = ArrayObject(kids)
+            for kid in kids:
+                kid.get_object()[NameObject("/Parent")] = ref
+        return ref
+
+    student = field(t="student", kids=[field(t="nom", value="Ben"), field(t="cin", value="123", kids=[field()])])
+    parent = field(t="parent", kids=[field(t="nom", value="Ali")])
+    top = field(t="top", value="x")
+    w._root_object[NameObject("/AcroForm")] = DictionaryObject(
+        {NameObject("/Fields"): ArrayObject([student, parent, top])})
+    buf = io.BytesIO()
+    w.write(buf)
+    return PdfReader(io.BytesIO(buf.getvalue()))
+
+
+def test_qualified_names_match_pypdf():
+    reader = _nested_form()
+    expected = extract_all_values(reader.get_fields())
+    assert list(extract_values(reader).items()) == list(expected.items())
+    assert expected["student.nom"] == "Ben" and expected["parent.nom"] == "Ali"
+    assert extract_fields(reader)["student.cin"].name == "student.cin"
@@ -0,0 +1,78 @@
+# API/tests/test_group_commit.py
+import multiprocessing
+import threading
+
+from app.group_commit import GroupCommitter
+from app.local_store import LocalStore
+from app.sheets_sink import SheetsSink
+
+PROCS, THREADS, ROWS = 6, 4, 20
+
+
+def _rows(proc: int, thread: int):
+    # une colonne propre à chaque process : ajouts de colonnes concurrents
+    return [("Licence" if i % 3 else "Master",
+             {"cin": f"{proc}-{thread}-{i}", "student_nom": f"N{i}", f"extra_{proc}": str(thread)})
+            for i in range(ROWS)]
+
+
+def _store_worker(path: str, barrier) -> None:
+    proc = barrier.wait()   # ouverture comprise : workers qui démarrent ensemble (cf. _migrate)
+    store = LocalStore(path)
+    writes = GroupCommitter(store.append_batch, max_rows=16, name="test")
+
+    def run(t: int) -> None:
+        for sheet, values in _rows(proc, t):
+            writes.submit(sheet, [values])
+    threads = [threading.Thread(target=run, args=(t,)) for t in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writes.close()
+
+
+def _spool_worker(path: str, barrier) -> None:
+    proc = barrier.wait()
+    sink = SheetsSink(lambda: None, path, flush_rows=10 ** 9, flush_interval=3600)
+    for t in range(THREADS):
+        rows = _rows(proc, t)
+        sink.enqueue_batch([(sheet, [values]) for sheet, values in rows[:ROWS // 2]])
+        for sheet, values in rows[ROWS // 2:]:
+            sink.enqueue(sheet, [values])
+
+
+def _run(target, path) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(PROCS)
+    procs = [ctx.Process(target=target, args=(str(path), barrier)) for _ in range(PROCS)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(120)
+    assert [p.exitcode for p in procs] == [0] * PROCS
+
+
+def _expected():
+    return sorted(values["cin"] for proc in range(PROCS) for t in range(THREADS) for _, values in _rows(proc, t))
+
+
+def test_concurrent_store_writers(tmp_path):
+    path = tmp_path / "store.sqlite3"
+    _run(_store_worker, path)
+
+    store = LocalStore(path)
+    rows = [r for sheet in ("Licence", "Master") for r in store.iter_rows(sheet)]
+    assert sorted(r["cin"] for r in rows) == _expected()   # ni perte ni doublon
+    for r in rows:   # chaque valeur relue sous le bon nom de colonne
+        proc, thread, _ = r["cin"].split("-")
+        assert r[f"extra_{proc}"] == thread
+        assert sum(k.startswith("extra_") for k in r) == 1
+
+
+def test_concurrent_spool_writers(tmp_path):
+    path = tmp_path / "spool.sqlite3"
+    _run(_spool_worker, path)
+
+    sink = SheetsSink(lambda: None, path)
+    assert sorted(values["cin"] for _, values in sink.iter_pending(sink.last_id())) == _expected()
@@ -0,0 +1,56 @@
+# API/tests/test_jobs.py
+import asyncio
+
+from app.jobs import JobManager
+from app.uploads import SourcePdf
+
+
+async def _run(doc_type, src, idempotency_key, template, output):
+    return "quitus.pdf", b"%PDF-1.4 " + src.data, "MISS"
+
+
+def _src() -> SourcePdf:
+    return SourcePdf(size=3, data=b"abc")
+
+
+def test_job_visible_from_other_worker(tmp_path):
+    async def main():
+        a, b = JobManager(_run, tmp_path), JobManager(_run, tmp_path)   # deux workers, même DATA_DIR
+        job = await a.wait(a.submit("licence", _src()))
+        b.start()   # purge au démarrage de b : le résultat de a reste
+        seen = b.get(job.id)
+        assert seen.status == "done" and seen.path.read_bytes() == b"%PDF-1.4 abc"
+        await a.close()
+        await b.close()
+    asyncio.run(main())
+
+
+def test_orphans_and_lost_jobs(tmp_path):
+    async def main():
+        gate = asyncio.Event()
+
+        async def stuck(*args):
+            await gate.wait()
+            return await _run(*args)
+
+        a, b = JobManager(stuck, tmp_path), JobManager(_run, tmp_path)
+        job = a.submit("licence", _src())
+        await asyncio.sleep(0)
+        assert b.get(job.id).status == "running"
+
+        (tmp_path / "ancien").mkdir()   # résultat expiré pendant un arrêt
+        b.purge_orphans()
+        assert not (tmp_path / "ancien").exists()
+
+        # a ne donne plus signe de vie : le job ne reste pas "running" indéfiniment
+        b._con().execute("UPDATE jobs SET seen = 0")
+        b._heartbeat()
+        lost = b.get(job.id)
+        assert lost.status == "error" and lost.error_status == 500
+        await a.close()
+
+        job = a.submit("licence", _src())
+        await asyncio.sleep(0)
+        await a.close()   # arrêt de a pendant le job
+        assert b.get(job.id).status == "error"
+    asyncio.run(main())
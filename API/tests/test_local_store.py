@@ -0,0 +1,100 @@
+# API/tests/test_local_store.py
+import json
+import multiprocessing
+import sqlite3
+
+import pytest
+
+from app.local_store import LocalStore
+
+
+def _open(path: str, barrier, out) -> None:
+    barrier.wait()   # tous ensemble, comme des workers qui démarrent
+    try:
+        out.put(len(LocalStore(path).find(cin="00000001")[0]))
+    except Exception as e:
+        out.put(f"{type(e).__name__}: {e}")
+
+
+def _old_format(path) -> None:
+    # base d'avant les colonnes indexées : lignes en objet JSON, sans cin / nom / prenom
+    con = sqlite3.connect(path)
+    con.executescript("""
+        CREATE TABLE columns (sheet TEXT NOT NULL, name TEXT NOT NULL, pos INTEGER NOT NULL,
+                              PRIMARY KEY (sheet, name));
+        CREATE TABLE rows (id INTEGER PRIMARY KEY AUTOINCREMENT, sheet TEXT NOT NULL, data TEXT NOT NULL);
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+    """)
+    con.executemany("INSERT INTO rows (sheet, data) VALUES ('Licence', ?)",
+                    [(json.dumps({"cin": f"{i:08d}", "student_nom": "X"}),) for i in range(200)])
+    con.commit()
+    con.close()
+
+
+@pytest.mark.parametrize("old", [False, True], ids=["fresh", "migration"])
+def test_concurrent_open(tmp_path, old):
+    # plusieurs workers uvicorn démarrent ensemble sur le même DATA_DIR
+    path = tmp_path / "store.sqlite3"
+    if old:
+        _old_format(path)
+    ctx = multiprocessing.get_context("spawn")
+    barrier, out = ctx.Barrier(6), ctx.Queue()
+    procs = [ctx.Process(target=_open, args=(str(path), barrier, out)) for _ in range(6)]
+    for p in procs:
+        p.start()
+    found = [out.get(timeout=60) for _ in procs]
+    for p in procs:
+        p.join()
+    assert found == [1 if old else 0] * 6
+
+
+def test_replace_rows_all_or_nothing(tmp_path):
+    store = LocalStore(tmp_path / "index.sqlite3")
+    store.append_rows("Licence", [{"cin": "1"}, {"cin": "2"}])
+
+    def broken():
+        yield {"cin": "3"}
+        raise RuntimeError("Google Sheets indisponible")
+
+    with pytest.raises(RuntimeError):
+        store.replace_rows([("Licence", broken())], "rebuilt")
+    assert [r["cin"] for r in store.iter_rows("Licence")] == ["1", "2"]
+    assert not store.marked("rebuilt")
+
+    assert store.replace_rows([("Licence", iter([{"cin": "3"}])), ("Master", [{"cin": "4"}])], "rebuilt") == 2
+    assert [r["cin"] for r in store.iter_rows("Licence")] == ["3"]
+    assert store.marked("rebuilt")
+
+
+def test_lease(tmp_path):
+    a, b = LocalStore(tmp_path / "s.sqlite3"), LocalStore(tmp_path / "s.sqlite3")
+    assert a.lease("job", 60) and not b.lease("job", 60)
+    a.release("job")
+    assert b.lease("job", 60)
+    assert a.lease("expired", -1) and b.lease("expired", 60)   # bail expiré : repris
+
+
+def test_column_order_stable_across_appends_and_exports(tmp_path):
+    import csv
+    import io
+
+    import openpyxl
+
+    from app.export import stream_csv
+
+    store = LocalStore(tmp_path / "store.sqlite3")
+    store.append_rows("Licence", [{"cin": "1", "nom": "A"}])
+    store.append_rows("Licence", [{"prenom": "B", "nom": "B", "cin": "2"}])   # ordre différent + colonne nouvelle
+    store.append_batch([("Licence", [{"filiere": "GL", "cin": "3"}, {"nom": "D", "cin": "4", "prenom": "D"}])])
+
+    header = ["cin", "nom", "prenom", "filiere"]   # ordre de première apparition, jamais réordonné
+    table = [header, ["1", "A", "", ""], ["2", "B", "B", ""], ["3", "", "", "GL"], ["4", "D", "D", ""]]
+    assert store.header("Licence") == header
+    assert list(store.iter_table("Licence")) == table
+    assert list(LocalStore(tmp_path / "store.sqlite3").iter_table("Licence")) == table   # autre process
+
+    text = b"".join(stream_csv([("Licence", store.iter_table("Licence"))])).decode("utf-8-sig")
+    assert list(csv.reader(io.StringIO(text))) == table
+
+    ws = openpyxl.load_workbook(store.export_xlsx(tmp_path / "students.xlsx"), read_only=True)["Licence"]
+    assert [[c or "" for c in row] for row in ws.iter_rows(values_only=True)] == table
@@ -0,0 +1,102 @@
+# API/tests/test_metrics.py
+import asyncio
+import re
+
+import httpx
+import pytest
+from starlette.responses import StreamingResponse
+
+from app import metrics
+from bench.synth import make_source_pdf
+
+
+@pytest.fixture
+def registry():
+    # métriques de test retirées du registre global après coup
+    before = list(metrics.REGISTRY)
+    yield
+    metrics.REGISTRY[:] = before
+
+
+def _value(text: str, series: str, default=None) -> float:
+    m = re.search("^" + re.escape(series) + r" (\S+)$", text, re.M)
+    assert m or default is not None, f"série absente : {series}"
+    return float(m.group(1)) if m else default
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    h = metrics.Histogram("test_seconds", "test", ("stage",), buckets=(0.1, 1))
+    for v in (0.05, 0.1, 0.5, 3):
+        h.observe(v, stage="parse")
+    text = "\n".join(h.render())
+    assert _value(text, 'test_seconds_bucket{stage="parse",le="0.1"}') == 2   # borne incluse
+    assert _value(text, 'test_seconds_bucket{stage="parse",le="1"}') == 3
+    assert _value(text, 'test_seconds_bucket{stage="parse",le="+Inf"}') == 4
+    assert _value(text, 'test_seconds_count{stage="parse"}') == 4
+    assert _value(text, 'test_seconds_sum{stage="parse"}') == pytest.approx(3.65)
+    assert text.startswith("# HELP test_seconds test\n# TYPE test_seconds histogram")
+
+
+def test_label_escaping(registry):
+    c = metrics.Counter("test_total", "test", ("path",))
+    c.inc(path='a"b\\c\nd')
+    c.inc(2, path='a"b\\c\nd')
+    assert 'test_total{path="a\\"b\\\\c\\nd"} 3' in metrics.render()
+
+
+def test_scrape_after_process():
+    import app.main as m
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=m.app), base_url="http://t") as c:
+            files = {"source_pdf": ("s.pdf", make_source_pdf(values={"cin": "M0000001"}), "application/pdf")}
+            assert (await c.post("/process", files=files, data={"doc_type": "licence"})).status_code == 200
+            assert (await c.get("/jobs/inconnu")).status_code == 404
+            r = await c.get("/metrics")
+        assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+        return r.text
+    text = asyncio.run(main())
+    assert _value(text, 'quitus_http_request_seconds_count{method="POST",route="/process",status="200"}') >= 1
+    # gabarit de route, pas le chemin brut
+    assert _value(text, 'quitus_http_request_seconds_count{method="GET",route="/jobs/{job_id}",status="404"}') >= 1
+    assert "/jobs/inconnu" not in text
+    for stage in ("read", "parse", "persist", "fill"):
+        assert _value(text, f'quitus_stage_seconds_count{{stage="{stage}",doc_type="licence"}}') >= 1
+    assert _value(text, 'quitus_upload_bytes_count{route="/process"}') >= 1
+    assert _value(text, 'quitus_persist_calls_total{backend="local",op="append_rows"}') >= 1
+
+
+def test_latency_includes_streamed_body():
+    async def slow_body():
+        for _ in range(3):
+            await asyncio.sleep(0.05)
+            yield b"x"
+
+    async def app(scope, receive, send):
+        await StreamingResponse(slow_body())(scope, receive, send)
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=metrics.MetricsMiddleware(app)),
+                                     base_url="http://t") as c:
+            assert (await c.get("/flux")).content == b"xxx"
+    series = 'quitus_http_request_seconds_sum{method="GET",route="other",status="200"}'
+    before = _value(metrics.render(), series, 0.0)
+    asyncio.run(main())
+    assert _value(metrics.render(), series) - before >= 0.15   # jusqu'au dernier octet envoyé
+
+
+def test_disabled_is_noop(monkeypatch):
+    import app.main as m
+
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    monkeypatch.setattr(m.settings, "METRICS_ENABLED", False)
+    before = metrics.render()
+    with metrics.stage("parse", "master"):
+        pass
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=m.app), base_url="http://t") as c:
+            assert (await c.get("/jobs/autre")).status_code == 404
+            return (await c.get("/metrics")).status_code
+    assert asyncio.run(main()) == 404
+    assert metrics.render() == before
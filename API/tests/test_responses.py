@@ -0,0 +1,48 @@
+# API/tests/test_responses.py
+import asyncio
+import os
+import tracemalloc
+
+from app.responses import BytesResponse, file_response
+
+MB = 1024 * 1024
+
+
+def _send(response, method="POST", headers=None):
+    sent = []
+    scope = {"type": "http", "method": method, "path": "/",
+             "headers": [(k.encode(), v.encode()) for k, v in (headers or {}).items()]}
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(response(scope, receive, send))
+    return sent
+
+
+def test_bytes_sent_once_without_copy():
+    pdf = b"%PDF-1.4\n" + os.urandom(4 * MB)
+    tracemalloc.start()
+    try:
+        sent = _send(BytesResponse(pdf, media_type="application/pdf"))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < MB   # ni copie ni hachage du corps
+    start, body = sent
+    assert body["body"] is pdf and not body.get("more_body")
+    headers = dict(start["headers"])
+    assert headers[b"content-length"] == str(len(pdf)).encode() and b"etag" not in headers
+
+
+def test_file_response_conditional(tmp_path):
+    path = tmp_path / "quitus.pdf"
+    path.write_bytes(b"%PDF-1.4 " + b"x" * 1000)
+    etag = file_response(path, None).headers["etag"]
+
+    assert file_response(path, etag).status_code == 304
+    start, *_ = _send(file_response(path, "\"autre\""), "GET", {"range": "bytes=0-99"})
+    assert start["status"] == 206
@@ -0,0 +1,77 @@
+# API/tests/test_result_cache.py
+import asyncio
+
+import httpx
+from fastapi import HTTPException
+
+from app.result_cache import ResultCache
+from app.uploads import source_from_bytes
+from bench.synth import make_source_pdf
+
+
+def test_memory_lru_eviction():
+    cache = ResultCache(max_items=2)
+    cache.put("a", ("a.pdf", b"A"))
+    cache.put("b", ("b.pdf", b"B"))
+    assert cache.get("a") is not None   # a devient le plus récent
+    cache.put("c", ("c.pdf", b"C"))
+    assert cache.get("b") is None and cache.get("a") == ("a.pdf", b"A")
+    assert cache.snapshot()["evictions"] == 1
+
+
+def test_disk_tier_bounded_by_size(tmp_path):
+    cache = ResultCache(max_items=1, disk_dir=tmp_path, disk_max_bytes=250)
+    for k in "abc":
+        cache.put(k, (f"{k}.pdf", k.encode() * 100))
+    assert sorted(p.name for p in tmp_path.glob("*.pdf")) == ["b.pdf", "c.pdf"]   # le plus ancien sorti
+    assert cache.get("b") == ("b.pdf", b"b" * 100) and cache.stats["hits_disk"] == 1
+    assert cache.get("a") is None
+
+
+def test_idempotency_key_reuse_and_retry(monkeypatch):
+    import app.main as m
+
+    generate, calls = m._generate, []
+
+    async def flaky(*args):
+        calls.append(1)
+        if len(calls) == 1:
+            raise HTTPException(status_code=503, detail="Server busy, retry later")
+        return await generate(*args)
+    monkeypatch.setattr(m, "_generate", flaky)
+
+    sources = {cin: make_source_pdf(values={"cin": cin}) for cin in ("I0000001", "I0000002", "I0000003")}
+
+    async def post(cin: str, key: str) -> int:
+        files = {"source_pdf": ("s.pdf", sources[cin], "application/pdf")}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=m.app), base_url="http://t") as c:
+            r = await c.post("/process", files=files, data={"doc_type": "licence"}, headers={"Idempotency-Key": key})
+        return r.status_code
+
+    async def main():
+        assert await post("I0000001", "k1") == 503   # échec : la clé n'est pas consommée
+        assert await post("I0000002", "k1") == 200   # envoi corrigé, même clé
+        assert await post("I0000002", "k1") == 200   # rejeu identique
+        assert await post("I0000003", "k1") == 422   # autre contenu
+    asyncio.run(main())
+
+
+def test_concurrent_duplicates_generated_once(monkeypatch):
+    import app.main as m
+
+    generate, calls = m._generate, []
+
+    async def slow(*args):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return await generate(*args)
+    monkeypatch.setattr(m, "_generate", slow)
+    data = make_source_pdf(values={"cin": "D0000001"})
+
+    async def main():
+        return await asyncio.gather(*[m._process_source("licence", source_from_bytes(data, 1 << 20), None)
+                                      for _ in range(3)])
+    results = asyncio.run(main())
+    assert len(calls) == 1 and not m._INFLIGHT
+    assert sorted(status for _, _, status in results) == ["HIT", "HIT", "MISS"]
+    assert len({pdf for _, pdf, _ in results}) == 1
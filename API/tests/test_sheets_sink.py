@@ -0,0 +1,82 @@
+# API/tests/test_sheets_sink.py
+import pytest
+
+from app.sheets_fake import FakeAPIError, FakeSpreadsheet
+from app.sheets_sink import SheetsSink, is_transient
+
+
+@pytest.fixture
+def sheet():
+    return FakeSpreadsheet()
+
+
+@pytest.fixture
+def sink(sheet, tmp_path):
+    s = SheetsSink(lambda: sheet, tmp_path / "spool.sqlite3", flush_interval=3600)
+    yield s
+    s._stop.set()
+    s._wake.set()
+
+
+def _rows(n, start=0):
+    return [{"cin": f"{start + i:08d}", "nom": f"N{start + i}"} for i in range(n)]
+
+
+def test_spool_created_lazily(tmp_path):
+    s = SheetsSink(lambda: pytest.fail("feuille ouverte"), tmp_path / "spool.sqlite3")
+    s.close()
+    assert not (tmp_path / "spool.sqlite3").exists()
+
+
+def test_flush_writes_header_and_rows(sink, sheet):
+    sink.enqueue("licence", _rows(3))
+    assert sink.flush() == 3
+    assert sheet.worksheet("licence").get_all_values() == [
+        ["cin", "nom"], ["00000000", "N0"], ["00000001", "N1"], ["00000002", "N2"]]
+    assert sheet.calls["append_rows"] == 1
+    assert sink.pending() == 0
+
+
+def test_transient_error_keeps_rows(sink, sheet):
+    sink.enqueue("licence", _rows(2))
+    sheet.fail_next = 1   # 429
+    with pytest.raises(FakeAPIError):
+        sink.flush()
+    assert sink.pending() == 2 and sink.dead() == 0
+    assert sink.flush() == 2
+
+
+def test_permanent_error_isolates_bad_rows(sink, sheet, monkeypatch):
+    sink.enqueue("licence", _rows(5))
+    write = sink._write_rows
+
+    def reject_cin_3(title, rows):
+        if any(r["cin"] == "00000003" for r in rows):
+            raise FakeAPIError(400, "Invalid value")
+        write(title, rows)
+    monkeypatch.setattr(sink, "_write_rows", reject_cin_3)
+
+    assert sink.flush() == 4   # ne lève pas : le reste du spool passe
+    assert sink.pending() == 0 and sink.dead() == 1
+    cins = [r[0] for r in sheet.worksheet("licence").get_all_values()[1:]]
+    assert sorted(cins) == ["00000000", "00000001", "00000002", "00000004"]
+
+    monkeypatch.undo()
+    assert sink.requeue_dead() == 1
+    assert sink.flush() == 1 and sink.dead() == 0
+
+
+def test_is_transient():
+    assert is_transient(FakeAPIError(429, "quota"))
+    assert is_transient(FakeAPIError(503, "unavailable"))
+    assert is_transient(ConnectionResetError())
+    assert not is_transient(FakeAPIError(400, "bad range"))
+    assert not is_transient(FakeAPIError(403, "forbidden"))
+    assert not is_transient(ValueError("x"))
+
+
+def test_fake_update_anchor(sheet):
+    ws = sheet.add_worksheet("t")
+    ws.update("A1", [["a", "b"]])
+    ws.update("B3", [["x"], ["y"]])
+    assert ws.get_all_values() == [["a", "b"], [], ["", "x"], ["", "y"]]
@@ -0,0 +1,77 @@
+# API/tests/test_template_cache.py
+import io
+
+import pytest
+from pypdf import PdfReader
+
+from app.template_cache import UnsupportedText, load_template
+from bench.synth import make_plain_template, make_source_pdf
+
+
+def _values(pdf: bytes):
+    return {k: str(v.get("/V", "")) for k, v in (PdfReader(io.BytesIO(pdf)).get_fields() or {}).items()}
+
+
+def test_fill_keeps_template_defaults(tmp_path):
+    # modèle dont les champs ont déjà une valeur : seuls les champs du mapping changent
+    path = tmp_path / "tpl.pdf"
+    path.write_bytes(make_source_pdf(values={"cin": "11112222", "student_nom": "Défaut"}))
+    tpl = load_template(path)
+
+    out = _values(tpl.fill({"cin": "99998888"}))
+    assert out["cin"] == "99998888"
+    assert out["student_nom"] == "Défaut"
+
+    # copie préparée réutilisée : la valeur de la requête précédente ne fuit pas
+    out = _values(tpl.fill({"student_nom": "Trabelsi"}))
+    assert out["cin"] == "11112222"
+    assert out["student_nom"] == "Trabelsi"
+
+
+def test_text_outside_winansi_never_becomes_question_marks(tmp_path):
+    path = tmp_path / "tpl.pdf"
+    path.write_bytes(make_source_pdf())
+    tpl = load_template(path)
+    name = "بن صالح"
+
+    # formulaire : /V exacte, pas d'apparence "???" (le lecteur la dessine)
+    out = tpl.fill({"student_nom": name, "cin": "12345678"})
+    reader = PdfReader(io.BytesIO(out))
+    assert _values(out)["student_nom"] == name
+    widgets = {str(a.get_object()["/T"]): a.get_object() for a in reader.pages[0]["/Annots"]}
+    assert "/AP" not in widgets["student_nom"] and "/AP" in widgets["cin"]
+
+    # flat : retombe sur la sortie formulaire plutôt que d'aplatir des "?"
+    out = tpl.flatten({"student_nom": name})
+    assert "/AcroForm" in PdfReader(io.BytesIO(out)).trailer["/Root"]
+    assert _values(out)["student_nom"] == name
+
+
+def test_overlay_refuses_text_outside_winansi(tmp_path):
+    path = tmp_path / "plain.pdf"
+    path.write_bytes(make_plain_template())
+    tpl = load_template(path)
+    assert tpl.overlay([("Genève", 72, 700)])[:4] == b"%PDF"   # accents WinAnsi : dessinés
+    with pytest.raises(UnsupportedText):
+        tpl.overlay([("بن صالح", 72, 700)])
+
+
+@pytest.mark.parametrize("flat", [False, True], ids=["overlay", "flat"])
+def test_overlay_text_round_trip(tmp_path, flat):
+    # modèle sans AcroForm : le texte posé se relit à l'extraction, avec le texte fixe du modèle
+    path = tmp_path / "plain.pdf"
+    path.write_bytes(make_plain_template())
+    tpl = load_template(path)
+    assert not tpl.has_acroform
+    original = PdfReader(io.BytesIO(path.read_bytes())).pages[0].extract_text()
+
+    lines = [("Ben Salah Amira", 120, 690), ("01234567", 160, 665), ("Génie Logiciel", 160, 640)]
+    for cin in ("01234567", "76543210"):   # copie préparée réutilisée : pas de reste de l'appel précédent
+        lines[1] = (cin, 160, 665)
+        out = tpl.flatten(lines=lines) if flat else tpl.overlay(lines)
+        reader = PdfReader(io.BytesIO(out))
+        text = reader.pages[0].extract_text()
+        assert all(t in text for t, _, _ in lines)
+        assert ("01234567" in text) == (cin == "01234567")
+        assert all(line in text for line in original.splitlines() if line.strip())
+        assert len(reader.pages) == len(PdfReader(io.BytesIO(path.read_bytes())).pages)
@@ -0,0 +1,58 @@
+# API/tests/test_template_registry.py
+import json
+import os
+
+import pytest
+
+from app.template_cache import load_template
+from app.template_registry import TemplateRegistry, TemplateSpecError, compile_spec
+from bench.synth import make_plain_template, make_source_pdf
+
+
+def _errors(raw, tpl=None):
+    with pytest.raises(TemplateSpecError) as e:
+        compile_spec("t", raw, tpl)
+    return " | ".join(e.value.errors)
+
+
+def test_compile_spec_errors(tmp_path):
+    assert "unknown keys: ['colour']" in _errors({"fields": {"cin": "{cin}"}, "colour": 1})
+    assert "unknown doc_types: ['doctorat']" in _errors({"doc_types": ["doctorat"], "fields": {"cin": "{cin}"}})
+    assert "'fields' must be a non-empty object" in _errors({"fields": {}})
+    assert "missing expression for 'master'" in _errors({"fields": {"cin": {"licence": "{cin}"}}})
+    assert "empty field name" in _errors({"fields": {"cin": "{cin|}"}})
+    assert "overlay 'nom' is not in 'fields'" in _errors({"fields": {"cin": "{cin}"}, "overlay": {"nom": [1, 2]}})
+    assert "overlay 'cin' must be [x, y]" in _errors({"fields": {"cin": "{cin}"}, "overlay": {"cin": [1]}})
+
+    # contre les vrais champs du modèle
+    form, plain = tmp_path / "form.pdf", tmp_path / "plain.pdf"
+    form.write_bytes(make_source_pdf(n_fields=5))
+    plain.write_bytes(make_plain_template())
+    assert "not in template AcroForm" in _errors({"fields": {"absent": "{cin}"}}, load_template(form))
+    assert "'overlay' positions are required" in _errors({"fields": {"cin": "{cin}"}}, load_template(plain))
+
+    spec = compile_spec("t", {"fields": {"cin": "{cin}", "student_nom": "{student_nom|cin} X"}}, load_template(form))
+    assert spec.mapping("master", {"cin": "1"}) == {"cin": "1", "student_nom": "1 X"}
+
+
+def test_registry_reloads_edited_spec(tmp_path):
+    (tmp_path / "fac.pdf").write_bytes(make_source_pdf(n_fields=5))
+    spec_path = tmp_path / "fac.json"
+    spec_path.write_text(json.dumps({"fields": {"cin": "{cin}"}}), "utf-8")
+    registry = TemplateRegistry(tmp_path, default="fac")
+    assert registry.get().spec.mapping("licence", {"cin": "1"}) == {"cin": "1"}
+    version = registry.version()
+
+    # seule la spec change : nouvelle version ET nouveau plan
+    spec_path.write_text(json.dumps({"fields": {"cin": "CIN {cin}"}}), "utf-8")
+    st = os.stat(spec_path)
+    os.utime(spec_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert registry.version() != version
+    assert registry.get().spec.mapping("licence", {"cin": "1"}) == {"cin": "CIN 1"}
+
+    # spec devenue invalide : refusée au prochain get, pas d'ancien plan servi
+    spec_path.write_text(json.dumps({"fields": {"absent": "{cin}"}}), "utf-8")
+    os.utime(spec_path, ns=(st.st_atime_ns, st.st_mtime_ns + 2_000_000))
+    with pytest.raises(TemplateSpecError):
+        registry.get()
+    assert not registry.describe()[0]["ok"]
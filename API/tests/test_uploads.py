@@ -0,0 +1,118 @@
+# API/tests/test_uploads.py
+import asyncio
+import hashlib
+import os
+import pickle
+import tracemalloc
+from tempfile import SpooledTemporaryFile
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.uploads import spool_upload
+
+MB = 1024 * 1024
+
+
+def _upload(data: bytes) -> UploadFile:
+    # comme Starlette : spool mémoire jusqu'à 1 Mo, puis fichier temporaire
+    fh = SpooledTemporaryFile(max_size=MB)
+    fh.write(data)
+    fh.seek(0)
+    return UploadFile(fh, size=len(data), filename="s.pdf")
+
+
+def _spool(up, **kw):
+    return asyncio.run(spool_upload(up, kw.pop("limit", 10 * MB), kw.pop("spool_bytes", 256 * 1024), **kw))
+
+
+def test_large_upload_not_copied(tmp_path):
+    data = b"%PDF-1.4\n" + os.urandom(6 * MB)
+    up = _upload(data)
+    tracemalloc.start()
+    try:
+        src = _spool(up, spool_dir=tmp_path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < MB   # ni le corps entier en mémoire...
+    assert list(tmp_path.iterdir()) == [] and src.fd is not None   # ...ni seconde copie sur disque
+    assert src.sha256.hexdigest() == hashlib.sha256(data).hexdigest()
+
+    up.file.close()   # fin de requête : le descripteur dupliqué reste lisible
+    assert src.read() == data
+    with pytest.raises(TypeError):
+        pickle.dumps(src)
+    src.cleanup()
+
+
+def test_need_path_for_process_workers(tmp_path):
+    data = b"%PDF-1.4\n" + b"x" * (2 * MB)
+    src = _spool(_upload(data), spool_dir=tmp_path, need_path=True)
+    assert src.path is not None and os.path.dirname(src.path) == str(tmp_path)
+    assert pickle.loads(pickle.dumps(src)).read() == data
+    src.cleanup()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_small_upload_in_memory():
+    src = _spool(_upload(b"%PDF-1.4 small"))
+    assert src.data == b"%PDF-1.4 small" and src.fd is None and src.path is None
+
+
+def test_rejects(tmp_path):
+    with pytest.raises(HTTPException) as e:
+        _spool(_upload(b"PK\x03\x04 not a pdf"))
+    assert e.value.status_code == 400
+
+    class Unread:
+        def read(self, n=-1):
+            raise AssertionError("corps lu malgré la taille annoncée")
+
+    with pytest.raises(HTTPException) as e:
+        _spool(UploadFile(Unread(), size=11 * MB), limit=10 * MB)
+    assert e.value.status_code == 413
+
+    up = _upload(b"%PDF" + b"x" * (2 * MB))
+    up.size = None   # taille inconnue : bornée en lecture
+    with pytest.raises(HTTPException) as e:
+        _spool(up, limit=MB, spool_dir=tmp_path)
+    assert e.value.status_code == 413 and list(tmp_path.iterdir()) == []
+
+
+def test_concurrent_large_uploads_bounded(tmp_path):
+    # N gros PDF (> UPLOAD_SPOOL_KB) envoyés en même temps sur /process, corps lus par blocs depuis le disque
+    import httpx
+
+    import app.main as m
+    from bench.bench_uploads import BOUNDARY, _body
+    from bench.synth import make_source_pdf
+
+    n = 6
+    pdf = make_source_pdf(values={"cin": "U0000000"}, filler_kb=8192)
+    files = []
+    for i in range(n):   # contenus distincts (pas de dédoublonnage par le cache) : octets après %%EOF
+        path = tmp_path / f"{i}.pdf"
+        path.write_bytes(pdf + f"\n% upload {i}\n".encode())
+        files.append(path)
+    size = files[0].stat().st_size
+    assert size > 4 * m.settings.UPLOAD_SPOOL_KB * 1024
+
+    async def post(paths):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=m.app), base_url="http://t", timeout=60) as c:
+            return await asyncio.gather(*[
+                c.post("/process", content=_body(path, path.stem),
+                       headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"}) for path in paths])
+    small = tmp_path / "warm.pdf"
+    small.write_bytes(make_source_pdf(values={"cin": "U9999999"}))
+    asyncio.run(post([small]))   # imports et caches de premier appel hors mesure
+
+    tracemalloc.start()
+    try:
+        responses = asyncio.run(post(files))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert [r.status_code for r in responses] == [200] * n
+    # reste : tampon multipart de Starlette (1 Mo par upload) et pipeline, pas le corps des uploads
+    assert peak < n * size / 4, f"pic {peak / MB:.1f} Mo pour {n} x {size / MB:.1f} Mo"